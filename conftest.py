@@ -4,13 +4,33 @@
 # Enable logging output in stderr for failing tests.
 import logging
 
+from insights_examples.cache import ParseCache
+
+# Parsed InputData content shared by all the tests of a session
+PARSE_CACHE = ParseCache()
+
 
 def pytest_addoption(parser):
     parser.addoption("--runslow", action="store_true", default=False, help="run slow tests")
     parser.addoption("--appdebug", action="store_true", default=False, help="debug loggging")
     parser.addoption("--smokey", action="store_true", default=False, help="run tests fast")
+    parser.addoption("--parse-cache", action="store_true", default=False,
+                     help="parse identical test input once per session")
+    parser.addoption("--parse-cache-report", action="store_true", default=False,
+                     help="report the parse time saved by --parse-cache")
 
 
 def pytest_configure(config):
     level = logging.DEBUG if config.getoption("--appdebug") else logging.ERROR
     logging.basicConfig(level=level)
+    if config.getoption("--parse-cache"):
+        PARSE_CACHE.install()
+
+
+def pytest_unconfigure(config):
+    PARSE_CACHE.uninstall()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if config.getoption("--parse-cache") and config.getoption("--parse-cache-report"):
+        terminalreporter.write_line(PARSE_CACHE.report())
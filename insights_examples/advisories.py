@@ -0,0 +1,137 @@
+"""
+advisories - Version range advisories for installed packages
+============================================================
+
+An advisory states that the versions of a package from ``affected``
+(inclusive) up to ``fixed`` (exclusive) have a known problem.  Advisories
+are kept in a JSON data file, ``advisories.json`` next to this module, as
+a list of objects::
+
+    [
+        {"id": "BASH_BUG", "package": "bash",
+         "affected": "bash-4.4.14-1.any", "fixed": "bash-4.4.18-1.any"}
+    ]
+
+:class:`AdvisoryIndex` compiles every bound into an ``InstalledRpm`` once
+when it is loaded and keeps, per package, the version ranges sorted by
+their lower bound.  Matching a host is then one pass over the packages of
+the index with a binary search per installed package, whatever the number
+of advisories.
+
+Examples:
+    >>> index = AdvisoryIndex.from_dicts([
+    ...     {'id': 'BASH_BUG', 'package': 'bash', 'affected': 'bash-4.4.14-1.any', 'fixed': 'bash-4.4.18-1.any'},
+    ...     {'id': 'OLD_BASH', 'package': 'bash', 'affected': 'bash-3.0-1.any', 'fixed': 'bash-4.4.15-1.any'},
+    ... ])
+    >>> [a.id for a in index.affecting(installed_bash)]
+    ['OLD_BASH', 'BASH_BUG']
+    >>> index.is_affected('BASH_BUG', installed_bash)
+    True
+"""
+import json
+import os
+
+from bisect import bisect_right
+from collections import namedtuple
+from insights.parsers.installed_rpms import InstalledRpm
+
+ADVISORIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'advisories.json')
+"""str: Path of the advisory data file shipped with the examples."""
+
+Advisory = namedtuple('Advisory', ['id', 'package', 'affected', 'fixed'])
+"""namedtuple: An advisory with its bounds compiled into ``InstalledRpm`` objects."""
+
+
+class AdvisoryIndex(object):
+    """
+    Per-package sorted interval index of :class:`Advisory` ranges.
+
+    Attributes:
+        advisories (dict): Every advisory keyed by its id.
+    """
+
+    def __init__(self, advisories):
+        self.advisories = {}
+        by_package = {}
+        for advisory in advisories:
+            if advisory.id in self.advisories:
+                raise ValueError("Duplicate advisory id: %s" % advisory.id)
+            self.advisories[advisory.id] = advisory
+            by_package.setdefault(advisory.package, []).append(advisory)
+
+        # package -> (lower bounds, advisories, running maximum of the upper
+        # bounds), all sorted by lower bound.
+        self._index = {}
+        for package, entries in by_package.items():
+            entries.sort(key=lambda a: a.affected)
+            max_fixed = []
+            for advisory in entries:
+                if not max_fixed or max_fixed[-1] < advisory.fixed:
+                    max_fixed.append(advisory.fixed)
+                else:
+                    max_fixed.append(max_fixed[-1])
+            self._index[package] = ([a.affected for a in entries], entries, max_fixed)
+
+    @classmethod
+    def from_dicts(cls, entries):
+        """Builds an index from dicts with ``id``, ``package``, ``affected`` and ``fixed`` keys."""
+        advisories = []
+        for entry in entries:
+            affected = InstalledRpm.from_package(entry['affected'])
+            fixed = InstalledRpm.from_package(entry['fixed'])
+            if affected.name != entry['package'] or fixed.name != entry['package']:
+                raise ValueError("Bounds of advisory %s are not versions of %s" % (entry['id'], entry['package']))
+            advisories.append(Advisory(entry['id'], entry['package'], affected, fixed))
+        return cls(advisories)
+
+    @classmethod
+    def load(cls, path=ADVISORIES_FILE):
+        """Builds an index from the JSON data file at ``path``."""
+        with open(path) as f:
+            return cls.from_dicts(json.load(f))
+
+    @property
+    def packages(self):
+        """list: Names of the packages with at least one advisory."""
+        return sorted(self._index)
+
+    def affecting(self, installed):
+        """
+        list: Returns the advisories whose range contains the
+        ``InstalledRpm`` ``installed``, ordered by lower bound.
+        """
+        entry = self._index.get(installed.name)
+        if entry is None:
+            return []
+        lowers, entries, max_fixed = entry
+        found = []
+        # Candidates start at or below the installed version, walk them down
+        # until no earlier range can reach above it.
+        for i in range(bisect_right(lowers, installed) - 1, -1, -1):
+            if not installed < max_fixed[i]:
+                break
+            if installed < entries[i].fixed:
+                found.append(entries[i])
+        found.reverse()
+        return found
+
+    def is_affected(self, advisory_id, installed):
+        """bool: Returns whether ``installed`` is in the range of advisory ``advisory_id``."""
+        advisory = self.advisories[advisory_id]
+        return installed.name == advisory.package and advisory.affected <= installed < advisory.fixed
+
+    def scan(self, rpms):
+        """
+        Matches every advisory against an ``InstalledRpms`` parser in one
+        pass, using the newest installed version of each package.
+
+        Returns:
+            list: ``(advisory, installed)`` tuples ordered by package and
+            lower bound.
+        """
+        matches = []
+        for package in self.packages:
+            installed = rpms.get_max(package)
+            if installed is not None:
+                matches.extend((a, installed) for a in self.affecting(installed))
+        return matches
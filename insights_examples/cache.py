@@ -0,0 +1,189 @@
+"""
+cache - Bounded caches shared by the example components
+=======================================================
+
+The example parsers and rules can reuse work across the many archives
+evaluated by one process, for instance by keying parsed objects on a hash
+of their input content.  :class:`LRUCache` is the bounded store they use.
+
+:class:`ParseCache` does the same for test sessions, where many
+``InputData`` cases hand identical content to the same parsers.  It is
+off unless pytest is run with ``--parse-cache``.
+"""
+import hashlib
+import time
+
+from collections import OrderedDict
+from insights.core import plugins
+from insights.core.context import Context
+
+
+def content_hash(lines):
+    """
+    str: Returns a hex digest identifying a list of content lines, suitable
+    as a cache key.
+    """
+    digest = hashlib.sha1()
+    for line in lines:
+        digest.update(line.encode('utf-8', 'replace'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class LRUCache(object):
+    """
+    A mapping bounded to ``maxsize`` entries that evicts the least recently
+    used entry first and counts hits and misses.
+
+    Examples:
+        >>> cache = LRUCache(2)
+        >>> cache.put('a', 1)
+        >>> cache.put('b', 2)
+        >>> cache.get('a')
+        1
+        >>> cache.put('c', 3)  # 'b' is the least recently used
+        >>> cache.get('b') is None
+        True
+        >>> cache.stats()
+        {'hits': 1, 'misses': 1, 'size': 2, 'maxsize': 2, 'hit_rate': 0.5}
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """Returns the value stored for ``key``, counting a hit or a miss."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Stores ``value`` for ``key``, evicting the oldest entry when full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry and resets the counters."""
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_rate(self):
+        """float: Fraction of lookups that were hits, 0.0 before any lookup."""
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        """dict: Returns the counters, current size and hit rate."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hit_rate,
+        }
+
+
+def _context_key(context):
+    if isinstance(context, list):
+        keys = tuple(_context_key(c) for c in context)
+        return None if None in keys else keys
+    if not isinstance(context, Context):
+        return None
+    path = context.path
+    if path and path.endswith('BOGUS'):
+        # Generated by InputData, unique per case and meaningless to parsers
+        path = None
+    content = context.content
+    return path, tuple(content) if isinstance(content, list) else content
+
+
+def _parse_mode(component):
+    parse_mode = getattr(component, 'parse_mode', None)
+    return parse_mode() if parse_mode else None
+
+
+class ParseCache(LRUCache):
+    """
+    Cache of parsed components keyed on the parser, its ``parse_mode`` and
+    the content of its spec, used to parse identical test input once per
+    session.  Parsers building different results from the same content
+    depending on class level settings, such as
+    :class:`insights_examples.parsers.secure_shell.SSHDConfig` in compact
+    mode, return those settings from a ``parse_mode`` class method.
+
+    :meth:`install` wraps the invocation of every parser by insights.  Only
+    specs given as test contexts, as built by ``InputData`` and
+    ``context_wrap``, are cached; content read from archives and parsers
+    that raised or recorded an error are always parsed again.  Cached
+    objects are shared between the cases, so the parsers must not be
+    modified by the components using them.
+
+    Attributes:
+        parse_seconds (float): Time spent parsing on misses.
+        saved_seconds (float): Parse time the hits avoided, measured when
+            each entry was first parsed.
+    """
+
+    def __init__(self, maxsize=4096):
+        super(ParseCache, self).__init__(maxsize)
+        self.parse_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._invoke = None
+
+    def install(self):
+        """Starts caching the parsers evaluated by insights in this process."""
+        if self._invoke is not None:
+            return
+        cache = self
+        invoke = self._invoke = plugins.parser.invoke
+
+        def cached_invoke(delegate, broker):
+            key = _context_key(broker.get(delegate.requires[0]))
+            if key is None:
+                return invoke(delegate, broker)
+            key = (delegate.component, _parse_mode(delegate.component), key)
+            entry = cache.get(key)
+            if entry is not None:
+                cache.saved_seconds += entry[1]
+                return entry[0]
+            start = time.time()
+            value = invoke(delegate, broker)
+            seconds = time.time() - start
+            cache.parse_seconds += seconds
+            if not broker.exceptions.get(delegate.component):
+                cache.put(key, (value, seconds))
+            return value
+
+        plugins.parser.invoke = cached_invoke
+
+    def uninstall(self):
+        """Restores the original parser invocation."""
+        if self._invoke is not None:
+            plugins.parser.invoke = self._invoke
+            self._invoke = None
+
+    def clear(self):
+        super(ParseCache, self).clear()
+        self.parse_seconds = self.saved_seconds = 0.0
+
+    def report(self):
+        """str: Returns a one line summary of the hits and the time saved."""
+        return "parse cache: {0} hits, {1} misses, {2:.3f}s of parsing saved ({3:.3f}s spent parsing)".format(
+            self.hits, self.misses, self.saved_seconds, self.parse_seconds)
@@ -1,13 +1,17 @@
 from insights.core.plugins import combiner
 from insights.parsers.hostname import Hostname
-from insights.parsers.uname import Uname
+from insights.parsers.uname import Uname, UnameError
+from insights.specs import Specs
+from insights_examples.fallback import parse
 
 
-@combiner([Hostname, Uname])
+# Uname is only parsed from its spec on the hosts without a Hostname, see
+# insights_examples.fallback
+@combiner([Hostname, Specs.uname])
 class HostnameUH(object):
 
     def __init__(self, hostname, uname):
         if hostname:
             self.hostname = hostname.fqdn
         else:
-            self.hostname = uname.nodename
+            self.hostname = parse(Uname, uname, errors=(UnameError,)).nodename
@@ -0,0 +1,135 @@
+"""
+fallback - Any-of dependencies parsed on demand
+===============================================
+
+A combiner that prefers one parser and falls back to another when the
+first is missing still pays for parsing the fallback on every host when
+both are plain dependencies.  Depending on the spec of the fallback
+instead defers the parse: spec content is only read when it is accessed,
+so :func:`parse` builds the fallback parser only on the hosts where the
+combiner actually needs it::
+
+    @combiner([Hostname, Specs.uname])
+    class HostnameUH(object):
+        def __init__(self, hostname, uname):
+            if hostname:
+                self.hostname = hostname.fqdn
+            else:
+                self.hostname = parse(Uname, uname, errors=(UnameError,)).nodename
+
+The combiner keeps the "any of" requirement of the list: it runs when at
+least one of its dependencies is present.  Its public dependency becomes
+the spec rather than the fallback parser, which is only built on demand.
+Content the fallback parser rejects, with a ``ParseException``, a
+``ContentException`` or one of the ``errors`` given to :func:`parse`,
+skips the combiner, as a missing dependency would.  Any other exception is
+a bug and fails the combiner.
+
+A :class:`FallbackCounter` attached to a broker counts, per combiner of
+:data:`PREFERRED`, how often each path ran so the parse work saved over a
+fleet can be measured, e.g. by the batch runner.
+
+Examples:
+    >>> counter = FallbackCounter()
+    >>> counter.record('HostnameUH', fallback=False)
+    >>> counter.record('HostnameUH', fallback=False)
+    >>> counter.record('HostnameUH', fallback=True)
+    >>> counter.stats()
+    {'HostnameUH': {'preferred': 2, 'fallback': 1, 'fallback_rate': 0.3333333333333333}}
+"""
+from insights.core import dr
+from insights.core.exceptions import ContentException, ParseException
+from insights.core.plugins import SkipComponent, combiner
+
+PREFERRED = {
+    "insights_examples.combiners.hostname_uh.HostnameUH": "insights.parsers.hostname.Hostname",
+}
+"""dict: The preferred dependency of each combiner with a fallback, by name."""
+
+
+def parse(parser, value, errors=()):
+    """
+    Returns ``value``, the content of a spec, parsed with the ``parser``
+    class.  ``value`` is returned as is when it already is an instance of
+    ``parser`` or is ``None``.  ``errors`` are the exception classes
+    ``parser`` raises for bad content besides ``ParseException`` and
+    ``ContentException``.
+
+    Raises:
+        SkipComponent: When ``parser`` rejects the content, so the combiner
+            calling it is skipped like when the parser is a dependency that
+            failed.
+    """
+    if value is None or isinstance(value, parser):
+        return value
+    try:
+        return parser(value)
+    except (ParseException, ContentException) + tuple(errors) as ex:
+        raise SkipComponent("%s failed: %s" % (dr.get_name(parser), ex))
+
+
+class FallbackCounter(object):
+    """
+    Counts how often each combiner used its preferred dependency and how
+    often it fell back.
+
+    Attributes:
+        preferred (dict): The preferred dependency of each combiner
+            counted by :meth:`attach`, by name.
+        counts (dict): ``[preferred, fallback]`` counts keyed by combiner
+            name.
+    """
+
+    def __init__(self, preferred=PREFERRED):
+        self.preferred = preferred
+        self.counts = {}
+
+    def attach(self, broker):
+        """
+        Registers the counter as an observer of ``broker``, recording every
+        evaluation of the combiners of ``preferred``.
+        """
+        broker.add_observer(self._observe, combiner)
+        return broker
+
+    def _observe(self, component, broker):
+        name = dr.get_name(component)
+        if name not in self.preferred or component not in broker:
+            return
+        preferred = [d for d in dr.get_dependencies(component) if dr.get_name(d) == self.preferred[name]]
+        self.record(name, fallback=not any(d in broker for d in preferred))
+
+    def record(self, component, fallback):
+        """Counts one evaluation of ``component``, a combiner or its name."""
+        name = component if isinstance(component, str) else dr.get_name(component)
+        self.counts.setdefault(name, [0, 0])[1 if fallback else 0] += 1
+
+    def snapshot(self):
+        """dict: Returns a copy of ``counts``, e.g. to compute deltas."""
+        return dict((name, tuple(c)) for name, c in self.counts.items())
+
+    def clear(self):
+        self.counts.clear()
+
+    def stats(self):
+        """
+        dict: Returns the ``preferred`` and ``fallback`` counts and the
+        ``fallback_rate`` of each combiner.
+        """
+        return stats(self.counts)
+
+
+def stats(counts):
+    """
+    dict: Returns the statistics of :meth:`FallbackCounter.stats` for
+    ``counts``, a dict of ``(preferred, fallback)`` pairs keyed by name.
+    """
+    result = {}
+    for name, (preferred, fallback) in counts.items():
+        total = preferred + fallback
+        result[name] = {
+            "preferred": preferred,
+            "fallback": fallback,
+            "fallback_rate": float(fallback) / total if total else 0.0,
+        }
+    return result
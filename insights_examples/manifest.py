@@ -0,0 +1,212 @@
+"""
+manifest - Precomputed components of the example rules
+=======================================================
+
+``manifest.json``, next to this module, lists every rule of
+``insights_examples.rules`` with the module defining it, the parsers and
+combiners it depends on, the specs it reads and their filters, and the
+specs implemented by :mod:`insights_examples.specs`.  It is generated by
+loading all the components once::
+
+    $ python -m insights_examples.manifest
+    4 rules written to insights_examples/manifest.json
+
+``--check`` fails when the file is out of date, or when an implementation
+of :mod:`insights_examples.specs` no longer matches the one of insights.
+
+:func:`load_rules` uses the manifest to import only the modules of the
+rules asked for, and, when all the specs they read are in
+:mod:`insights_examples.specs`, to load those instead of the default specs
+of insights.  Loading and evaluating the three default rules on one
+extracted archive, in a new process each time::
+
+    $ python -m insights_examples.manifest --measure /data/host1
+    default specs   0.440s
+    manifest        0.328s (75% of default)
+
+Only insights archives can be evaluated without the default specs.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from insights import load_default_plugins
+from insights.core import dr, filters
+from insights.core.context import HostArchiveContext
+from insights.core.plugins import is_combiner, is_parser, is_rule
+from insights.core.spec_factory import RegistryPoint
+from insights.specs import Specs
+
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manifest.json')
+"""str: Path of the manifest shipped with the examples."""
+
+SPECS_MODULE = 'insights_examples.specs'
+"""str: Module of the minimal spec implementations."""
+
+
+def _contexts(ds):
+    # Contexts a spec implementation runs in
+    if hasattr(ds, 'dep'):
+        return _contexts(ds.dep)
+    context = getattr(ds, 'context', None)
+    return set(context) if isinstance(context, list) else set([context])
+
+
+def _describe(ds):
+    # What an implementation reads, to compare two of them
+    if hasattr(ds, 'dep'):
+        return [type(ds).__name__, _describe(ds.dep)]
+    for attr in ('path', 'cmd', 'patterns', 'paths'):
+        if hasattr(ds, attr):
+            return [type(ds).__name__, getattr(ds, attr)]
+    return [type(ds).__name__]
+
+
+def _archive_implementations(point):
+    # Implementations of point for insights archives, ours and insights' ones
+    ours, theirs = None, None
+    for ds in dr.get_dependencies(point):
+        if HostArchiveContext not in _contexts(ds):
+            continue
+        if ds.__module__ == SPECS_MODULE:
+            ours = ds
+        elif theirs is None or ds.__module__ == 'insights.specs.insights_archive':
+            theirs = ds
+    return ours, theirs
+
+
+def build(package='insights_examples.rules'):
+    """
+    Loads the default specs, :mod:`insights_examples.specs` and the rules
+    of ``package`` and returns their manifest.
+
+    Raises:
+        ValueError: When an implementation of :mod:`insights_examples.specs`
+            reads something else than the one of insights.
+    """
+    load_default_plugins()
+    dr.load_components(SPECS_MODULE, continue_on_error=False)
+    dr.load_components(package, continue_on_error=False)
+
+    archive_specs = []
+    for point in Specs.registry.values():
+        ours, theirs = _archive_implementations(point)
+        if ours is None:
+            continue
+        if theirs is None or _describe(ours) != _describe(theirs):
+            raise ValueError("%s differs from the insights implementation of %s" % (dr.get_name(ours), dr.get_name(point)))
+        archive_specs.append(dr.get_name(point))
+
+    rules = {}
+    for rule in dr.DELEGATES:
+        if not is_rule(rule) or not rule.__module__.startswith(package):
+            continue
+        graph = dr.get_dependency_graph(rule)
+        specs = sorted((c for c in graph if isinstance(c, RegistryPoint)), key=dr.get_name)
+        rules[dr.get_name(rule)] = {
+            'module': rule.__module__,
+            'dependencies': sorted(dr.get_name(c) for c in graph if is_parser(c) or is_combiner(c)),
+            'specs': [dr.get_name(s) for s in specs],
+            'filters': dict((dr.get_name(s), sorted(filters.get_filters(s))) for s in specs if s.filterable),
+        }
+    return {'specs_module': SPECS_MODULE, 'archive_specs': sorted(archive_specs), 'rules': rules}
+
+
+def save(manifest, path=MANIFEST_FILE):
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load(path=MANIFEST_FILE):
+    """dict: Returns the manifest stored at ``path``."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_rules(rule_names, default_specs=False, manifest=None):
+    """
+    Loads the named rules and returns a tuple of the rules and the combined
+    dependency graph needed to evaluate them.
+
+    Only the modules of the rules are imported.  The specs of
+    :mod:`insights_examples.specs` are loaded instead of the default ones
+    when the rules read no other spec, unless ``default_specs`` is set or
+    a rule is not in the ``manifest`` (read from :data:`MANIFEST_FILE` by
+    default).
+    """
+    manifest = manifest or load()
+    entries = [manifest['rules'].get(name) for name in rule_names]
+    minimal = set(manifest['archive_specs'])
+    if default_specs or None in entries or any(not minimal.issuperset(e['specs']) for e in entries):
+        load_default_plugins()
+    else:
+        dr.load_components(manifest['specs_module'], continue_on_error=False)
+        for module in sorted(set(e['module'] for e in entries)):
+            dr.load_components(module, continue_on_error=False)
+    rules = [dr.get_component(name) for name in rule_names]
+    graph = {}
+    for rule in rules:
+        graph.update(dr.get_dependency_graph(rule))
+    return rules, graph
+
+
+_MEASURE = """
+from insights_examples.tools import batch
+rules, graph = batch.load_rules(%r, default_specs=%r)
+batch.evaluate(%r, rules, graph)
+"""
+
+
+def measure_startup(archive, rule_names, repeat=5):
+    """
+    Returns the best wall time in seconds, over ``repeat`` new processes,
+    of loading ``rule_names`` and evaluating them on ``archive``, keyed by
+    ``"default"`` for the default specs and ``"manifest"`` for
+    :func:`load_rules`.
+    """
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(p for p in [root, env.get('PYTHONPATH')] if p)
+    times = {}
+    for key, default_specs in [('default', True), ('manifest', False)]:
+        code = _MEASURE % (tuple(rule_names), default_specs, archive)
+        runs = []
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.check_call([sys.executable, '-c', code], env=env)
+            runs.append(time.time() - start)
+        times[key] = min(runs)
+    return times
+
+
+def main():
+    p = argparse.ArgumentParser(description="Generate the component manifest of the example rules.")
+    p.add_argument('--check', action='store_true', help="Fail if the manifest is out of date instead of writing it.")
+    p.add_argument('--measure', metavar='ARCHIVE', help="Measure the start-up time with and without the manifest.")
+    p.add_argument('-o', '--output', default=MANIFEST_FILE, help="Manifest file.")
+    args = p.parse_args()
+
+    if args.measure:
+        from insights_examples.tools import batch
+        times = measure_startup(args.measure, batch.DEFAULT_RULES)
+        print("default specs   {0:.3f}s".format(times['default']))
+        print("manifest        {0:.3f}s ({1:.0%} of default)".format(times['manifest'], times['manifest'] / times['default']))
+        return
+
+    manifest = build()
+    if args.check:
+        if not os.path.exists(args.output) or load(args.output) != manifest:
+            sys.exit("%s is out of date, run python -m insights_examples.manifest" % args.output)
+        return
+    save(manifest, args.output)
+    print("{0} rules written to {1}".format(len(manifest['rules']), os.path.relpath(args.output)))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,12 +8,41 @@ provides a ``list`` of all configuration lines present in
 the file.
 
 """
+import fnmatch
+import ipaddress
 import os
+import re
+import sys
 
+from array import array
 from collections import namedtuple
+from functools import partial
+try:
+    from collections.abc import Sequence
+except ImportError:  # pragma: no cover
+    from collections import Sequence
 from insights import Parser, parser, get_active_lines
+from insights.core.plugins import datasource
 from insights.core.spec_factory import SpecSet, simple_file
+from insights.parsers import ParseException
 from insights.specs import Specs
+from insights_examples.cache import LRUCache, content_hash
+
+
+_MATCH_RE = re.compile(r'\s*match\s', re.IGNORECASE)
+_INCLUDE_RE = re.compile(r'\s*include\s', re.IGNORECASE)
+
+# The same over a whole buffer in zero-copy mode
+_MATCH_LINE_RE = re.compile(br'^[^\S\n]*match[^\S\n]', re.IGNORECASE | re.MULTILINE)
+_INCLUDE_LINE_RE = re.compile(br'^[^\S\n]*include[^\S\n]', re.IGNORECASE | re.MULTILINE)
+
+MAX_INCLUDE_DEPTH = 16
+"""int: Deepest nesting of ``Include`` directives accepted, as in OpenSSH."""
+
+INCLUDE_CACHE_SIZE = 1024
+"""int: Number of distinct included files kept parsed by content hash."""
+
+_include_cache = LRUCache(INCLUDE_CACHE_SIZE)
 
 
 class LocalSpecs(SpecSet):
@@ -23,8 +52,440 @@ class LocalSpecs(SpecSet):
     sshd_config = simple_file(conf_file)
 
 
-@parser(Specs.sshd_config)
-class SSHDConfig(Parser):
+def _path_matches(pattern, path):
+    # Like glob, wildcards never match across directories
+    parts, names = pattern.split('/'), path.split('/')
+    return len(parts) == len(names) and all(fnmatch.fnmatchcase(n, p) for n, p in zip(names, parts))
+
+
+class IncludeResolver(object):
+    """
+    Expands ``Include`` directives found in ``sshd_config`` content.
+
+    The files that can be included are the ``fragments``, the contents of
+    the ``Specs.sshd_config_d`` spec keyed by their absolute path on the
+    host, so they are filtered like ``sshd_config`` itself.  Relative
+    patterns are taken from ``/etc/ssh`` like ``sshd`` does, matching
+    fragments are read in lexical order and files that were not collected
+    are skipped.  The active lines of each fragment are cached
+    process-wide keyed by a hash of its content, so identical drop-in
+    fragments shared by many archives are only parsed once.
+
+    Raises:
+        ParseException: When an included file includes itself, directly or
+            indirectly, or includes are nested deeper than
+            ``MAX_INCLUDE_DEPTH``.
+    """
+
+    def __init__(self, fragments, max_depth=MAX_INCLUDE_DEPTH):
+        self.fragments = fragments
+        self.max_depth = max_depth
+
+    def expand(self, lines, _stack=()):
+        """
+        Yields ``lines`` with each ``Include`` line replaced by the active
+        lines of the files it names.
+        """
+        for line in lines:
+            if not _INCLUDE_RE.match(line):
+                yield line
+                continue
+            if len(_stack) >= self.max_depth:
+                raise ParseException("Include nested deeper than %d: %s" % (self.max_depth, line.strip()))
+            for pattern in line.split('#', 1)[0].split()[1:]:
+                for path in self.resolve(pattern):
+                    if path in _stack:
+                        raise ParseException("Include cycle: %s" % ' -> '.join(_stack + (path,)))
+                    for included in self.expand(self.read(path), _stack + (path,)):
+                        yield included
+
+    def resolve(self, pattern):
+        """list: Returns the sorted paths of the fragments matching ``pattern``."""
+        pattern = os.path.normpath(os.path.join('/etc/ssh', pattern))
+        return sorted(p for p in self.fragments if _path_matches(pattern, p))
+
+    def read(self, path):
+        """tuple: Returns the active lines of ``path``, parsing it at most once per content."""
+        content = self.fragments[path]
+        key = content_hash(content)
+        lines = _include_cache.get(key)
+        if lines is None:
+            lines = tuple(get_active_lines(content))
+            _include_cache.put(key, lines)
+        return lines
+
+
+class IncludingProvider(object):
+    """
+    The provider of ``sshd_config`` content together with the drop-in files
+    its ``Include`` directives may name, as returned by
+    :func:`sshd_config_files`.  Every other attribute is the provider's.
+
+    Attributes:
+        fragments (dict): The content of each drop-in file, keyed by its
+            absolute path on the host.
+    """
+
+    def __init__(self, provider, fragments):
+        self._provider = provider
+        self.fragments = dict(('/' + f.relative_path.lstrip('/'), f.content) for f in fragments)
+
+    def __getattr__(self, name):
+        return getattr(self._provider, name)
+
+
+@datasource(Specs.sshd_config, optional=[Specs.sshd_config_d])
+def sshd_config_files(broker):
+    """
+    Returns the ``sshd_config`` spec, with the files of the
+    ``sshd_config_d`` spec when there are any, for :class:`SSHDConfig` to
+    expand ``Include`` directives.  Both specs are filtered, so rules add
+    the same filters to both.
+    """
+    config = broker[Specs.sshd_config]
+    fragments = broker.get(Specs.sshd_config_d)
+    return IncludingProvider(config, fragments) if fragments else config
+
+
+class CompactKeyValue(object):
+    """
+    Slot-backed replacement for ``SSHDConfig.KeyValue`` used in compact mode.
+
+    Only the keyword and value are stored, the keyword is interned so that
+    every row (and every parsed config in the process) shares one copy of it,
+    and ``kw_lower`` is computed on demand.  Rows still iterate, unpack,
+    index and compare like the ``KeyValue`` namedtuple.
+    """
+    __slots__ = ('keyword', 'value')
+    _fields = ('keyword', 'value', 'kw_lower')
+
+    def __init__(self, keyword, value):
+        self.keyword = sys.intern(keyword)
+        self.value = value
+
+    @property
+    def kw_lower(self):
+        return self.keyword.lower()
+
+    def _astuple(self):
+        return (self.keyword, self.value, self.keyword.lower())
+
+    def _asdict(self):
+        return dict(zip(self._fields, self._astuple()))
+
+    def __iter__(self):
+        return iter(self._astuple())
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        return self._astuple()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, CompactKeyValue)):
+            return self._astuple() == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __repr__(self):
+        return 'KeyValue(keyword=%r, value=%r, kw_lower=%r)' % self._astuple()
+
+
+def _decode(buf, start, end):
+    return buf[start:end].decode('utf-8', 'surrogateescape')
+
+
+def _key_value(row_type, keyword, value):
+    return row_type(keyword, value, keyword.lower())
+
+
+class BufferLines(Sequence):
+    """
+    The ``lines`` of a configuration parsed in zero-copy mode.
+
+    The content is kept as one ``bytes`` buffer and each line as the start
+    and end offsets of its keyword and value, four ``array`` items.  Rows
+    are only decoded into ``KeyValue`` (or :class:`CompactKeyValue`) objects
+    when indexed or iterated, and are not kept.
+    """
+
+    def __init__(self, buf, offsets, row_type):
+        self._buf = buf
+        self._offsets = offsets
+        self._row_type = row_type
+
+    def _row(self, i):
+        buf, offsets = self._buf, self._offsets
+        return self._row_type(_decode(buf, offsets[i], offsets[i + 1]), _decode(buf, offsets[i + 2], offsets[i + 3]))
+
+    def __len__(self):
+        return len(self._offsets) // 4
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('line index out of range')
+        return self._row(index * 4)
+
+    def __iter__(self):
+        for i in range(0, len(self._offsets), 4):
+            yield self._row(i)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, BufferLines)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _BufferValues(Sequence):
+    # Values of one keyword in zero-copy mode, decoded when read
+    def __init__(self, buf, offsets, rows):
+        self._buf = buf
+        self._offsets = offsets
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        i = self._rows[index] * 4
+        return _decode(self._buf, self._offsets[i + 2], self._offsets[i + 3])
+
+
+class _Directives(object):
+    """
+    Keyword lookups shared by :class:`SSHDConfig` and :class:`MatchSection`.
+
+    Subclasses call ``_load`` with the active lines they hold to build
+    ``lines``, ``keywords`` and the keyword index.
+    """
+
+    KeyValue = namedtuple('KeyValue', ['keyword', 'value', 'kw_lower'])
+    """namedtuple: Represent name value pair as a namedtuple with case ."""
+
+    compact = False
+
+    # Set on results shared through SSHDConfig.cache, see _freeze
+    _frozen = False
+
+    def _load(self, active_lines):
+        self.lines = []
+        # Lowercase keyword -> (values, line positions), both in file order,
+        # so lookups never have to scan ``self.lines``.
+        self._index = {}
+        for line in active_lines:
+            parts = line.split(None, 1)
+            if len(parts) == 1:
+                # As _load_buffer, whatever the mode
+                raise ParseException("Missing value: %s" % line.strip())
+            kw, val = (w.strip() for w in parts)
+            if self.compact:
+                kv = CompactKeyValue(kw, val)
+                kw_lower = sys.intern(kw.lower())
+            else:
+                kv = self.KeyValue(kw, val, kw.lower())
+                kw_lower = kv.kw_lower
+            values, positions = self._index.setdefault(kw_lower, ([], []))
+            values.append(val)
+            positions.append(len(self.lines))
+            self.lines.append(kv)
+        self.keywords = set(self._index)
+
+    def _load_buffer(self, buf, start, end):
+        # Zero-copy counterpart of _load over buf[start:end]: only offsets
+        # and row numbers are kept, see BufferLines
+        offsets = array('I')
+        rows_by_keyword = {}
+        row = 0
+        for line in buf[start:end].split(b'\n'):
+            code = line.split(b'#', 1)[0] if b'#' in line else line
+            parts = code.split(None, 1)
+            if parts:
+                if len(parts) == 1:
+                    raise ParseException("Missing value: %s" % code.strip().decode('utf-8', 'surrogateescape'))
+                keyword, value = parts
+                keyword_start = start + len(code) - len(code.lstrip())
+                value_start = start + len(code) - len(value)
+                offsets.extend((keyword_start, keyword_start + len(keyword), value_start, value_start + len(value.rstrip())))
+                rows = rows_by_keyword.get(keyword)
+                if rows is None:
+                    rows = rows_by_keyword[keyword] = array('I')
+                rows.append(row)
+                row += 1
+            start += len(line) + 1
+
+        positions = {}
+        for keyword, rows in rows_by_keyword.items():
+            kw_lower = sys.intern(keyword.decode('utf-8', 'surrogateescape').lower())
+            if kw_lower in positions:
+                # The same keyword spelled differently
+                rows = array('I', sorted(positions[kw_lower] + rows))
+            positions[kw_lower] = rows
+        if self.compact:
+            self.lines = BufferLines(buf, offsets, CompactKeyValue)
+        else:
+            self.lines = BufferLines(buf, offsets, partial(_key_value, self.KeyValue))
+        self._index = dict((kw, (_BufferValues(buf, offsets, rows), rows)) for kw, rows in positions.items())
+        self.keywords = set(self._index)
+
+    def _freeze(self):
+        # Parsed results shared between configurations are made immutable,
+        # so a rule modifying one can't change the others
+        self._frozen = True
+        if isinstance(self.lines, list):
+            self.lines = tuple(self.lines)
+        self.keywords = frozenset(self.keywords)
+        self._index = dict((kw, (tuple(values), tuple(positions)) if isinstance(values, list) else (values, positions))
+                           for kw, (values, positions) in self._index.items())
+
+    def __contains__(self, keyword):
+        return keyword.lower() in self._index
+
+    def __iter__(self):
+        for line in self.lines:
+            yield line
+
+    def __getitem__(self, keyword):
+        entry = self._index.get(keyword.lower())
+        if entry:
+            return list(entry[0])
+
+    def last(self, keyword):
+        """str: Returns the value of the last keyword found in config."""
+        entry = self._index.get(keyword.lower())
+        if entry:
+            return entry[0][-1]
+
+    def positions(self, keyword):
+        """list: Returns the indexes into ``lines`` where the keyword occurs."""
+        entry = self._index.get(keyword.lower())
+        return list(entry[1]) if entry else []
+
+    def get_many(self, keywords):
+        """
+        dict: Returns the values of several keywords in one call, keyed by
+        the keyword as given.  Keywords not present map to ``None``.
+        """
+        return dict((keyword, self[keyword]) for keyword in keywords)
+
+
+def _pattern_matches(pattern, value, criterion):
+    if criterion in ('address', 'localaddress') and '/' in pattern:
+        try:
+            return ipaddress.ip_address(value) in ipaddress.ip_network(pattern, strict=False)
+        except ValueError:
+            return False
+    if criterion == 'host':
+        return fnmatch.fnmatchcase(value.lower(), pattern.lower())
+    return fnmatch.fnmatchcase(value, pattern)
+
+
+class MatchSection(_Directives):
+    """
+    The directives of one ``Match`` block in ``sshd_config``.
+
+    The body of the block is kept as raw lines, or as its range of the
+    buffer in zero-copy mode, until ``lines``, ``keywords`` or any lookup
+    is first used, so files with many ``Match`` blocks cost little to parse
+    when only global settings are read.
+
+    Attributes:
+        criteria (str): The criteria following the ``Match`` keyword,
+            e.g. ``'User alice,bob Address 10.0.0.0/8'``.
+        conditions (list): The criteria as ``(criterion, patterns)`` pairs,
+            with the criterion lowercased and the patterns split on commas.
+    """
+
+    def __init__(self, criteria, body, compact=False, includes=None):
+        self.criteria = criteria
+        self._body = body
+        self._includes = includes
+        self.compact = compact
+        words = criteria.split()
+        self.conditions = []
+        if len(words) == 1 and words[0].lower() == 'all':
+            self.conditions.append(('all', []))
+        else:
+            for criterion, patterns in zip(words[::2], words[1::2]):
+                self.conditions.append((criterion.lower(), patterns.split(',')))
+
+    def __getattr__(self, name):
+        # Only reached while the body has not been parsed yet.
+        if name in ('lines', 'keywords', '_index') and '_body' in self.__dict__:
+            body = self.__dict__.pop('_body')
+            if isinstance(body, tuple):
+                # (buffer, start, end) of the body in zero-copy mode
+                self._load_buffer(*body)
+            else:
+                if self._includes:
+                    body = self._includes.expand(body)
+                self._load(get_active_lines(body))
+            if self._frozen:
+                self._freeze()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    @property
+    def parsed(self):
+        """bool: Whether the body of the section has been parsed yet."""
+        return '_body' not in self.__dict__
+
+    def matches(self, match_criteria):
+        """
+        Returns ``True`` if a connection described by ``match_criteria``
+        meets every condition of this section.
+
+        Parameters:
+            match_criteria (dict): Connection attributes keyed by criterion
+                name (case-insensitive), e.g. ``{'User': 'alice',
+                'Address': '10.0.0.5'}``.  ``Group`` may be given as a list
+                of the groups the user belongs to.  A condition whose
+                criterion is missing from the dict does not match.
+        """
+        supplied = dict((k.lower(), v) for k, v in match_criteria.items())
+        for criterion, patterns in self.conditions:
+            if criterion == 'all':
+                continue
+            if criterion not in supplied:
+                return False
+            values = supplied[criterion]
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            if not any(self._value_matches(criterion, patterns, str(v)) for v in values):
+                return False
+        return True
+
+    @staticmethod
+    def _value_matches(criterion, patterns, value):
+        matched = False
+        for pattern in patterns:
+            if pattern.startswith('!'):
+                if _pattern_matches(pattern[1:], value, criterion):
+                    return False
+            elif _pattern_matches(pattern, value, criterion):
+                matched = True
+        return matched
+
+
+@parser(sshd_config_files)
+class SSHDConfig(_Directives, Parser):
     """Parsing for ``sshd_config`` file.
 
     Sample content from the ``/etc/sshd/sshd_config`` file is::
@@ -42,11 +503,51 @@ class SSHDConfig(Parser):
         #Protocol 2
         Protocol 1
 
+        Match User backup
+            PermitRootLogin yes
+
+    Directives that follow a ``Match`` line only apply to connections
+    meeting its criteria, so they are kept out of the global settings and
+    collected into :class:`MatchSection` objects instead.  The body of each
+    section is only parsed the first time it is looked at.
+
+    ``Include`` directives are expanded in place by :class:`IncludeResolver`
+    with the drop-in files collected by the ``Specs.sshd_config_d`` spec
+    (``/etc/ssh/sshd_config.d/*.conf``), see :func:`sshd_config_files`, so
+    they are part of the configuration.  Content given without them, e.g.
+    by ``context_wrap``, keeps its ``Include`` lines as directives.
+
     Attributes:
         lines (list): List of `KeyValue` namedtupules for each line in
-            the configuration file.
-        keywords (set): Set of keywords present in the configuration
-            file, each keyword has been converted to lowercase.
+            the global part of the configuration file.
+        keywords (set): Set of keywords present in the global part of the
+            configuration file, each keyword has been converted to
+            lowercase.
+        match_sections (list): List of :class:`MatchSection` objects, one
+            for each ``Match`` block in file order.
+        content_hash (str): Hash of the (filtered) content when ``cache``
+            is enabled, ``None`` otherwise.
+        compact (bool): Class level switch, when set to ``True`` each line
+            is stored as a :class:`CompactKeyValue` instead of a
+            ``KeyValue`` namedtuple.  This roughly halves the memory held
+            per line, which matters when many parsed configurations are
+            kept alive in batch runs; see
+            :mod:`insights_examples.tools.sshd_memory`.
+        zero_copy (bool): Class level switch, when set to ``True`` the
+            content is kept as one ``bytes`` buffer and ``lines`` is a
+            :class:`BufferLines` holding the offsets of each keyword and
+            value in it.  Strings are only decoded when rows are iterated
+            or values looked up, for a fraction of the memory of compact
+            mode and faster parsing of large files.  Content with
+            ``Include`` directives to expand is parsed as usual.
+        cache (LRUCache): Class level, opt-in cache of parsed results keyed
+            by a hash of the content.  When set to an
+            :class:`insights_examples.cache.LRUCache`, configurations with
+            byte-identical content share one parsed result.  It is frozen:
+            ``lines`` and ``match_sections`` are tuples, ``keywords`` a
+            ``frozenset``, and so are the lines and keywords of each
+            :class:`MatchSection` once parsed.  Content with ``Include``
+            directives is never cached.
 
     Examples:
         >>> 'Port' in sshd_config
@@ -63,32 +564,105 @@ class SSHDConfig(Parser):
         [KeyValue(keyword='Port', value='22', kw_lower='port'), KeyValue(keyword='Port', value='22', kw_lower='port')]
         >>> sshd_config.last('ListenAddress')  # Easy way of finding the current configuration for a single item
         '10.110.1.1'
+        >>> sshd_config.get_many(['Port', 'Protocol', 'LogLevel'])  # Several keywords in one call
+        {'Port': ['22', '22'], 'Protocol': ['1'], 'LogLevel': None}
+        >>> 'PermitRootLogin' in sshd_config  # Match blocks are not global settings
+        False
+        >>> sshd_config.match_sections[0].criteria
+        'User backup'
+        >>> sshd_config.effective('PermitRootLogin', {'User': 'backup'})
+        'yes'
+        >>> sshd_config.effective('PermitRootLogin', {'User': 'alice'}) is None
+        True
     """
 
-    KeyValue = namedtuple('KeyValue', ['keyword', 'value', 'kw_lower'])
-    """namedtuple: Represent name value pair as a namedtuple with case ."""
+    cache = None
 
-    def parse_content(self, content):
-        self.lines = []
-        for line in get_active_lines(content):
-            kw, val = (w.strip() for w in line.split(None, 1))
-            self.lines.append(self.KeyValue(kw, val, kw.lower()))
-        self.keywords = set([k.kw_lower for k in self.lines])
+    zero_copy = False
 
-    def __contains__(self, keyword):
-        return keyword.lower() in self.keywords
+    _PARSED_ATTRS = ('lines', 'keywords', 'match_sections', '_index')
 
-    def __iter__(self):
-        for line in self.lines:
-            yield line
+    @classmethod
+    def parse_mode(cls):
+        """tuple: The class level settings changing the parsed result, see ``ParseCache``."""
+        return (cls.compact, cls.zero_copy, cls.cache)
 
-    def __getitem__(self, keyword):
-        kw = keyword.lower()
-        if kw in self.keywords:
-            return [kv.value for kv in self.lines if kv.kw_lower == kw]
+    def _handle_content(self, context):
+        fragments = getattr(context, 'fragments', None)
+        self._includes = IncludeResolver(fragments) if fragments else None
+        self.content_hash = None
+        if self.cache is None or (self._includes and any(_INCLUDE_RE.match(l) for l in context.content)):
+            # Included files are not part of the content, so the hash
+            # would not identify the parsed result
+            return super(SSHDConfig, self)._handle_content(context)
 
-    def last(self, keyword):
-        """str: Returns the value of the last keyword found in config."""
-        entries = self.__getitem__(keyword)
-        if entries:
-            return entries[-1]
+        self.content_hash = content_hash(context.content)
+        key = (self.compact, self.zero_copy, self.content_hash)
+        parsed = self.cache.get(key)
+        if parsed is None:
+            super(SSHDConfig, self)._handle_content(context)
+            self._freeze()
+            self.match_sections = tuple(self.match_sections)
+            for section in self.match_sections:
+                if section.parsed:
+                    section._freeze()
+                else:
+                    section._frozen = True
+            self.cache.put(key, dict((a, getattr(self, a)) for a in self._PARSED_ATTRS))
+        else:
+            self.__dict__.update(parsed)
+
+    def parse_content(self, content):
+        includes = getattr(self, '_includes', None)
+        if self.zero_copy:
+            buf = '\n'.join(content).encode('utf-8', 'surrogateescape')
+            if not (includes and b'include' in buf.lower() and _INCLUDE_LINE_RE.search(buf)):
+                return self._parse_buffer(buf)
+        self.match_sections = []
+        global_lines = []
+        section_body = global_lines
+        for line in content:
+            expanded = (line,)
+            # Includes inside Match blocks are left for MatchSection to
+            # expand when the section is first used.
+            if includes and section_body is global_lines and _INCLUDE_RE.match(line):
+                expanded = includes.expand(expanded)
+            for line in expanded:
+                if _MATCH_RE.match(line):
+                    criteria = line.split('#', 1)[0].strip()[len('match'):].strip()
+                    section_body = []
+                    self.match_sections.append(MatchSection(criteria, section_body, self.compact, includes))
+                else:
+                    section_body.append(line)
+        self._load(get_active_lines(global_lines))
+
+    def _parse_buffer(self, buf):
+        # Searching a lowercase copy first is several times faster than
+        # the line regex on content without Match blocks
+        match = _MATCH_LINE_RE.search(buf) if b'match' in buf.lower() else None
+        self._load_buffer(buf, 0, match.start() if match else len(buf))
+        self.match_sections = []
+        while match:
+            line_end = buf.find(b'\n', match.end())
+            if line_end == -1:
+                line_end = len(buf)
+            criteria = _decode(buf, match.end(), line_end).split('#', 1)[0].strip()
+            body_start, match = line_end, _MATCH_LINE_RE.search(buf, line_end)
+            body = (buf, body_start, match.start() if match else len(buf))
+            self.match_sections.append(MatchSection(criteria, body, self.compact))
+
+    def effective(self, keyword, match_criteria=None):
+        """
+        str: Returns the value of the keyword in effect for a connection
+        described by ``match_criteria`` (see :meth:`MatchSection.matches`).
+        The first matching ``Match`` section that sets the keyword wins, as
+        in ``sshd``, otherwise the global value is used.  Within the section,
+        or globally, the value is the one of :meth:`last`, as read by the
+        rules, while ``sshd`` keeps the first occurrence of a keyword.
+        Sections that don't match are never parsed.
+        """
+        if match_criteria:
+            for section in self.match_sections:
+                if section.matches(match_criteria) and keyword in section:
+                    return section.last(keyword)
+        return self.last(keyword)
@@ -0,0 +1,161 @@
+"""
+targeted_rpms - Installed packages needed by the rules only
+===========================================================
+
+``InstalledRpms`` builds an ``InstalledRpm`` for each of the thousands of
+packages of a host, while most rules look at one or two of them.  Rules
+declare the packages they need with :func:`add_packages`, as they declare
+filters with ``add_filter``, and depend on :class:`TargetedRpms` instead::
+
+    add_packages('bash')
+
+    @rule(TargetedRpms)
+    def check_bash_bug(rpms):
+        bash = rpms.get_max('bash')
+
+When the spec is a file of an archive that insights has not read yet,
+:class:`TargetedRpms` maps it into memory and searches the buffer for the
+declared names, so only the lines holding one of them are ever decoded
+and parsed.  The buffer is searched for the bad lines ``CommandParser``
+rejects as well, such as ``command not found``.  Other specs, like test
+input or command output, are read through their provider and scanned line
+by line for the names, with the same result.  The result has the
+interface of ``InstalledRpms`` restricted to the declared packages: a
+package no loaded rule declared is reported as not installed, so rules
+must declare every package they look up.
+
+With 5,000 installed packages in a file, looking for one of them takes
+0.7ms and 6KiB of memory at peak against 58ms and 2.3MiB for a full
+``InstalledRpms`` (``parse_installed_rpms_targeted`` in
+:mod:`insights_examples.tools.benchmark`).  Files of a page or less are
+read and checked by ``InstalledRpms`` as usual.
+"""
+import logging
+import mmap
+import os
+import re
+
+from insights import parser
+from insights.core import CommandParser, Parser
+from insights.core.exceptions import ContentException, SkipComponent
+from insights.core.spec_factory import MAX_CONTENT_SIZE, TextFileProvider
+from insights.parsers.installed_rpms import InstalledRpms
+from insights.specs import Specs
+
+log = logging.getLogger(__name__)
+
+PACKAGES = set()
+"""set: Names of the packages declared by the loaded rules."""
+
+# Lines InstalledRpms keeps as errors, needed to tell a corrupt database
+_ERROR_MARKERS = ('error:', 'warning:')
+
+# The bad lines of CommandParser, matched case insensitively as it does
+_BAD_SINGLE_LINES = re.compile(b'|'.join(re.escape(l.encode('utf-8')) for l in
+                                         CommandParser._CommandParser__bad_single_lines), re.I)
+_BAD_LINES = re.compile(b'|'.join(re.escape(l.encode('utf-8')) for l in
+                                  CommandParser._CommandParser__bad_lines), re.I)
+_NOT_BLANK = re.compile(br'\S')
+
+
+def add_packages(names):
+    """
+    Declares the package ``names``, a string or a list of strings, needed
+    from :class:`TargetedRpms` by a rule.
+    """
+    PACKAGES.update([names] if isinstance(names, str) else names)
+
+
+def find_lines(buf, needles):
+    """
+    Returns, in file order, the lines of ``buf`` (``bytes`` or an ``mmap``)
+    that contain any of the ``needles`` bytes.
+    """
+    spans = {}
+    size = len(buf)
+    for needle in needles:
+        pos = buf.find(needle)
+        while pos != -1:
+            start = buf.rfind(b'\n', 0, pos) + 1
+            end = buf.find(b'\n', pos)
+            if end == -1:
+                end = size
+            spans[start] = end
+            pos = buf.find(needle, end)
+    return [buf[s:e].decode('utf-8', 'surrogateescape').rstrip('\r') for s, e in sorted(spans.items())]
+
+
+def find_bad_line(buf):
+    """
+    Returns the first line of ``buf`` (``bytes`` or an ``mmap``) when
+    ``CommandParser`` would reject it as content: a single line holding one
+    of its bad single lines or several lines, one of them holding one of
+    its bad lines.  Returns ``None`` for valid content.
+    """
+    end = len(buf)
+    while end and buf[end - 1:end] in (b'\n', b'\r'):
+        end -= 1
+    single = buf.find(b'\n', 0, end) == -1
+    if (_BAD_SINGLE_LINES if single else _BAD_LINES).search(buf, 0, end):
+        first = buf.find(b'\n')
+        return buf[:end if first == -1 else first].decode('utf-8', 'surrogateescape').rstrip('\r')
+
+
+def _mappable(context):
+    # Only files the provider would read whole and unfiltered, and has not
+    # read yet, give the lines of its content.  Files of a page or less are
+    # read as usual, mapping them saves nothing.
+    if type(context) is not TextFileProvider or context.loaded or context._filters:
+        return False
+    if not os.path.isfile(context.path):
+        return False
+    return mmap.PAGESIZE < os.path.getsize(context.path) <= MAX_CONTENT_SIZE
+
+
+@parser(Specs.installed_rpms)
+class TargetedRpms(InstalledRpms):
+    """
+    ``InstalledRpms`` holding the packages of :data:`PACKAGES` only.
+
+    Attributes:
+        targets (frozenset): The package names looked for.
+    """
+
+    def __init__(self, context):
+        if _mappable(context):
+            # CommandParser reads the whole content to look for bad lines,
+            # _handle_content searches the mapped file for them instead
+            self.errors = []
+            self.unparsed = []
+            self.packages = {}
+            Parser.__init__(self, context)
+        else:
+            super(TargetedRpms, self).__init__(context)
+
+    @classmethod
+    def parse_mode(cls):
+        """frozenset: The packages looked for, see ``ParseCache``."""
+        return frozenset(PACKAGES)
+
+    def _handle_content(self, context):
+        if not PACKAGES:
+            log.warning("No packages declared with add_packages, TargetedRpms is empty")
+        self.targets = frozenset(PACKAGES)
+        needles = sorted(self.targets) + list(_ERROR_MARKERS)
+        if _mappable(context):
+            with open(context.path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    bad = find_bad_line(buf)
+                    if bad is not None:
+                        raise ContentException(self.__class__.__name__ + ": " + bad)
+                    if not _NOT_BLANK.search(buf):
+                        raise SkipComponent("The content of rpm command is empty!")
+                    lines = find_lines(buf, [n.encode('utf-8') for n in needles])
+        else:
+            if not any(l.strip() for l in context.content):
+                raise SkipComponent("The content of rpm command is empty!")
+            lines = [l for l in context.content if any(n in l for n in needles)]
+        if lines:
+            self.parse_content(lines)
+            # Names are matched anywhere in a line, drop the near misses
+            self.packages = dict((n, p) for n, p in self.packages.items() if n in self.targets)
@@ -0,0 +1,117 @@
+"""
+policy - Declarative checks of configuration directives
+=======================================================
+
+A :class:`DirectivePolicy` is a table of :func:`directive` rules, each
+stating the values a configuration keyword may take and what to report
+when the keyword is not set at all.  The table is compiled once when the
+policy is created.  Evaluating it against a parsed configuration such as
+:class:`insights_examples.parsers.secure_shell.SSHDConfig` looks up only
+the policy keywords in its keyword index, so the cost does not depend on
+the size of the configuration, and no other line is decoded in zero-copy
+mode.
+
+The result is an ``errors`` dict keyed by keyword: the offending value for
+a keyword set to a value that is not accepted, or the rule's ``default``
+for a keyword that is not set.
+
+Examples:
+    >>> policy = DirectivePolicy([
+    ...     directive('LogLevel', 'verbose'),
+    ...     directive('PermitRootLogin', ['no', 'prohibit-password']),
+    ...     directive('Protocol', '2', default=None),
+    ... ])
+    >>> policy.keywords
+    ['LogLevel', 'PermitRootLogin', 'Protocol']
+    >>> policy.evaluate(sshd_config)
+    {'LogLevel': 'default', 'PermitRootLogin': 'yes'}
+"""
+from collections import namedtuple
+
+DirectiveRule = namedtuple('DirectiveRule', ['keyword', 'expected', 'default', 'ignore_case'])
+"""namedtuple: One row of a policy table, see :func:`directive`."""
+
+
+def directive(keyword, expected, default='default', ignore_case=True):
+    """
+    Returns a :class:`DirectiveRule`.
+
+    Parameters:
+        keyword (str): The configuration keyword checked, in any case.
+        expected (str or list): The accepted value or values.
+        default (str): Reported when the keyword is not set, ``None`` when
+            the built-in default is acceptable.
+        ignore_case (bool): Whether values are compared ignoring case.
+    """
+    if isinstance(expected, str):
+        expected = [expected]
+    return DirectiveRule(keyword, tuple(expected), default, ignore_case)
+
+
+class DirectivePolicy(object):
+    """
+    A compiled table of :class:`DirectiveRule` rows.
+
+    Raises:
+        ValueError: When two rules check the same keyword.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        # (lowercase keyword, keyword, accepted values, ignore case, default)
+        self._compiled = []
+        seen = set()
+        for rule in self.rules:
+            kw_lower = rule.keyword.lower()
+            if kw_lower in seen:
+                raise ValueError("Keyword %s is checked twice" % rule.keyword)
+            seen.add(kw_lower)
+            accepted = frozenset(v.lower() for v in rule.expected) if rule.ignore_case else frozenset(rule.expected)
+            self._compiled.append((kw_lower, rule.keyword, accepted, rule.ignore_case, rule.default))
+        self._watched = frozenset(seen)
+
+    @property
+    def keywords(self):
+        """list: The keywords checked, e.g. for ``add_filter``."""
+        return [rule.keyword for rule in self.rules]
+
+    def check_value(self, index, value):
+        """
+        Returns the error the rule at ``index`` reports for ``value``, the
+        last value of its keyword or ``None`` when not set, or ``None``
+        when there is nothing to report.  An empty value counts as not set.
+        """
+        kw_lower, keyword, accepted, ignore_case, default = self._compiled[index]
+        if not value:
+            return default
+        if (value.lower() if ignore_case else value) not in accepted:
+            return value
+
+    def evaluate(self, config, errors=None, match_criteria=None):
+        """
+        Evaluates every rule against ``config``.  The value checked for a
+        keyword is the one :meth:`SSHDConfig.effective` returns for a
+        connection described by ``match_criteria``, the last global value
+        when not given.  ``config`` may also be any iterable of lines with
+        ``kw_lower`` and ``value`` attributes, which is then scanned once
+        for the last value of each keyword.
+
+        Returns:
+            dict: ``errors`` (a new dict if not given) updated with the
+            error of every failing rule, in policy order.
+        """
+        if hasattr(config, 'effective'):
+            values = dict((kw_lower, config.effective(keyword, match_criteria))
+                          for kw_lower, keyword, _, _, _ in self._compiled)
+        else:
+            watched = self._watched
+            values = {}
+            for line in config:
+                if line.kw_lower in watched:
+                    values[line.kw_lower] = line.value
+        errors = {} if errors is None else errors
+        for index, compiled in enumerate(self._compiled):
+            error = self.check_value(index, values.get(compiled[0]))
+            if error is not None:
+                errors[compiled[1]] = error
+        return errors
@@ -11,23 +11,32 @@ $ insights-run -p insights_examples.rules.bash_bug
 or from the insights_examples/rules directory::
 
 $ python bash_bug.py
+
+The affected version range is the ``BASH_BUG`` entry of the advisory data
+file, see :mod:`insights_examples.advisories`.
 """
 from insights import rule, make_pass, make_fail
-from insights.parsers.installed_rpms import InstalledRpm, InstalledRpms
+from insights_examples.advisories import ADVISORIES_FILE, AdvisoryIndex
+from insights_examples.parsers.targeted_rpms import TargetedRpms, add_packages
 
 ERROR_KEY_BASH_BUG = "BASH_BUG"
 
+ADVISORIES = AdvisoryIndex.load()
+
+# Data the results depend on, see insights_examples.tools.incremental
+DATA_FILES = [ADVISORIES_FILE]
+
+add_packages('bash')
+
 CONTENT = {
     ERROR_KEY_BASH_BUG: "{{found}}{{bash}}"
 }
 
 
-@rule(InstalledRpms)
+@rule(TargetedRpms)
 def check_bash_bug(rpms):
-    bug_version = InstalledRpm.from_package('bash-4.4.14-1.any')
-    fix_version = InstalledRpm.from_package('bash-4.4.18-1.any')
     current_version = rpms.get_max('bash')
-    if bug_version <= current_version < fix_version:
+    if ADVISORIES.is_affected(ERROR_KEY_BASH_BUG, current_version):
         found = "Bash bug found! Version: "
         return make_fail(ERROR_KEY_BASH_BUG, bash=current_version.nvr, found=found)
     else:
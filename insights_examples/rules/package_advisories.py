@@ -0,0 +1,42 @@
+"""
+Package Advisories
+==================
+
+Reports every advisory of :mod:`insights_examples.advisories` that affects
+the newest installed version of a package.  Adding an advisory to the data
+file is enough to have it checked, there is no rule function per advisory.
+This example can be run against the local host using the following
+command::
+
+$ insights-run -p insights_examples.rules.package_advisories
+"""
+from insights import run
+from insights.core.plugins import make_fail, rule
+from insights_examples.advisories import ADVISORIES_FILE, AdvisoryIndex
+from insights_examples.parsers.targeted_rpms import TargetedRpms, add_packages
+
+ERROR_KEY = "PACKAGE_ADVISORIES"
+
+CONTENT = ERROR_KEY + """
+:{% for advisory in advisories %}
+    {{advisory.id}}: {{advisory.installed}}
+{%- endfor %}""".strip()
+
+ADVISORIES = AdvisoryIndex.load()
+
+# Data the results depend on, see insights_examples.tools.incremental
+DATA_FILES = [ADVISORIES_FILE]
+
+add_packages(ADVISORIES.packages)
+
+
+@rule(TargetedRpms, content=CONTENT)
+def report(installed_rpms):
+    matches = ADVISORIES.scan(installed_rpms)
+    if matches:
+        advisories = [{'id': a.id, 'installed': installed.nvr} for a, installed in matches]
+        return make_fail(ERROR_KEY, advisories=advisories)
+
+
+if __name__ == "__main__":
+    run(report, print_summary=True)
@@ -1,9 +1,10 @@
 from insights import add_filter
 from insights import run
 from insights.core.plugins import make_fail, rule
-from insights.parsers.installed_rpms import InstalledRpms
 from insights.specs import Specs
 from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.parsers.targeted_rpms import TargetedRpms, add_packages
+from insights_examples.policy import DirectivePolicy, directive
 
 ERROR_KEY = "SSHD_SECURE"
 
@@ -16,56 +17,45 @@ CONTENT = ERROR_KEY + """
 OPEN_SSH_PACKAGE: {{openssh}}""".strip()
 
 
-def check_auth_method(sshd_config, errors):
-
-    auth_method = sshd_config.last('AuthenticationMethods')
-    if auth_method:
-        if auth_method.lower() != 'publickey':
-            errors['AuthenticationMethods'] = auth_method
-    else:
-        errors['AuthenticationMethods'] = 'default'
-    return errors
-
-
-def check_log_level(sshd_config, errors):
-    log_level = sshd_config.last('LogLevel')
-    if log_level:
-        if log_level.lower() != 'verbose':
-            errors['LogLevel'] = log_level
-    else:
-        errors['LogLevel'] = 'default'
-    return errors
+# Expected sshd_config settings, looked up in the keyword index of the
+# configuration by check_all
+POLICY = DirectivePolicy([
+    directive('AuthenticationMethods', 'publickey'),
+    directive('LogLevel', 'verbose'),
+    directive('PermitRootLogin', 'no'),
+    # Default Protocol is 2 if not specified
+    directive('Protocol', '2', default=None),
+])
 
+# "Match" keeps the block headers so directives scoped to a Match block
+# are not mistaken for global settings by the parser, "Include" lets the
+# parser expand drop-in files, which are filtered the same way
+for spec in (Specs.sshd_config, Specs.sshd_config_d):
+    add_filter(spec, POLICY.keywords + ["Match", "Include"])
 
-def check_permit_root(sshd_config, errors):
-    permit_root = sshd_config.last('PermitRootLogin')
-    if permit_root:
-        if permit_root.lower() != 'no':
-            errors['PermitRootLogin'] = permit_root
-    else:
-        errors['PermitRootLogin'] = 'default'
-    return errors
+add_packages('openssh')
 
 
-def check_protocol(sshd_config, errors):
-    # Default Protocol is 2 if not specified
-    protocol = sshd_config.last('Protocol')
-    if protocol:
-        if protocol.lower() != '2':
-            errors['Protocol'] = protocol
-    return errors
+# Opt-in cache of check results, set to an
+# insights_examples.cache.LRUCache together with SSHDConfig.cache so hosts
+# with identical sshd_config content share one evaluation of the checks
+check_cache = None
 
 
-add_filter(Specs.sshd_config, ["AuthenticationMethods", "LogLevel", "PermitRootLogin", "Protocol"])
+def check_all(sshd_config):
+    return POLICY.evaluate(sshd_config)
 
 
-@rule(InstalledRpms, SSHDConfig)
+@rule(TargetedRpms, SSHDConfig)
 def report(installed_rpms, sshd_config):
-    errors = {}
-    errors = check_auth_method(sshd_config, errors)
-    errors = check_log_level(sshd_config, errors)
-    errors = check_permit_root(sshd_config, errors)
-    errors = check_protocol(sshd_config, errors)
+    key = getattr(sshd_config, 'content_hash', None) if check_cache is not None else None
+    errors = check_cache.get(key) if key else None
+    if errors is None:
+        errors = check_all(sshd_config)
+        if key:
+            check_cache.put(key, errors)
+    # Results are cached, hand each response its own copy
+    errors = dict(errors)
 
     if errors:
         openssh_version = installed_rpms.get_max('openssh')
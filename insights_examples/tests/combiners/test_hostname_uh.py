@@ -1,7 +1,13 @@
+import pytest
+
+from insights.core import dr
+from insights.core.plugins import SkipComponent
 from insights_examples.combiners.hostname_uh import HostnameUH
+from insights_examples.fallback import FallbackCounter
 from insights.parsers.hostname import Hostname
 from insights.parsers.uname import Uname
-from insights.tests import context_wrap
+from insights.specs import Specs
+from insights.tests import InputData, context_wrap, run_input_data
 
 HOSTNAME = "hostone_h.example.com"
 UNAME = "Linux hostone_u.example.com 3.10.0-693.21.1.el7.x86_64 #1 SMP Fri Feb 23 18:54:16 UTC 2018 x86_64 x86_64 x86_64 GNU/Linux"
@@ -19,3 +25,44 @@ def test_hostname_uh():
 
     hostname_uh = HostnameUH(hostname, uname)
     assert hostname_uh.hostname == HOSTNAME
+
+
+def test_uname_parsed_on_fallback_only():
+    hostname = Hostname(context_wrap(HOSTNAME))
+    # Spec content that is not a valid uname, only parsed when needed
+    bad_uname = context_wrap("Linux")
+
+    assert HostnameUH(hostname, bad_uname).hostname == HOSTNAME
+    assert HostnameUH(None, context_wrap(UNAME)).hostname == "hostone_u.example.com"
+    # A bad uname skips the combiner, like a Uname parser that failed
+    with pytest.raises(SkipComponent):
+        HostnameUH(None, bad_uname)
+
+
+def _run(specs, counter):
+    broker = dr.Broker()
+    counter.attach(broker)
+    for spec, content in specs.items():
+        broker[spec] = context_wrap(content)
+    return dr.run(dr.get_dependency_graph(HostnameUH), broker=broker)
+
+
+def test_hostname_uh_integration():
+    assert Uname not in dr.get_dependency_graph(HostnameUH)
+    input_data = InputData("uname_only")
+    input_data.add(Specs.uname, UNAME)
+    broker = run_input_data(HostnameUH, input_data)
+    assert broker[HostnameUH].hostname == "hostone_u.example.com"
+
+    input_data = InputData("bad_uname_only")
+    input_data.add(Specs.uname, "Linux")
+    assert HostnameUH not in run_input_data(HostnameUH, input_data)
+
+
+def test_fallback_counter():
+    counter = FallbackCounter()
+    assert _run({Specs.hostname: HOSTNAME, Specs.uname: UNAME}, counter)[HostnameUH].hostname == HOSTNAME
+    assert _run({Specs.uname: UNAME}, counter)[HostnameUH].hostname == "hostone_u.example.com"
+    assert HostnameUH not in _run({Specs.uname: "Linux"}, counter)
+    name = "insights_examples.combiners.hostname_uh.HostnameUH"
+    assert counter.stats()[name] == {"preferred": 1, "fallback": 1, "fallback_rate": 0.5}
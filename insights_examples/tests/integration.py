@@ -7,3 +7,5 @@ def pytest_generate_tests(metafunc):
     # Run py.test from the root dir of this rules project, meaning the dir
     # that contains the ``rules`` directory.
     generate_tests(metafunc, test_integration, "insights_examples/tests", pattern=pattern)
+    # To run the same cases over several processes use
+    # python -m insights_examples.tools.integration -j N
@@ -1,6 +1,9 @@
 import doctest
+import pytest
 
+from insights.parsers import ParseException
 from insights.tests import context_wrap
+from insights_examples.cache import LRUCache
 from insights_examples.parsers import secure_shell
 from insights_examples.parsers.secure_shell import SSHDConfig
 
@@ -17,6 +20,9 @@ ListenAddress 10.110.1.1
 # The default requires explicit activation of protocol 1
 #Protocol 2
 Protocol 1
+
+Match User backup
+    PermitRootLogin yes
 """
 
 
@@ -67,3 +73,281 @@ def test_sshd_corner_cases():
     ports = [l for l in config if l.keyword == 'Port']
     assert len(ports) == 2
     assert ports[0].value == '22'
+
+
+def test_sshd_keyword_index():
+    config = SSHDConfig(context_wrap(SSHD_CONFIG_INPUT))
+    assert config.positions('listenaddress') == [1, 3]
+    assert config.positions('AddressFamily') == []
+    assert config.get_many(['PORT', 'ListenAddress', 'LogLevel']) == {
+        'PORT': ['22', '22'],
+        'ListenAddress': ['10.110.0.1', '10.110.1.1'],
+        'LogLevel': None,
+    }
+    # Returned lists are copies, callers can't corrupt the index
+    config['Port'].append('2222')
+    assert config['Port'] == ['22', '22']
+    assert config.last('Port') == '22'
+
+
+def test_sshd_compact_mode():
+    default = SSHDConfig(context_wrap(SSHD_CONFIG_INPUT))
+    SSHDConfig.compact = True
+    try:
+        compact = SSHDConfig(context_wrap(SSHD_CONFIG_INPUT))
+    finally:
+        SSHDConfig.compact = False
+    assert all(isinstance(l, secure_shell.CompactKeyValue) for l in compact)
+    assert list(compact) == list(default)
+    assert compact.keywords == default.keywords
+    assert compact['ListenAddress'] == default['ListenAddress']
+    assert compact.last('Protocol') == '1'
+    row = compact.lines[0]
+    assert (row.keyword, row.value, row.kw_lower) == ('Port', '22', 'port')
+    assert row[2] == 'port' and len(row) == 3
+    assert row._asdict() == default.lines[0]._asdict()
+    # Keywords are interned and shared between rows
+    assert compact.lines[0].keyword is compact.lines[2].keyword
+
+
+def zero_copy(context, compact=False):
+    SSHDConfig.zero_copy, SSHDConfig.compact = True, compact
+    try:
+        return SSHDConfig(context)
+    finally:
+        SSHDConfig.zero_copy, SSHDConfig.compact = False, False
+
+
+def test_sshd_zero_copy_mode():
+    extra = "Protocol 1\nPORT  2222\t# the last one\r\n  AllowUsers alice  bob#carol\n"
+    content = SSHD_CONFIG_INPUT.replace("Protocol 1\n", extra)
+    default = SSHDConfig(context_wrap(content))
+    config = zero_copy(context_wrap(content))
+    assert isinstance(config.lines, secure_shell.BufferLines)
+    assert list(config) == list(default)
+    assert config.lines == default.lines
+    assert len(config.lines) == 7
+    assert config.lines[-1] == ('AllowUsers', 'alice  bob', 'allowusers')
+    assert config.lines[1:3] == default.lines[1:3]
+    assert config.keywords == default.keywords
+    for keyword in default.keywords:
+        assert config[keyword] == default[keyword]
+        assert config.last(keyword) == default.last(keyword)
+        assert config.positions(keyword) == default.positions(keyword)
+    assert config['Port'] == ['22', '22', '2222']
+    assert config['LogLevel'] is None and 'LogLevel' not in config
+    assert config.effective('PermitRootLogin', {'User': 'backup'}) == 'yes'
+    with pytest.raises(IndexError):
+        config.lines[7]
+
+    compact = zero_copy(context_wrap(content), compact=True)
+    assert all(isinstance(l, secure_shell.CompactKeyValue) for l in compact)
+    assert list(compact) == list(default)
+
+
+def test_sshd_missing_value():
+    # Every mode reports a directive without value the same way
+    content = "Port 22\nPermitRootLogin # no value\n"
+    for compact in (False, True):
+        with pytest.raises(ParseException, match="Missing value: PermitRootLogin"):
+            zero_copy(context_wrap(content), compact=compact)
+        SSHDConfig.compact = compact
+        try:
+            with pytest.raises(ParseException, match="Missing value: PermitRootLogin"):
+                SSHDConfig(context_wrap(content))
+        finally:
+            SSHDConfig.compact = False
+
+
+SSHD_MATCH_CONFIG = """
+PermitRootLogin no
+PasswordAuthentication no
+Match User backup,!guest* Address 10.0.0.0/8
+    PermitRootLogin yes  # needed by the backup job
+    PasswordAuthentication yes
+Match Group admins
+    PermitRootLogin prohibit-password
+    X11Forwarding yes
+Match Host *.EXAMPLE.com
+    X11Forwarding no
+Match All
+    AllowTcpForwarding no
+"""
+
+
+def test_sshd_match_sections():
+    config = SSHDConfig(context_wrap(SSHD_MATCH_CONFIG))
+    assert config.last('PermitRootLogin') == 'no'
+    assert config['PermitRootLogin'] == ['no']
+    assert 'X11Forwarding' not in config
+    assert [s.criteria for s in config.match_sections] == [
+        'User backup,!guest* Address 10.0.0.0/8', 'Group admins', 'Host *.EXAMPLE.com', 'All'
+    ]
+    assert not any(s.parsed for s in config.match_sections)
+
+    first = config.match_sections[0]
+    assert first.conditions == [('user', ['backup', '!guest*']), ('address', ['10.0.0.0/8'])]
+    assert first.matches({'user': 'backup', 'Address': '10.1.2.3'})
+    assert not first.matches({'User': 'backup', 'Address': '192.168.0.1'})
+    assert not first.matches({'User': 'backup'})
+    assert not first.parsed
+    assert first.last('PermitRootLogin') == 'yes'
+    assert first.parsed
+    assert first['PasswordAuthentication'] == ['yes']
+    assert first.positions('PasswordAuthentication') == [1]
+
+
+def test_sshd_effective():
+    config = SSHDConfig(context_wrap(SSHD_MATCH_CONFIG))
+    backup = {'User': 'backup', 'Address': '10.0.0.7'}
+    assert config.effective('PermitRootLogin') == 'no'
+    assert config.effective('PermitRootLogin', backup) == 'yes'
+    assert config.effective('PasswordAuthentication', backup) == 'yes'
+    assert config.effective('AllowTcpForwarding', backup) == 'no'
+    admin = {'User': 'alice', 'Group': ['users', 'admins']}
+    assert config.effective('PermitRootLogin', admin) == 'prohibit-password'
+    # First matching section setting the keyword wins
+    assert config.effective('X11Forwarding', dict(admin, Host='web.example.com')) == 'yes'
+    assert config.effective('X11Forwarding', {'Host': 'web.example.COM'}) == 'no'
+    assert config.effective('X11Forwarding', {'User': 'alice'}) is None
+
+    # Only sections that matched get parsed
+    config = SSHDConfig(context_wrap(SSHD_MATCH_CONFIG))
+    assert config.effective('AllowTcpForwarding', admin) == 'no'
+    assert [s.parsed for s in config.match_sections] == [False, True, False, True]
+
+
+def test_sshd_effective_repeated():
+    # Repeated keywords give their last value, globally and within a section
+    config = SSHDConfig(context_wrap("""
+LogLevel INFO
+LogLevel VERBOSE
+Match User backup
+    LogLevel DEBUG
+    LogLevel QUIET
+Match All
+    LogLevel ERROR
+"""))
+    assert config.effective('LogLevel') == 'VERBOSE'
+    assert config.effective('LogLevel', {'User': 'backup'}) == 'QUIET'
+    assert config.effective('LogLevel', {'User': 'alice'}) == 'ERROR'
+
+
+def test_sshd_zero_copy_match_sections():
+    default = SSHDConfig(context_wrap(SSHD_MATCH_CONFIG))
+    config = zero_copy(context_wrap(SSHD_MATCH_CONFIG))
+    assert list(config) == list(default)
+    assert [s.criteria for s in config.match_sections] == [s.criteria for s in default.match_sections]
+    assert not any(s.parsed for s in config.match_sections)
+    backup = {'User': 'backup', 'Address': '10.0.0.7'}
+    assert config.effective('PermitRootLogin', backup) == 'yes'
+    assert [s.parsed for s in config.match_sections] == [True, False, False, False]
+    for section, expected in zip(config.match_sections, default.match_sections):
+        assert list(section) == list(expected)
+        assert section.positions('X11Forwarding') == expected.positions('X11Forwarding')
+
+
+SSHD_INCLUDE_CONFIG = """
+Include /etc/ssh/sshd_config.d/*.conf
+PermitRootLogin no
+Match User backup
+    Include backup.conf
+"""
+
+
+def include_context(fragments, content=SSHD_INCLUDE_CONFIG):
+    """The sshd_config context with the drop-in files of ``fragments``, keyed by path."""
+    return secure_shell.IncludingProvider(
+        context_wrap(content, path='/etc/ssh/sshd_config'),
+        [context_wrap(c, path=p) for p, c in fragments.items()])
+
+
+def test_sshd_include():
+    config = SSHDConfig(include_context({
+        '/etc/ssh/sshd_config.d/50-redhat.conf': 'X11Forwarding yes\nInclude extra.conf',
+        '/etc/ssh/sshd_config.d/10-log.conf': 'LogLevel VERBOSE  # audit',
+        '/etc/ssh/sshd_config.d/sub/20-port.conf': 'Port 2222',
+        '/etc/ssh/extra.conf': 'Ciphers aes256-ctr',
+        '/etc/ssh/backup.conf': 'PermitRootLogin yes',
+    }))
+    assert [l.keyword for l in config] == ['LogLevel', 'X11Forwarding', 'Ciphers', 'PermitRootLogin']
+    # Wildcards don't match across directories
+    assert 'Port' not in config
+    section = config.match_sections[0]
+    assert not section.parsed
+    assert config.effective('PermitRootLogin', {'User': 'backup'}) == 'yes'
+
+    # Content with includes to expand is parsed as usual in zero-copy mode
+    config = zero_copy(include_context({'/etc/ssh/sshd_config.d/10-log.conf': 'LogLevel VERBOSE'}))
+    assert not isinstance(config.lines, secure_shell.BufferLines)
+    assert [l.keyword for l in config] == ['LogLevel', 'PermitRootLogin']
+
+    # Without drop-in files (e.g. unit tests with context_wrap) Include is kept as-is
+    config = SSHDConfig(context_wrap(SSHD_INCLUDE_CONFIG))
+    assert config['Include'] == ['/etc/ssh/sshd_config.d/*.conf']
+
+
+def test_sshd_include_cache():
+    fragments = {'/etc/ssh/sshd_config.d/50-redhat.conf': 'X11Forwarding yes\nUsePAM yes'}
+    secure_shell._include_cache.clear()
+    one = SSHDConfig(include_context(fragments))
+    two = SSHDConfig(include_context(fragments))
+    assert len(secure_shell._include_cache) == 1
+    assert secure_shell._include_cache.hits == 1
+    assert list(one) == list(two)
+
+
+def test_sshd_include_errors():
+    with pytest.raises(ParseException) as exc:
+        SSHDConfig(include_context({'/etc/ssh/a.conf': 'Include b.conf', '/etc/ssh/b.conf': 'Include a.conf'},
+                                   'Include a.conf'))
+    assert 'Include cycle' in str(exc.value)
+
+    fragments = dict(('/etc/ssh/d%d.conf' % i, 'Include d%d.conf' % (i + 1))
+                     for i in range(secure_shell.MAX_INCLUDE_DEPTH + 1))
+    with pytest.raises(ParseException) as exc:
+        SSHDConfig(include_context(fragments, 'Include d0.conf'))
+    assert 'nested deeper' in str(exc.value)
+
+    # Files that were not collected are skipped
+    config = SSHDConfig(include_context({'/etc/ssh/a.conf': 'Port 2222'}, 'Include ../../outside.conf'))
+    assert config.lines == []
+
+
+def test_sshd_parse_cache():
+    SSHDConfig.cache = LRUCache(8)
+    try:
+        one = SSHDConfig(context_wrap(SSHD_MATCH_CONFIG))
+        two = SSHDConfig(context_wrap(SSHD_MATCH_CONFIG))
+        other = SSHDConfig(context_wrap(SSHD_CONFIG_INPUT))
+        assert one.content_hash == two.content_hash != other.content_hash
+        assert two.lines is one.lines
+        assert two.match_sections is one.match_sections
+        assert two.effective('PermitRootLogin', {'User': 'backup', 'Address': '10.0.0.1'}) == 'yes'
+        assert other.last('Protocol') == '1'
+        assert SSHDConfig.cache.stats()['hits'] == 1
+        assert SSHDConfig.cache.stats()['misses'] == 2
+
+        # Shared results can't be modified by one of the hosts using them
+        assert isinstance(two.lines, tuple) and isinstance(two.match_sections, tuple)
+        assert isinstance(two.keywords, frozenset)
+        with pytest.raises(AttributeError):
+            two.lines.append(two.lines[0])
+        two['PermitRootLogin'].append('yes')
+        assert one['PermitRootLogin'] == ['no']
+        section = two.match_sections[0]
+        assert isinstance(section.lines, tuple) and isinstance(section.keywords, frozenset)
+
+        # Content with Include directives depends on other files
+        fragments = {'/etc/ssh/sshd_config.d/a.conf': 'UsePAM yes'}
+        SSHDConfig(include_context(fragments))
+        config = SSHDConfig(include_context(fragments))
+        assert config.content_hash is None
+        assert len(SSHDConfig.cache) == 2
+
+        # Parsed results are not shared between storage modes
+        assert isinstance(zero_copy(context_wrap(SSHD_MATCH_CONFIG)).lines, secure_shell.BufferLines)
+        assert len(SSHDConfig.cache) == 3
+    finally:
+        SSHDConfig.cache = None
+    assert SSHDConfig(context_wrap(SSHD_MATCH_CONFIG)).content_hash is None
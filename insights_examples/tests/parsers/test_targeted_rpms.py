@@ -0,0 +1,123 @@
+import mmap
+
+import pytest
+
+from insights.core.exceptions import ContentException, SkipComponent
+from insights.core.spec_factory import TextFileProvider
+from insights.specs import Specs
+from insights.tests import context_wrap
+from insights_examples.parsers import targeted_rpms
+from insights_examples.parsers.targeted_rpms import TargetedRpms
+from insights_examples.tools import generators
+
+RPMS = """
+bash-4.4.23-1.fc28
+bash-completion-2.7-3.fc28
+error: rpmdbNextIterator: skipping h#     294 Header V4 RSA/SHA256 Signature, key ID fd431d51: BAD
+openssh-7.4p1-16.el7.x86_64
+kernel-4.18.16-300.fc29.x86_64
+""".strip()
+
+
+def spec_file(tmpdir, content):
+    """Returns the provider of ``content`` in an archive extracted at ``tmpdir``."""
+    path = tmpdir.join("insights_commands", "rpm_-qa")
+    path.write(content, ensure=True)
+    return TextFileProvider("insights_commands/rpm_-qa", root=str(tmpdir), ds=Specs.installed_rpms)
+
+
+def test_find_lines():
+    buf = RPMS.encode("utf-8")
+    assert targeted_rpms.find_lines(buf, [b"openssh", b"bash-4"]) == [
+        "bash-4.4.23-1.fc28",
+        "openssh-7.4p1-16.el7.x86_64",
+    ]
+    assert targeted_rpms.find_lines(b"a\r\nbash-1-1\r\n", [b"bash"]) == ["bash-1-1"]
+    assert targeted_rpms.find_lines(buf, [b"zsh"]) == []
+
+
+def test_find_bad_line():
+    assert targeted_rpms.find_bad_line(RPMS.encode("utf-8")) is None
+    assert targeted_rpms.find_bad_line(b"/bin/sh: rpm: Command not found\r\n") == "/bin/sh: rpm: Command not found"
+    assert targeted_rpms.find_bad_line(b"bash-4.4.23-1.fc28\nrpm: command not found\n") is None
+    assert targeted_rpms.find_bad_line(b"bash-4.4.23-1.fc28\nerror: Missing dependencies: x\n") == "bash-4.4.23-1.fc28"
+    assert targeted_rpms.find_bad_line(b"") is None
+
+
+def test_add_packages(monkeypatch):
+    monkeypatch.setattr(targeted_rpms, "PACKAGES", set())
+    targeted_rpms.add_packages("bash")
+    targeted_rpms.add_packages(["openssh", "bash"])
+    assert targeted_rpms.PACKAGES == set(["bash", "openssh"])
+
+
+def test_targeted_rpms(monkeypatch):
+    monkeypatch.setattr(targeted_rpms, "PACKAGES", set(["bash", "openssh"]))
+    rpms = TargetedRpms(context_wrap(RPMS))
+    assert "bash" in rpms.targets and "openssh" in rpms.targets
+    assert rpms.get_max("bash").version == "4.4.23"
+    assert rpms.get_max("openssh").version == "7.4p1"
+    assert "bash-completion" not in rpms.packages
+    assert "kernel" not in rpms.packages
+    assert len(rpms.errors) == 1
+    assert rpms.file_path == "/path"
+
+    with pytest.raises(SkipComponent):
+        TargetedRpms(context_wrap("\n\n"))
+    # Undeclared packages are reported as not installed
+    assert rpms.get_max("kernel") is None
+    assert "kernel" not in rpms
+
+
+def test_targeted_rpms_no_packages(monkeypatch):
+    monkeypatch.setattr(targeted_rpms, "PACKAGES", set())
+    rpms = TargetedRpms(context_wrap(RPMS))
+    assert rpms.packages == {}
+    assert rpms.get_max("bash") is None
+
+
+def test_targeted_rpms_mapped(monkeypatch, tmpdir):
+    monkeypatch.setattr(targeted_rpms, "PACKAGES", set(["bash"]))
+    lines = generators.installed_rpms(1000)
+    content = "\n".join(lines + ["bash-4.4.23-1.fc28", "bash-completion-2.7-3.fc28"]) + "\n"
+    spec = spec_file(tmpdir, content)
+    assert targeted_rpms._mappable(spec)
+
+    rpms = TargetedRpms(spec)
+    assert not spec.loaded
+    assert [p.version for p in rpms.packages["bash"]][-1] == "4.4.23"
+    assert list(rpms.packages) == ["bash"]
+    assert rpms.file_path == "/insights_commands/rpm_-qa"
+    assert rpms.file_name == "rpm_-qa"
+
+    # The same result as from the content of the provider
+    read = TargetedRpms(context_wrap(spec.content))
+    assert spec.loaded and not targeted_rpms._mappable(spec)
+    assert read.packages == rpms.packages
+    assert read.errors == rpms.errors
+
+
+def test_targeted_rpms_mapped_bad_lines(monkeypatch, tmpdir):
+    monkeypatch.setattr(targeted_rpms, "PACKAGES", set(["bash"]))
+    spec = spec_file(tmpdir, "\n".join(generators.installed_rpms(1000) + ["error: Missing dependencies: librpm"]) + "\n")
+    with pytest.raises(ContentException):
+        TargetedRpms(spec)
+
+    spec = spec_file(tmpdir, "/bin/sh: rpm: command not found" + " " * mmap.PAGESIZE + "\n")
+    assert targeted_rpms._mappable(spec)
+    with pytest.raises(ContentException, match="TargetedRpms: /bin/sh: rpm: command not found"):
+        TargetedRpms(spec)
+
+    spec = spec_file(tmpdir, " \n" * mmap.PAGESIZE)
+    assert targeted_rpms._mappable(spec)
+    with pytest.raises(SkipComponent):
+        TargetedRpms(spec)
+
+
+def test_targeted_rpms_small_file(monkeypatch, tmpdir):
+    monkeypatch.setattr(targeted_rpms, "PACKAGES", set(["bash"]))
+    spec = spec_file(tmpdir, "bash-4.4.23-1.fc28\n")
+    assert not targeted_rpms._mappable(spec)
+    assert not targeted_rpms._mappable(context_wrap(RPMS))
+    assert TargetedRpms(spec).get_max("bash").version == "4.4.23"
+    assert spec.loaded
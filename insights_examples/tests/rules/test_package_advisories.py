@@ -0,0 +1,31 @@
+from insights.specs import Specs
+from insights.tests import InputData, archive_provider
+from insights.core.plugins import make_fail
+from insights_examples.rules import package_advisories
+
+NOTHING_AFFECTED = """
+bash-4.4.23-1.fc28
+openssh-7.4p1-21.el7.x86_64
+""".strip()
+
+AFFECTED = """
+bash-4.4.14-1.fc28
+openssh-7.4p1-16.el7.x86_64
+""".strip()
+
+
+@archive_provider(package_advisories.report)
+def integration_test():
+
+    input_data = InputData("nothing_affected")
+    input_data.add(Specs.installed_rpms, NOTHING_AFFECTED)
+    yield input_data, None
+
+    input_data = InputData("affected")
+    input_data.add(Specs.installed_rpms, AFFECTED)
+    expected = make_fail(package_advisories.ERROR_KEY, advisories=[
+        {'id': 'BASH_BUG', 'installed': 'bash-4.4.14-1.fc28'},
+        {'id': 'OPENSSH_BUG', 'installed': 'openssh-7.4p1-16.el7'},
+        {'id': 'OPENSSH_7_4_BUG', 'installed': 'openssh-7.4p1-16.el7'},
+    ])
+    yield input_data, expected
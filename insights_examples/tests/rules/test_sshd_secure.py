@@ -1,6 +1,9 @@
+from insights_examples.cache import LRUCache
+from insights_examples.parsers.secure_shell import SSHDConfig
 from insights_examples.rules import sshd_secure
-from insights.tests import InputData, archive_provider
+from insights.tests import InputData, archive_provider, context_wrap
 from insights.core.plugins import make_fail
+from insights.parsers.installed_rpms import InstalledRpms
 from insights.specs import Specs
 
 OPENSSH_RPM = """
@@ -24,6 +27,14 @@ PermitRootLogin Yes
 Protocol 1
 """.strip()
 
+MATCH_CONFIG = """
+AuthenticationMethods publickey
+LogLevel VERBOSE
+PermitRootLogin No
+Match User backup
+    PermitRootLogin Yes
+""".strip()
+
 DEFAULT_CONFIG = """
 # All default config values
 """.strip()
@@ -42,6 +53,11 @@ def integration_tests():
     input_data.add(Specs.installed_rpms, OPENSSH_RPM)
     yield input_data, None
 
+    input_data = InputData("MATCH_CONFIG")
+    input_data.add(Specs.sshd_config, MATCH_CONFIG)
+    input_data.add(Specs.installed_rpms, OPENSSH_RPM)
+    yield input_data, None
+
     input_data = InputData("BAD_CONFIG")
     input_data.add(Specs.sshd_config, BAD_CONFIG)
     input_data.add(Specs.installed_rpms, OPENSSH_RPM)
@@ -68,3 +84,18 @@ def integration_tests():
                              errors=errors,
                              openssh=EXPECTED_OPENSSH)
     yield input_data, expected
+
+
+def test_check_cache():
+    SSHDConfig.cache = sshd_secure.check_cache = LRUCache(8)
+    try:
+        rpms = InstalledRpms(context_wrap(OPENSSH_RPM))
+        first = sshd_secure.report(rpms, SSHDConfig(context_wrap(BAD_CONFIG)))
+        second = sshd_secure.report(rpms, SSHDConfig(context_wrap(BAD_CONFIG)))
+        assert first == second
+        assert first['errors'] is not second['errors']
+        assert sshd_secure.report(rpms, SSHDConfig(context_wrap(GOOD_CONFIG))) is None
+        # One hit each for the parsed config and the check results
+        assert sshd_secure.check_cache.hits == 2
+    finally:
+        SSHDConfig.cache = sshd_secure.check_cache = None
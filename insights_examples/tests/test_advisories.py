@@ -0,0 +1,82 @@
+import doctest
+import json
+
+import pytest
+
+from insights.parsers.installed_rpms import InstalledRpm, InstalledRpms
+from insights.tests import context_wrap
+from insights_examples import advisories
+from insights_examples.advisories import AdvisoryIndex
+
+ENTRIES = [
+    {'id': 'A', 'package': 'bash', 'affected': 'bash-4.0-1.any', 'fixed': 'bash-4.4.20-1.any'},
+    {'id': 'B', 'package': 'bash', 'affected': 'bash-4.1-1.any', 'fixed': 'bash-4.2-1.any'},
+    {'id': 'C', 'package': 'bash', 'affected': 'bash-4.3-1.any', 'fixed': 'bash-4.4.15-1.any'},
+    {'id': 'D', 'package': 'bash', 'affected': 'bash-5.0-1.any', 'fixed': 'bash-5.1-1.any'},
+    {'id': 'E', 'package': 'kernel', 'affected': 'kernel-3.10.0-1.any', 'fixed': 'kernel-3.10.0-693.any'},
+]
+
+
+def rpm(nvr):
+    return InstalledRpm.from_package(nvr)
+
+
+def test_affecting():
+    index = AdvisoryIndex.from_dicts(ENTRIES)
+    assert index.packages == ['bash', 'kernel']
+
+    def ids(nvr):
+        return [a.id for a in index.affecting(rpm(nvr))]
+    assert ids('bash-3.2-1.el5') == []
+    assert ids('bash-4.1.2-15.el6') == ['A', 'B']
+    assert ids('bash-4.4.14-1.fc28') == ['A', 'C']
+    assert ids('bash-4.4.19-1.fc28') == ['A']
+    assert ids('bash-4.4.20-1.fc28') == []
+    assert ids('bash-5.0.7-1.fc31') == ['D']
+    assert ids('zsh-5.0-1.fc28') == []
+
+
+def test_affecting_brute_force():
+    index = AdvisoryIndex.from_dicts(ENTRIES)
+    for nvr in ['bash-4.0-1.el6', 'bash-4.2-1.el7', 'bash-4.3.30-2.el7', 'bash-4.4.16-1.el8', 'bash-6.0-1.el9']:
+        installed = rpm(nvr)
+        expected = set(a.id for a in index.advisories.values()
+                       if a.package == 'bash' and a.affected <= installed < a.fixed)
+        assert set(a.id for a in index.affecting(installed)) == expected
+
+
+def test_scan():
+    index = AdvisoryIndex.from_dicts(ENTRIES)
+    rpms = InstalledRpms(context_wrap("""
+bash-4.1.2-15.el6.x86_64
+kernel-3.10.0-514.el7.x86_64
+kernel-3.10.0-693.el7.x86_64
+openssh-6.6.1p1-31.el7.x86_64
+"""))
+    # Only the newest kernel counts
+    assert [(a.id, i.nvr) for a, i in index.scan(rpms)] == [('A', 'bash-4.1.2-15.el6'), ('B', 'bash-4.1.2-15.el6')]
+    assert index.is_affected('B', rpms.get_max('bash'))
+    assert not index.is_affected('E', rpms.get_max('kernel'))
+
+
+def test_invalid_entries():
+    with pytest.raises(ValueError):
+        AdvisoryIndex.from_dicts(ENTRIES + [ENTRIES[0]])
+    with pytest.raises(ValueError):
+        AdvisoryIndex.from_dicts([{'id': 'X', 'package': 'bash', 'affected': 'zsh-1-1.any', 'fixed': 'bash-2-1.any'}])
+
+
+def test_load(tmpdir):
+    path = tmpdir.join('advisories.json')
+    path.write(json.dumps(ENTRIES))
+    assert sorted(AdvisoryIndex.load(str(path)).advisories) == ['A', 'B', 'C', 'D', 'E']
+    assert 'BASH_BUG' in AdvisoryIndex.load().advisories
+
+
+def test_advisories_documentation():
+    env = {
+        'AdvisoryIndex': AdvisoryIndex,
+        'installed_bash': rpm('bash-4.4.14-1.fc28'),
+    }
+    failed, total = doctest.testmod(advisories, globs=env)
+    assert failed == 0
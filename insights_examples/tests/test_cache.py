@@ -0,0 +1,80 @@
+import doctest
+
+from insights.parsers.installed_rpms import InstalledRpms
+from insights.parsers.uname import Uname
+from insights.specs import Specs
+from insights.tests import InputData, run_input_data
+from insights_examples import cache
+from insights_examples.cache import LRUCache, ParseCache, content_hash
+from insights_examples.parsers.secure_shell import CompactKeyValue, SSHDConfig
+
+
+def test_lru_cache():
+    lru = LRUCache(2)
+    assert lru.hit_rate == 0.0
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1
+    lru.put('c', 3)
+    assert 'b' not in lru
+    assert 'a' in lru and 'c' in lru
+    assert len(lru) == 2
+    assert lru.get('b', 'missing') == 'missing'
+    assert (lru.hits, lru.misses) == (1, 1)
+    lru.clear()
+    assert len(lru) == 0
+    assert lru.stats() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2, 'hit_rate': 0.0}
+
+
+def test_content_hash():
+    assert content_hash(['Port 22', 'Protocol 2']) == content_hash(['Port 22', 'Protocol 2'])
+    assert content_hash(['Port 22', 'Protocol 2']) != content_hash(['Port 22Protocol 2'])
+
+
+def test_parse_cache():
+    parse_cache = ParseCache()
+    parse_cache.install()
+    try:
+        brokers = []
+        for name in ("first", "second"):
+            input_data = InputData(name)
+            input_data.add(Specs.installed_rpms, "openssh-6.6.1p1-31.el7.x86_64")
+            input_data.add(Specs.uname, "Linux")
+            brokers.append(run_input_data(InstalledRpms, input_data))
+            run_input_data(Uname, input_data)
+        assert brokers[0][InstalledRpms] is brokers[1][InstalledRpms]
+        # The invalid uname fails every time and is never cached
+        assert (parse_cache.hits, parse_cache.misses) == (1, 3)
+        assert parse_cache.saved_seconds > 0
+        assert "1 hits, 3 misses" in parse_cache.report()
+
+        input_data = InputData("path")
+        input_data.add(Specs.installed_rpms, "openssh-6.6.1p1-31.el7.x86_64", path="/other/path")
+        assert run_input_data(InstalledRpms, input_data)[InstalledRpms] is not brokers[0][InstalledRpms]
+    finally:
+        parse_cache.uninstall()
+    parse_cache.clear()
+    assert parse_cache.saved_seconds == 0.0
+
+
+def test_parse_cache_mode(monkeypatch):
+    parse_cache = ParseCache()
+    parse_cache.install()
+    try:
+        parsed = []
+        for compact in (False, True, False):
+            monkeypatch.setattr(SSHDConfig, "compact", compact)
+            input_data = InputData()
+            input_data.add(Specs.sshd_config, "LogLevel VERBOSE")
+            parsed.append(run_input_data(SSHDConfig, input_data)[SSHDConfig])
+        # Parsed again when the class level mode changes only
+        assert parsed[0] is not parsed[1]
+        assert parsed[2] is parsed[0]
+        assert isinstance(parsed[1].lines[0], CompactKeyValue)
+    finally:
+        parse_cache.uninstall()
+
+
+def test_cache_documentation():
+    failed, total = doctest.testmod(cache)
+    assert failed == 0
@@ -0,0 +1,60 @@
+import doctest
+
+import pytest
+
+from insights.core.exceptions import ParseException
+from insights.core.plugins import SkipComponent
+from insights.parsers.uname import Uname, UnameError
+from insights.tests import context_wrap
+from insights_examples import fallback
+from insights_examples.combiners.hostname_uh import HostnameUH
+from insights_examples.fallback import FallbackCounter, parse
+
+UNAME = "Linux host1.example.com 3.10.0-693.21.1.el7.x86_64 #1 SMP Fri Feb 23 18:54:16 UTC 2018 x86_64 x86_64 x86_64 GNU/Linux"
+
+
+def test_parse():
+    assert parse(Uname, None) is None
+    uname = parse(Uname, context_wrap(UNAME))
+    assert uname.nodename == "host1.example.com"
+    assert parse(Uname, uname) is uname
+
+
+class Broken(object):
+    def __init__(self, context):
+        raise ParseException("bad content")
+
+
+class Buggy(object):
+    def __init__(self, context):
+        return context.missing
+
+
+def test_parse_errors():
+    with pytest.raises(SkipComponent):
+        parse(Broken, context_wrap(UNAME))
+    with pytest.raises(SkipComponent):
+        parse(Uname, context_wrap("Linux"), errors=(UnameError,))
+    # Bad content the parser reports otherwise and bugs are not skipped
+    with pytest.raises(UnameError):
+        parse(Uname, context_wrap("Linux"))
+    with pytest.raises(AttributeError):
+        parse(Buggy, context_wrap(UNAME))
+
+
+def test_fallback_counter():
+    counter = FallbackCounter()
+    counter.record(HostnameUH, fallback=True)
+    snapshot = counter.snapshot()
+    counter.record(HostnameUH, fallback=False)
+    assert snapshot == {"insights_examples.combiners.hostname_uh.HostnameUH": (0, 1)}
+    assert counter.counts == {"insights_examples.combiners.hostname_uh.HostnameUH": [1, 1]}
+    counter.clear()
+    assert counter.stats() == {}
+    assert fallback.stats({"x": (0, 0)}) == {"x": {"preferred": 0, "fallback": 0, "fallback_rate": 0.0}}
+
+
+def test_fallback_documentation():
+    env = {"FallbackCounter": FallbackCounter}
+    failed, total = doctest.testmod(fallback, globs=env)
+    assert failed == 0
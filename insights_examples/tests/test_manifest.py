@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+from insights.core import dr
+from insights_examples import manifest
+from insights_examples.rules import bash_bug
+from insights_examples.tests.tools.conftest import write_archive
+from insights_examples.tools import batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASH = "insights_examples.rules.bash_bug.check_bash_bug"
+SSHD = "insights_examples.rules.sshd_secure.report"
+
+# Run in a new process, the specs loaded by other tests would be reused
+FAST_LOAD = """
+import json, sys
+from insights_examples.tools import batch
+rules, graph = batch.load_rules(%r)
+print(json.dumps({"default": "insights.specs.default" in sys.modules,
+                  "rules": sorted(m for m in sys.modules if m.startswith("insights_examples.rules.")),
+                  "record": batch.evaluate(%r, rules, graph)}, default=str))
+"""
+
+
+def python(*args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.check_output([sys.executable] + list(args), env=env, cwd=ROOT).decode("utf-8")
+
+
+def test_manifest_up_to_date():
+    python("-m", "insights_examples.manifest", "--check")
+
+
+def test_manifest():
+    entries = manifest.load()["rules"]
+    assert entries[BASH]["module"] == "insights_examples.rules.bash_bug"
+    assert entries[BASH]["specs"] == ["insights.specs.Specs.installed_rpms"]
+    assert "insights_examples.parsers.secure_shell.SSHDConfig" in entries[SSHD]["dependencies"]
+    assert "PermitRootLogin" in entries[SSHD]["filters"]["insights.specs.Specs.sshd_config"]
+    assert "insights.specs.Specs.uname" in manifest.load()["archive_specs"]
+
+
+def test_load_rules(tmpdir):
+    host1 = write_archive(tmpdir.join("host1"), "host1.example.com")
+    loaded = json.loads(python("-c", FAST_LOAD % ((BASH, SSHD), host1)))
+    assert not loaded["default"]
+    assert loaded["rules"] == ["insights_examples.rules.bash_bug", "insights_examples.rules.sshd_secure"]
+    rules, graph = batch.load_rules((BASH, SSHD), default_specs=True)
+    assert loaded["record"]["results"] == json.loads(json.dumps(batch.evaluate(host1, rules, graph)["results"]))
+
+
+def test_load_rules_not_in_manifest():
+    empty = {"specs_module": manifest.SPECS_MODULE, "archive_specs": [], "rules": {}}
+    rules, graph = manifest.load_rules([BASH], manifest=empty)
+    assert rules == [bash_bug.check_bash_bug]
+    assert dr.get_component("insights.specs.default.DefaultSpecs.installed_rpms") in graph
@@ -0,0 +1,82 @@
+import doctest
+
+import pytest
+
+from insights.tests import context_wrap
+from insights_examples import policy
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.policy import DirectivePolicy, directive
+from insights_examples.rules import sshd_secure
+
+SSHD_CONFIG = """
+LogLevel INFO
+LogLevel VERBOSE
+PermitRootLogin yes
+Ciphers aes256-ctr
+Match User backup
+    LogLevel QUIET
+""".strip()
+
+
+def config(content):
+    return SSHDConfig(context_wrap(content))
+
+
+def test_evaluate():
+    p = DirectivePolicy([
+        directive('LogLevel', 'verbose'),
+        directive('PermitRootLogin', ['no', 'prohibit-password']),
+        directive('Protocol', '2', default=None),
+        directive('Ciphers', 'AES256-CTR', ignore_case=False),
+    ])
+    assert p.keywords == ['LogLevel', 'PermitRootLogin', 'Protocol', 'Ciphers']
+    # Only the last global LogLevel counts, the Match block is not global
+    assert p.evaluate(config(SSHD_CONFIG)) == {'PermitRootLogin': 'yes', 'Ciphers': 'aes256-ctr'}
+    assert list(p.evaluate(config("Protocol 1"))) == ['LogLevel', 'PermitRootLogin', 'Protocol', 'Ciphers']
+
+    errors = {'Other': 'x'}
+    assert p.evaluate(config("PermitRootLogin prohibit-password"), errors) is errors
+    assert errors == {'Other': 'x', 'LogLevel': 'default', 'Ciphers': 'default'}
+
+
+def test_evaluate_match_criteria():
+    p = DirectivePolicy([directive('LogLevel', 'verbose')])
+    assert p.evaluate(config(SSHD_CONFIG)) == {}
+    assert p.evaluate(config(SSHD_CONFIG), match_criteria={'User': 'backup'}) == {'LogLevel': 'QUIET'}
+    assert p.evaluate(config(SSHD_CONFIG), match_criteria={'User': 'alice'}) == {}
+
+
+def test_evaluate_index_only(monkeypatch):
+    # Only the index is used, lines are never iterated
+    monkeypatch.setattr(SSHDConfig, '__iter__', lambda self: iter(()))
+    p = DirectivePolicy([directive('LogLevel', 'info')])
+    assert p.evaluate(config(SSHD_CONFIG)) == {'LogLevel': 'VERBOSE'}
+
+
+def test_empty_value_is_default():
+    p = DirectivePolicy([directive('LogLevel', 'verbose')])
+    line = SSHDConfig.KeyValue('LogLevel', '', 'loglevel')
+    assert p.evaluate([line]) == {'LogLevel': 'default'}
+
+
+def test_duplicate_keyword():
+    with pytest.raises(ValueError):
+        DirectivePolicy([directive('LogLevel', 'verbose'), directive('loglevel', 'info')])
+
+
+def test_sshd_secure_policy():
+    assert sshd_secure.POLICY.keywords == ['AuthenticationMethods', 'LogLevel', 'PermitRootLogin', 'Protocol']
+    assert sshd_secure.check_all(config(SSHD_CONFIG)) == {
+        'AuthenticationMethods': 'default',
+        'PermitRootLogin': 'yes',
+    }
+
+
+def test_policy_documentation():
+    env = {
+        'DirectivePolicy': DirectivePolicy,
+        'directive': directive,
+        'sshd_config': config("PermitRootLogin yes\nProtocol 2"),
+    }
+    failed, total = doctest.testmod(policy, globs=env)
+    assert failed == 0
@@ -0,0 +1,84 @@
+import os
+import tarfile
+
+import pytest
+
+FEDORA = "Fedora release 28 (Twenty Eight)"
+RHEL = "Red Hat Enterprise Linux Server release 7.4 (Maipo)"
+
+BAD_SSHD_CONFIG = """
+AuthenticationMethods badkey
+LogLevel normal
+PermitRootLogin Yes
+Protocol 1
+"""
+
+GOOD_SSHD_CONFIG = """
+AuthenticationMethods publickey
+LogLevel VERBOSE
+PermitRootLogin No
+"""
+
+
+def write_archive(root, hostname, release=RHEL, bash="bash-4.4.23-1.el7",
+                  sshd_config=BAD_SSHD_CONFIG, openssh="openssh-6.6.1p1-31.el7.x86_64", extra=None):
+    """
+    Writes a minimal extracted insights archive for the example rules under
+    ``root``, with the ``extra`` files given keyed by relative path.
+    """
+    files = {
+        "insights_commands/hostname_-f": hostname,
+        "insights_commands/rpm_-qa_--qf_name_version_release": "\n".join([bash, openssh]),
+        "etc/redhat-release": release,
+        "etc/ssh/sshd_config": sshd_config.strip(),
+    }
+    files.update(extra or {})
+    for path, content in files.items():
+        path = os.path.join(str(root), path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(content + "\n")
+    return str(root)
+
+
+@pytest.fixture
+def archives(tmpdir):
+    """
+    A directory holding three archives: two extracted directories and one
+    ``.tar.gz``, plus a file that is not an archive.
+    """
+    top = tmpdir.mkdir("archives")
+    write_archive(top.join("host1"), "host1.example.com", release=FEDORA, bash="bash-4.4.14-1.fc28")
+    write_archive(top.join("host2"), "host2.example.com", sshd_config=GOOD_SSHD_CONFIG)
+    packed = write_archive(tmpdir.join("host3"), "host3.example.com")
+    with tarfile.open(str(top.join("host3.tar.gz")), "w:gz") as tar:
+        tar.add(packed, arcname="host3")
+    top.join("README.txt").write("not an archive")
+    return str(top)
+
+
+INCLUDE_SSHD_CONFIG = """
+Include /etc/ssh/sshd_config.d/*.conf
+AuthenticationMethods publickey
+LogLevel VERBOSE
+"""
+
+SSHD_DROP_IN = """
+PermitRootLogin no
+SecretThing hunter2
+"""
+
+
+@pytest.fixture
+def include_archive(tmpdir):
+    """An extracted archive whose secure ``sshd_config`` is partly in a drop-in file."""
+    return write_archive(tmpdir.join("include"), "include.example.com", sshd_config=INCLUDE_SSHD_CONFIG,
+                         extra={"etc/ssh/sshd_config.d/50-redhat.conf": SSHD_DROP_IN.strip()})
+
+
+@pytest.fixture
+def cycle_archive(tmpdir):
+    """An extracted archive whose ``sshd_config`` drop-in file includes itself, failing ``SSHDConfig``."""
+    return write_archive(tmpdir.join("cycle"), "cycle.example.com", sshd_config=INCLUDE_SSHD_CONFIG,
+                         extra={"etc/ssh/sshd_config.d/50-redhat.conf": INCLUDE_SSHD_CONFIG.strip()})
@@ -0,0 +1,109 @@
+import json
+import os
+
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.tools import batch
+
+SSHD = "insights_examples.rules.sshd_secure.report"
+BASH = "insights_examples.rules.bash_bug.check_bash_bug"
+FEDORA = "insights_examples.rules.is_fedora.report"
+SSHD_CONFIG = "insights_examples.parsers.secure_shell.SSHDConfig"
+
+
+def test_find_archives(archives, tmpdir):
+    found = batch.find_archives(archives)
+    assert [p.rsplit("/", 1)[-1] for p in found] == ["host1", "host2", "host3.tar.gz"]
+
+    manifest = tmpdir.join("manifest.txt")
+    manifest.write("# nightly\narchives/host2\n\n%s\n" % found[0])
+    assert batch.find_archives(str(manifest)) == [str(tmpdir.join("archives/host2")), found[0]]
+
+
+def test_evaluate(archives):
+    rules, graph = batch.load_rules()
+    host1, host2, host3 = batch.find_archives(archives)
+
+    record = batch.evaluate(host1, rules, graph)
+    assert record["archive"] == host1
+    assert record["results"][BASH]["type"] == "rule"
+    assert record["results"][BASH]["bash"] == "bash-4.4.14-1.fc28"
+    assert record["results"][FEDORA]["type"] == "pass"
+    assert record["results"][SSHD]["errors"]["PermitRootLogin"] == "Yes"
+
+    assert batch.evaluate(host2, rules, graph)["results"][SSHD]["type"] == "none"
+    record = batch.evaluate(host3, rules, graph)
+    assert record["results"][FEDORA]["hostname"] == "host3.example.com"
+
+    record = batch.evaluate(archives + "/README.txt", rules, graph)
+    assert "archive" in record["errors"]
+
+
+def test_evaluate_include(include_archive):
+    rules, graph = batch.load_rules()
+    assert batch.evaluate(include_archive, rules, graph)["results"][SSHD]["type"] == "none"
+
+    # Drop-in files are filtered like sshd_config before being included
+    broker = batch.evaluate_dir(include_archive, rules, graph)
+    config = broker[SSHDConfig]
+    assert config.last("PermitRootLogin") == "no"
+    assert "SecretThing" not in config
+    assert config["Include"] is None
+
+
+def test_evaluate_errors(cycle_archive):
+    rules, graph = batch.load_rules()
+    record = batch.evaluate(cycle_archive, rules, graph)
+    # Missing optional specs, such as uname, are not errors
+    assert list(record["errors"]) == [SSHD_CONFIG]
+    assert "Include cycle" in record["errors"][SSHD_CONFIG]
+    assert record["results"][SSHD]["reason"] == "MISSING_REQUIREMENTS"
+
+
+def test_run_batch(archives, tmpdir):
+    output = tmpdir.join("results.jsonl")
+    with open(str(output), "w") as f:
+        stats = batch.run_batch(batch.find_archives(archives), f, processes=2)
+    assert stats["archives"] == 3
+    assert stats["failed"] == 0
+    assert stats["processes"] == 2
+    assert stats["rate"] > 0
+
+    records = [json.loads(l) for l in output.readlines()]
+    assert sorted(r["archive"].rsplit("/", 1)[-1] for r in records) == ["host1", "host2", "host3.tar.gz"]
+    assert all(set(r["results"]) == set([SSHD, BASH, FEDORA]) for r in records)
+
+
+def test_measure_scaling(archives):
+    runs = batch.measure_scaling(batch.find_archives(archives), [1, 2])
+    assert [r["processes"] for r in runs] == [1, 2]
+    assert runs[0]["speedup"] == 1.0
+    assert "archives/sec" in batch.format_stats(runs[1])
+
+
+def test_run_batch_dedup(archives, tmpdir):
+    paths = batch.find_archives(archives)
+    with open(str(tmpdir.join("results.jsonl")), "w") as f:
+        stats = batch.run_batch(paths + paths, f, processes=1, cache_size=16)
+    assert stats["archives"] == 6
+    # host1 and host3 share the same sshd_config, host2 differs
+    assert stats["cache"]["sshd_config"] == {"hits": 4, "misses": 2, "hit_rate": 4 / 6.0}
+    assert stats["cache"]["sshd_secure"]["hits"] == 4
+    assert "cache hit rate" in batch.format_stats(stats)
+    assert all("cache" not in json.loads(l) for l in tmpdir.join("results.jsonl").readlines())
+
+
+def test_run_batch_fallbacks(archives, tmpdir):
+    host2 = os.path.join(archives, "host2")
+    os.remove(os.path.join(host2, "insights_commands/hostname_-f"))
+    with open(os.path.join(host2, "insights_commands/uname_-a"), "w") as f:
+        f.write("Linux host2.example.com 3.10.0-693.el7.x86_64 #1 SMP Thu Jul 6 19:56:57 EDT 2017 x86_64 x86_64 x86_64 GNU/Linux\n")
+    output = tmpdir.join("results.jsonl")
+    with open(str(output), "w") as f:
+        stats = batch.run_batch(batch.find_archives(archives), f, processes=2)
+    assert stats["fallbacks"] == {
+        "insights_examples.combiners.hostname_uh.HostnameUH": {"preferred": 2, "fallback": 1, "fallback_rate": 1 / 3.0}
+    }
+    assert "HostnameUH fell back 1 of 3 times" in batch.format_stats(stats)
+    records = dict((r["archive"].rsplit("/", 1)[-1], r) for r in map(json.loads, output.readlines()))
+    assert records["host2"]["results"][FEDORA]["hostname"] == "host2.example.com"
+    assert all("fallbacks" not in r for r in records.values())
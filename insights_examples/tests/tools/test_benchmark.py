@@ -0,0 +1,78 @@
+import json
+import sys
+
+import pytest
+
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.tools import benchmark, generators
+
+
+def test_generators():
+    config = generators.sshd_config(1000)
+    assert len(config) == 1000
+    assert config[-1] == "PermitRootLogin no"
+    assert config == generators.sshd_config(1000)
+    assert len(generators.sshd_config(2)) == 2
+
+    rpms = generators.installed_rpms(500)
+    assert len(rpms) == 500
+    assert len(set(rpms)) == 500
+    assert rpms[:2] == ["bash-4.4.23-1.el7.x86_64", "openssh-7.4p1-16.el7.x86_64"]
+
+    records = generators.results(50)
+    assert len(records) == 50
+    assert records == generators.results(50)
+    assert len(records[0]["results"]) == 3
+
+
+def test_cases():
+    names = [name for name, func in benchmark.cases(quick=True)]
+    assert "parse_sshd_config/1000" in names
+    assert "parse_sshd_config_compact/10" in names
+    assert "parse_installed_rpms/100" in names
+    assert "hostname_uh/uname" in names
+    assert "rule/insights_examples.rules.sshd_secure.report/1000" in names
+    assert "rule/insights_examples.rules.bash_bug.check_bash_bug/100" in names
+    assert "rule/insights_examples.rules.is_fedora.report/100" in names
+
+
+def test_run():
+    data = benchmark.run(quick=True, repeat=1, pattern="sshd_config")
+    assert sorted(data["results"]) == [
+        "parse_sshd_config/10", "parse_sshd_config/1000",
+        "parse_sshd_config_compact/10", "parse_sshd_config_compact/1000",
+        "parse_sshd_config_zero_copy/10", "parse_sshd_config_zero_copy/1000",
+    ]
+    result = data["results"]["parse_sshd_config/1000"]
+    assert 0 < result["best"] <= result["median"]
+    assert result["peak_bytes"] > data["results"]["parse_sshd_config/10"]["peak_bytes"]
+    assert SSHDConfig.compact is False
+    assert SSHDConfig.zero_copy is False
+    assert "parse_sshd_config/1000" in benchmark.format_results(data)
+
+
+def test_compare(tmpdir, monkeypatch, capsys):
+    baseline = {"results": {
+        "a": {"best": 1.0, "median": 1.0, "peak_bytes": 1000},
+        "b": {"best": 1.0, "median": 1.0, "peak_bytes": 1000},
+        "gone": {"best": 1.0, "median": 1.0, "peak_bytes": 1000},
+    }}
+    current = {"results": {
+        "a": {"best": 1.05, "median": 1.2, "peak_bytes": 1200},
+        "b": {"best": 1.5, "median": 1.5, "peak_bytes": 900},
+        "new": {"best": 9.0, "median": 9.0, "peak_bytes": 9000},
+    }}
+    assert benchmark.compare(current, baseline) == [
+        ("a", "peak_bytes", 1000, 1200, 1.2),
+        ("b", "best", 1.0, 1.5, 1.5),
+    ]
+    assert benchmark.compare(current, baseline, threshold=0.6) == []
+
+    cur, base = tmpdir.join("current.json"), tmpdir.join("baseline.json")
+    cur.write(json.dumps(current))
+    base.write(json.dumps(baseline))
+    monkeypatch.setattr(sys, "argv", ["benchmark", "compare", str(cur), str(base)])
+    with pytest.raises(SystemExit) as exc:
+        benchmark.main()
+    assert exc.value.code == 1
+    assert "REGRESSION b best" in capsys.readouterr()[0]
@@ -0,0 +1,76 @@
+import os
+import socket
+import stat
+
+import pytest
+
+from insights_examples.tools import batch, daemon
+from insights_examples.tools.daemon import Client, Daemon
+
+SSHD = "insights_examples.rules.sshd_secure.report"
+
+
+def test_percentiles():
+    stats = daemon.percentiles([float(i) for i in range(1, 101)])
+    assert (stats["p50"], stats["p99"], stats["count"], stats["mean"]) == (50.0, 99.0, 100, 50.5)
+    assert daemon.percentiles([3.0])["p99"] == 3.0
+    assert daemon.percentiles([])["p50"] == 0.0
+
+
+def test_runtime_dir(monkeypatch, tmpdir):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmpdir))
+    assert daemon.default_socket() == str(tmpdir.join(daemon.SOCKET_NAME))
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr(daemon.tempfile, "gettempdir", lambda: str(tmpdir))
+    path = daemon.runtime_dir()
+    assert os.path.dirname(path) == str(tmpdir)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+    assert daemon.runtime_dir() == path
+
+    os.chmod(path, 0o755)
+    with pytest.raises(RuntimeError):
+        daemon.runtime_dir()
+
+
+def test_daemon(archives, tmpdir, monkeypatch):
+    monkeypatch.setattr(daemon, "LATENCY_WINDOW", 4)
+    rules, graph = batch.load_rules()
+    paths = batch.find_archives(archives)
+    sock = str(tmpdir.join("daemon.sock"))
+    server = Daemon(sock, processes=2, cache_size=8)
+    thread = server.start()
+    try:
+        assert stat.S_IMODE(os.stat(sock).st_mode) == 0o600
+        with pytest.raises(RuntimeError):
+            Daemon(sock, processes=1)
+        with Client(sock, timeout=10) as client, Client(sock) as other:
+            assert client.request({"command": "ping"}) == {"ok": True}
+            for path in paths:
+                record = client.evaluate(path)
+                assert record["results"] == batch.evaluate(path, rules, graph)["results"]
+                assert "cache" not in record
+            assert other.evaluate(paths[0])["results"][SSHD]["errors"]["PermitRootLogin"] == "Yes"
+            assert "archive" in other.evaluate(archives + "/README.txt")["errors"]
+            assert "error" in client.request({"command": "reload"})
+            assert "error" in client.request(["not", "a", "request"])
+
+            stats = client.stats()
+            assert (stats["archives"], stats["failed"], stats["processes"]) == (5, 1, 2)
+            assert stats["latency"]["count"] == 4
+            assert stats["cache"]["sshd_config"]["hits"] >= 1
+            assert client.shutdown() == {"ok": True}
+        thread.join(10)
+        assert not thread.is_alive()
+        assert not os.path.exists(sock)
+    finally:
+        server.close()
+    with pytest.raises(socket.error):
+        Client(sock)
+
+
+def test_benchmark(archives):
+    stats = daemon.benchmark(batch.find_archives(archives)[:2])
+    assert stats["spawn"]["count"] == stats["daemon"]["count"] == 2
+    assert stats["daemon"]["p50"] < stats["spawn"]["p50"]
+    assert "p99" in daemon.format_latency("daemon", stats["daemon"])
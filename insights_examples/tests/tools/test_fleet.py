@@ -0,0 +1,139 @@
+import json
+
+from insights_examples.tools import batch, fleet, generators, resultfile
+from insights_examples.tools.fleet import FleetSummary, TopValues
+
+SSHD = "insights_examples.rules.sshd_secure.report"
+BASH = "insights_examples.rules.bash_bug.check_bash_bug"
+FEDORA = "insights_examples.rules.is_fedora.report"
+
+
+def summarize(records, capacity=fleet.DEFAULT_CAPACITY):
+    summary = FleetSummary(capacity=capacity)
+    for record in records:
+        summary.add(record)
+    return summary
+
+
+def round_trip(summary):
+    return FleetSummary.from_dict(json.loads(json.dumps(summary.to_dict())))
+
+
+def test_top_values():
+    values = TopValues(3)
+    for value in "aaaaabbbcd":
+        values.add(value)
+    # The least frequent value is replaced, its count is the error bound
+    assert values.top() == [("a", 5, 0), ("b", 3, 0), ("d", 2, 1)]
+    values.add("e")
+    assert values.top() == [("a", 5, 0), ("b", 3, 0), ("e", 3, 2)]
+    assert values.total == 11
+    values.add("b", 3)
+    assert values.top(1) == [("b", 6, 0)]
+
+
+def test_top_values_heavy_hitters():
+    # Values more frequent than 1 / capacity are kept whatever the order
+    stream = ["common"] * 300 + ["frequent%d" % (i % 5) for i in range(1000)] + ["rare%d" % i for i in range(2000)]
+    for order in (stream, stream[::-1]):
+        values = TopValues(20)
+        for value in order:
+            values.add(value)
+        top = dict((v, (c, e)) for v, c, e in values.top())
+        assert len(top) == 20
+        assert top["common"][0] - top["common"][1] <= 300 <= top["common"][0]
+        for i in range(5):
+            count, error = top["frequent%d" % i]
+            assert count - error <= 200 <= count
+
+
+def test_top_values_merge():
+    one, two, whole = TopValues(10), TopValues(10), TopValues(10)
+    for i, value in enumerate("abcabcaab" * 10):
+        (one if i % 2 else two).add(value)
+        whole.add(value)
+    one.merge(TopValues.from_dict(json.loads(json.dumps(two.to_dict()))))
+    assert one.top() == whole.top() == [("a", 40, 0), ("b", 30, 0), ("c", 20, 0)]
+    assert one.total == 90
+
+    # Counts and error bounds add up
+    full, other = TopValues(2), TopValues(2)
+    for value in "xxxyyz":
+        full.add(value)
+    assert full.top() == [("x", 3, 0), ("z", 3, 2)]
+    other.add("z")
+    full.merge(other)
+    assert full.top() == [("z", 4, 2), ("x", 3, 0)]
+    assert full.total == 7
+
+
+def test_summary():
+    records = generators.results(500)
+    summary = summarize(records + [{"archive": "/data/broken.tar.gz", "results": {}, "errors": {"archive": "..."}}])
+    assert summary.hosts == 501 and summary.failed == 1
+    exact = fleet.collect_and_count(records)
+    for (name, response_type, field), counter in exact.items():
+        values = summary.rules[name][response_type]["fields"][field]
+        assert values.total == sum(counter.values())
+        if field != "hostname":
+            assert dict((v, c) for v, c, e in values.top()) == dict(counter)
+
+    sshd = summary.rules[SSHD]
+    assert sshd["rule"]["count"] + sshd[fleet.MISSING]["count"] == 500
+    assert set(dict((v, c) for v, c, e in sshd["rule"]["fields"]["errors"].top())) == set(
+        ["AuthenticationMethods", "LogLevel", "PermitRootLogin", "Protocol"])
+    assert sshd["rule"]["fields"]["errors.PermitRootLogin"].top() == [
+        ("yes", exact[(SSHD, "rule", "errors.PermitRootLogin")]["yes"], 0)]
+    assert summary.rules[BASH]["rule"]["fields"]["bash"].top(1)[0][0] == "bash-4.4.14-1.el7"
+    assert summary.rules[FEDORA]["pass"]["fields"]["product"].top() == [
+        ("Fedora", summary.rules[FEDORA]["pass"]["count"], 0)]
+
+    text = fleet.format_summary(summary, 2)
+    assert "501 hosts (1 failed)" in text
+    assert "fail errors.Protocol: 1 " in text
+    assert "(+/-" in text  # hostnames are unique, past the capacity
+
+
+def test_summary_merge():
+    records = generators.results(400)
+    whole = summarize(records)
+    merged = summarize(records[:150])
+    merged.merge(round_trip(summarize(records[150:])))
+    merged.merge(FleetSummary())
+    assert (merged.hosts, merged.failed) == (400, 0)
+    for name, types in whole.rules.items():
+        for response_type, group in types.items():
+            other = merged.rules[name][response_type]
+            assert other["count"] == group["count"]
+            for field, values in group["fields"].items():
+                assert other["fields"][field].total == values.total
+                if field != "hostname":
+                    assert other["fields"][field].top() == values.top()
+
+
+def test_summarize_files(archives, tmpdir):
+    rules, graph = batch.load_rules()
+    records = [batch.evaluate(path, rules, graph) for path in batch.find_archives(archives)]
+    jsonl = tmpdir.join("results.jsonl")
+    jsonl.write("".join(json.dumps(r, default=str) + "\n" for r in records[:2]))
+    binary = str(tmpdir.join("results.bin"))
+    with open(binary, "wb") as f:
+        with resultfile.ResultWriter(f) as writer:
+            for record in records[2:]:
+                writer.write(record)
+
+    summary = fleet.summarize([str(jsonl), binary])
+    assert summary.to_dict() == summarize(json.loads(json.dumps(r, default=str)) for r in records).to_dict()
+    assert (summary.hosts, summary.failed) == (3, 0)
+    assert summary.rules[SSHD]["rule"]["fields"]["errors.PermitRootLogin"].top() == [("Yes", 2, 0)]
+    assert summary.rules[FEDORA]["pass"]["fields"]["hostname"].top() == [("host1.example.com", 1, 0)]
+
+    parallel = fleet.summarize_parallel([str(jsonl), binary], processes=2)
+    assert parallel.hosts == summary.hosts
+    assert parallel.rules[SSHD]["rule"]["fields"]["openssh"].top() == summary.rules[SSHD]["rule"]["fields"]["openssh"].top()
+
+
+def test_benchmark():
+    stats = fleet.benchmark(200)
+    assert stats["streaming"]["peak"] < stats["collect"]["peak"]
+    assert "streaming summary" in fleet.format_benchmark(stats)
@@ -0,0 +1,76 @@
+import os
+import shutil
+
+from insights_examples.advisories import ADVISORIES_FILE
+from insights_examples.rules import bash_bug, package_advisories
+from insights_examples.tools import batch, incremental
+from insights_examples.tools.incremental import IncrementalEvaluator
+
+SSHD = "insights_examples.rules.sshd_secure.report"
+BASH = "insights_examples.rules.bash_bug.check_bash_bug"
+FEDORA = "insights_examples.rules.is_fedora.report"
+
+
+def test_host_id():
+    assert incremental.host_id("/data/host1.tar.gz") == "host1"
+    assert incremental.host_id("/data/host2/") == "host2"
+    assert incremental.host_id("/data/host3.example.com.zip") == "host3.example.com"
+    assert incremental.host_id("/data/host4.tgz") == "host4"
+
+
+def test_incremental(archives, tmpdir):
+    paths = batch.find_archives(archives)
+    rules, graph = batch.load_rules()
+    evaluator = IncrementalEvaluator()
+
+    records = [evaluator.evaluate(p) for p in paths]
+    assert all(sorted(r["rerun"]) == sorted([SSHD, BASH, FEDORA]) for r in records)
+    for path, record in zip(paths, records):
+        assert record["results"] == batch.evaluate(path, rules, graph)["results"]
+
+    state_file = str(tmpdir.join("state.json"))
+    incremental.save_state(evaluator.state, state_file)
+    evaluator = IncrementalEvaluator(state=incremental.load_state(state_file))
+    assert [evaluator.evaluate(p)["rerun"] for p in paths] == [[], [], []]
+    assert (evaluator.rerun, evaluator.reused) == (0, 9)
+
+    with open(os.path.join(paths[0], "insights_commands/rpm_-qa_--qf_name_version_release"), "w") as f:
+        f.write("bash-4.4.23-1.fc28\nopenssh-7.4p1-16.el7.x86_64\n")
+    record = evaluator.evaluate(paths[0])
+    assert sorted(record["rerun"]) == sorted([SSHD, BASH])
+    assert record["results"] == batch.evaluate(paths[0], rules, graph)["results"]
+    assert record["results"][BASH]["type"] == "pass"
+    assert record["results"][FEDORA]["type"] == "pass"
+    assert evaluator.evaluate(paths[0])["rerun"] == []
+    assert all(r["errors"] == {} for r in records)
+
+
+def test_errors(cycle_archive):
+    record = IncrementalEvaluator().evaluate(cycle_archive)
+    assert list(record["errors"]) == ["insights_examples.parsers.secure_shell.SSHDConfig"]
+    assert "Include cycle" in record["errors"]["insights_examples.parsers.secure_shell.SSHDConfig"]
+
+
+def test_graph_change(archives):
+    path = batch.find_archives(archives)[1]
+    evaluator = IncrementalEvaluator()
+    evaluator.evaluate(path)
+    evaluator.state["host2"]["rules"][FEDORA]["graph"] = "outdated"
+    assert evaluator.evaluate(path)["rerun"] == [FEDORA]
+    assert incremental.load_state("/nonexistent/state.json") == {}
+
+
+def test_data_change(archives, tmpdir, monkeypatch):
+    data = str(tmpdir.join("advisories.json"))
+    shutil.copy(ADVISORIES_FILE, data)
+    for module in (bash_bug, package_advisories):
+        monkeypatch.setattr(module, "DATA_FILES", [data])
+    path = batch.find_archives(archives)[0]
+    evaluator = IncrementalEvaluator()
+    evaluator.evaluate(path)
+    state = evaluator.state
+
+    assert IncrementalEvaluator(state=state).evaluate(path)["rerun"] == []
+    with open(data, "a") as f:
+        f.write("\n")
+    assert IncrementalEvaluator(state=state).evaluate(path)["rerun"] == [BASH]
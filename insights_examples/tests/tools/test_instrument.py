@@ -0,0 +1,103 @@
+import doctest
+import json
+import os
+
+from insights.core import dr
+from insights.specs import Specs
+from insights.tests import InputData
+from insights_examples.rules import sshd_secure
+from insights_examples.tools import batch, instrument
+from insights_examples.tools.instrument import ComponentTimer, TimingAggregator
+
+SSHD_CONFIG = "PermitRootLogin yes"
+OPENSSH_RPM = "openssh-6.6.1p1-31.el7.x86_64"
+UNAME = "Linux host1.example.com 3.10.0-693.21.1.el7.x86_64 #1 SMP Fri Feb 23 18:54:16 UTC 2018 x86_64 x86_64 x86_64 GNU/Linux"
+
+SSHD_PARSER = "insights_examples.parsers.secure_shell.SSHDConfig"
+SSHD_RULE = "insights_examples.rules.sshd_secure.report"
+
+
+def seeded_broker():
+    input_data = InputData("instrument")
+    input_data.add(Specs.sshd_config, SSHD_CONFIG)
+    input_data.add(Specs.installed_rpms, OPENSSH_RPM)
+    broker = dr.Broker()
+    for k, v in input_data.data.items():
+        broker[k] = v
+    return broker
+
+
+def test_component_timer():
+    timer = ComponentTimer()
+    broker = timer.run(sshd_secure.report, seeded_broker())
+    assert broker[sshd_secure.report]["errors"]["PermitRootLogin"] == "yes"
+    assert set([SSHD_PARSER, SSHD_RULE]) <= set(timer.timings)
+    timing = timer.timings[SSHD_RULE]
+    assert timing["type"] == "rule"
+    assert timing["wall"] >= 0 and timing["cpu"] >= 0
+    assert timing["allocated"] is None and timing["peak"] is None
+    assert timer.timings[SSHD_PARSER]["type"] == "parser"
+
+
+def test_component_timer_memory():
+    timer = ComponentTimer(memory=True)
+    timer.run(sshd_secure.report, seeded_broker())
+    assert timer.timings[SSHD_PARSER]["peak"] > 0
+    assert timer.timings[SSHD_PARSER]["allocated"] is not None
+
+
+def test_timing_aggregator():
+    aggregator = TimingAggregator()
+    aggregator.add({"a": {"type": "parser", "wall": 0.5, "cpu": 0.4, "peak": 10},
+                    "b": {"type": "rule", "wall": 0.1, "cpu": 0.1, "peak": None}})
+    aggregator.add({"a": {"type": "parser", "wall": 1.5, "cpu": 1.0, "peak": 30}})
+    assert aggregator.runs == 2
+    [(name, totals)] = aggregator.top(1)
+    assert name == "a"
+    assert totals["count"] == 2
+    assert totals["wall"] == 2.0 and totals["max_wall"] == 1.5 and totals["mean_wall"] == 1.0
+    assert totals["peak"] == 30
+    assert [n for n, t in aggregator.top(key="cpu")] == ["a", "b"]
+    assert "mean (ms)" in instrument.format_top(aggregator.top())
+
+
+def test_batch_timings(archives, tmpdir):
+    rules, graph = batch.load_rules()
+    record = batch.evaluate(batch.find_archives(archives)[0], rules, graph, timer=ComponentTimer())
+    assert SSHD_PARSER in record["timings"]
+    # Reading the spec is charged to the spec, not the parser
+    assert record["timings"]["insights.specs.Specs.sshd_config"]["type"] == "datasource"
+
+    timings = tmpdir.join("timings.jsonl")
+    with open(str(tmpdir.join("results.jsonl")), "w") as out, open(str(timings), "w") as t:
+        stats = batch.run_batch(batch.find_archives(archives), out, processes=1, timings=t, top=3)
+    assert len(stats["slowest"]) == 3
+    assert stats["slowest"][0][1]["count"] == 3
+    lines = [json.loads(l) for l in timings.readlines()]
+    assert len(lines) == 3
+    assert all(SSHD_RULE in l["timings"] for l in lines)
+    assert all("timings" not in json.loads(l) for l in tmpdir.join("results.jsonl").readlines())
+
+
+def test_preload_specs(archives):
+    host1 = batch.find_archives(archives)[0]
+    with open(os.path.join(host1, "insights_commands/uname_-a"), "w") as f:
+        f.write(UNAME + "\n")
+    assert instrument._read_on_demand(Specs.uname)
+    assert not instrument._read_on_demand(Specs.hostname)
+
+    rules, graph = batch.load_rules()
+    broker = batch.evaluate_dir(host1, rules, graph, timer=ComponentTimer())
+    assert broker[Specs.hostname].loaded
+    # HostnameUH only reads uname on the hosts without a hostname
+    assert not broker[Specs.uname].loaded
+
+
+def test_instrument_documentation():
+    env = {
+        "ComponentTimer": ComponentTimer,
+        "sshd_secure": sshd_secure,
+        "broker": seeded_broker(),
+    }
+    failed, total = doctest.testmod(instrument, globs=env)
+    assert failed == 0
@@ -0,0 +1,61 @@
+import os
+
+from insights.core import dr
+
+from insights_examples.tools import batch, liveness
+from insights_examples.tools.batch import DEFAULT_RULES
+
+
+def test_evaluation_order():
+    rules, graph = batch.load_rules()
+    order = liveness.evaluation_order(graph, rules)
+    assert sorted(order, key=dr.get_name) == sorted(graph, key=dr.get_name)
+    position = dict((c, i) for i, c in enumerate(order))
+    for component, dependencies in graph.items():
+        assert all(position[d] < position[component] for d in dependencies)
+    assert [dr.get_name(c) for c in order if c in rules] == list(DEFAULT_RULES)
+
+
+def test_consumers():
+    rules, graph = batch.load_rules()
+    users = liveness.consumers(graph)
+    assert all(not users[r] for r in rules)
+    for component, dependencies in graph.items():
+        assert all(component in users[d] for d in dependencies)
+
+
+def test_evict(archives):
+    rules, graph = batch.load_rules()
+    for path in batch.find_archives(archives):
+        kept = batch.evaluate(path, rules, graph)
+        evicted = batch.evaluate(path, rules, graph, evict=True)
+        assert evicted["results"] == kept["results"]
+        # Missing files of a tarball are reported under its temporary directory
+        assert len(evicted["errors"]) == len(kept["errors"])
+        if os.path.isdir(path):
+            assert evicted["errors"] == kept["errors"]
+
+
+def test_evictor(archives):
+    rules, graph = batch.load_rules()
+    path = batch.find_archives(archives)[0]
+    broker = batch.initialize_broker(path)[1]
+    seeded = set(broker.instances)
+    evictor = liveness.Evictor(graph, keep=rules)
+    liveness.run(graph, rules, broker, evictor)
+
+    assert all(r in broker for r in rules)
+    assert seeded <= set(broker.instances)
+    assert set(broker.instances) - seeded == set(rules)
+    assert len(evictor.evicted) == len(set(evictor.evicted))
+    assert any(dr.get_name(c).endswith("SSHDConfig") for c in evictor.evicted)
+
+
+def test_compare_synthetic():
+    specs, rules = liveness.synthetic_rules(6)
+    assert liveness.synthetic_rules(6) == (specs, rules)
+    assert len(specs) == len(rules) == 6
+
+    peaks = liveness.compare_synthetic(6, 2000)
+    assert peaks["evicted"] < peaks["kept"]
+    assert "of all kept" in liveness.format_comparison(peaks)
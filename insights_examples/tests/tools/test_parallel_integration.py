@@ -0,0 +1,46 @@
+from insights import tests
+from insights.core.plugins import make_pass
+from insights.specs import Specs
+from insights.tests import InputData, deep_compare
+from insights_examples.rules import is_fedora
+from insights_examples.tools import integration
+
+
+def test_generate_cases():
+    cases = integration.generate_cases()
+    ids = [case_id for case_id, args in cases]
+    assert "insights_examples.tests.rules.test_is_fedora.integration_test#test_fedora-00000" in ids
+    assert ids == [case_id for case_id, args in integration.generate_cases()]
+    assert len(integration.generate_cases(smokey=True)) < len(cases)
+
+
+def test_generate_cases_session():
+    session = dict(tests.input_data_cache)
+    integration.generate_cases()
+    assert tests.input_data_cache == session
+
+
+def test_run_case():
+    input_data = InputData("wrong")
+    input_data.add(Specs.redhat_release, "Fedora release 28 (Twenty Eight)")
+    input_data.add(Specs.hostname, "host1.example.com")
+    expected = make_pass("IS_FEDORA", hostname="other.example.com", product="Fedora")
+    cases = [("wrong", (is_fedora.report, deep_compare, input_data, expected))]
+    result = integration.run_case(0, cases)
+    assert result["id"] == "wrong"
+    assert result["passed"] is False
+    assert "AssertionError" in result["error"]
+
+
+def test_run():
+    ids = [case_id for case_id, args in integration.generate_cases()]
+    results, stats = integration.run(processes=2)
+    assert [r["id"] for r in results] == ids
+    assert [r["index"] for r in results] == list(range(len(ids)))
+    assert all(r["passed"] and r["elapsed"] >= 0 for r in results)
+    assert stats["cases"] == len(ids)
+    assert stats["failed"] == 0
+    assert "0 failed" in integration.format_stats(stats)
+
+    results, stats = integration.run(processes=1, pattern="test_is_fedora")
+    assert [r["id"].rsplit("#", 1)[1] for r in results] == ["test_fedora-00000", "test_rhel-00000"]
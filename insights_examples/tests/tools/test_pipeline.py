@@ -0,0 +1,58 @@
+import io
+import json
+
+from insights_examples.tools import batch, pipeline
+
+SSHD = "insights_examples.rules.sshd_secure.report"
+
+
+def test_read_and_evaluate(archives):
+    rules, graph = batch.load_rules()
+    specs, collect = pipeline.spec_graph(graph)
+    host1 = batch.find_archives(archives)[0]
+
+    payload = pipeline.read_archive(host1, specs, collect)
+    assert payload["error"] is None
+    path, lines = payload["contents"]["insights.specs.Specs.sshd_config"]
+    assert path.endswith("etc/ssh/sshd_config")
+    assert "PermitRootLogin Yes" in lines
+    record = pipeline.evaluate_payload(payload)
+    assert record["results"] == batch.evaluate(host1, rules, graph)["results"]
+
+    payload = pipeline.read_archive(archives + "/README.txt", specs, collect)
+    assert payload["error"]
+    assert "archive" in pipeline.evaluate_payload(payload)["errors"]
+
+
+def test_evaluate_include(include_archive):
+    rules, graph = batch.load_rules()
+    specs, collect = pipeline.spec_graph(graph)
+
+    payload = pipeline.read_archive(include_archive, specs, collect)
+    [(path, lines)] = payload["contents"]["insights.specs.Specs.sshd_config_d"]
+    assert path.endswith("etc/ssh/sshd_config.d/50-redhat.conf")
+    assert lines == ["PermitRootLogin no"]
+    record = pipeline.evaluate_payload(payload)
+    assert record["errors"] == {}
+    assert record["results"] == batch.evaluate(include_archive, rules, graph)["results"]
+    assert record["results"][SSHD]["type"] == "none"
+
+
+def test_pipeline(archives):
+    rules, graph = batch.load_rules()
+    paths = batch.find_archives(archives) + [archives + "/README.txt"]
+    output = io.StringIO()
+    stats = pipeline.Pipeline(processes=2, readers=2, read_ahead=1).run(paths, output)
+
+    records = dict((r["archive"], r) for r in map(json.loads, output.getvalue().splitlines()))
+    assert sorted(records) == sorted(paths)
+    for path in paths[:3]:
+        assert records[path]["results"] == batch.evaluate(path, rules, graph)["results"]
+    assert records[paths[0]]["results"][SSHD]["errors"]["PermitRootLogin"] == "Yes"
+
+    assert stats["archives"] == 4
+    assert stats["failed"] == 1
+    assert stats["bytes"] > 0
+    assert stats["max_ready"] <= 1
+    assert stats["rate"] > 0
+    assert "archives/sec" in pipeline.format_stats(stats)
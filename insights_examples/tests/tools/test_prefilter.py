@@ -0,0 +1,69 @@
+import os
+import tarfile
+
+from insights.specs import Specs
+from insights_examples.tools import batch, prefilter
+
+SSHD_CONFIG = "insights.specs.Specs.sshd_config"
+
+
+def test_load_specs():
+    specs = prefilter.load_specs()
+    assert set(["AuthenticationMethods", "Match", "Include"]) <= specs[Specs.sshd_config]
+    assert specs[Specs.redhat_release] == set()
+    assert Specs.installed_rpms in specs
+
+
+def test_measure(archives):
+    specs = prefilter.load_specs()
+    totals = prefilter.measure(batch.find_archives(archives), specs)
+    sshd = totals[SSHD_CONFIG]
+    assert sshd["files"] == 3
+    assert sshd["lines"] == 11
+    assert sshd["kept_lines"] == 11
+    assert sshd["kept_bytes"] == sshd["bytes"]
+    release = totals["insights.specs.Specs.redhat_release"]
+    assert release["files"] == 3
+    assert release["filters"] == []
+    assert "bytes kept" in prefilter.format_report(totals)
+
+
+def test_compact(archives, tmpdir):
+    host1 = os.path.join(archives, "host1")
+    with open(os.path.join(host1, "etc/ssh/sshd_config"), "a") as f:
+        f.write("# comment\nPort 22\nCiphers aes256-ctr\n")
+    packed = os.path.join(str(tmpdir), "host3")
+    with open(os.path.join(packed, "etc/ssh/sshd_config"), "a") as f:
+        f.write("Port 2222\n")
+    with tarfile.open(os.path.join(archives, "host3.tar.gz"), "w:gz") as tar:
+        tar.add(packed, arcname="host3")
+
+    specs = prefilter.load_specs()
+    paths = batch.find_archives(archives)
+    before = prefilter.measure(paths, specs)[SSHD_CONFIG]
+    assert before["lines"] - before["kept_lines"] == 4
+
+    output = tmpdir.mkdir("compact")
+    compacted = [prefilter.compact(p, str(output), specs) for p in paths]
+    assert [os.path.basename(p) for p in compacted] == ["host1", "host2", "host3.tar.gz"]
+    after = prefilter.measure(compacted, specs)[SSHD_CONFIG]
+    assert after["bytes"] == after["kept_bytes"] == before["kept_bytes"]
+    with open(os.path.join(compacted[0], "insights_commands/hostname_-f")) as f:
+        assert f.read() == "host1.example.com\n"
+
+    rules, graph = batch.load_rules()
+    for original, small in zip(paths, compacted):
+        assert batch.evaluate(original, rules, graph)["results"] == batch.evaluate(small, rules, graph)["results"]
+
+
+def test_compact_tgz(archives, tmpdir):
+    packed = os.path.join(str(tmpdir), "host3")
+    tgz = os.path.join(archives, "host4.tgz")
+    with tarfile.open(tgz, "w:gz") as tar:
+        tar.add(packed, arcname="host4")
+    assert tgz in batch.find_archives(archives)
+
+    compacted = prefilter.compact(tgz, str(tmpdir.mkdir("compact")), prefilter.load_specs())
+    assert os.path.basename(compacted) == "host4.tar.gz"
+    rules, graph = batch.load_rules()
+    assert batch.evaluate(compacted, rules, graph)["results"] == batch.evaluate(tgz, rules, graph)["results"]
@@ -0,0 +1,75 @@
+import json
+
+from insights.core import dr
+from insights.core.plugins import make_fail, make_pass
+from insights_examples.rules import bash_bug, is_fedora, sshd_secure
+from insights_examples.tools import batch, render, resultfile
+from insights_examples.tools.render import TemplateRegistry
+
+SSHD = "insights_examples.rules.sshd_secure.report"
+BASH = "insights_examples.rules.bash_bug.check_bash_bug"
+FEDORA = "insights_examples.rules.is_fedora.report"
+
+
+def test_get_content():
+    fedora = make_pass(is_fedora.ERROR_KEY_IS_FEDORA, hostname="h", product="Fedora")
+    assert render.get_content(is_fedora.report, fedora) == is_fedora.CONTENT["IS_FEDORA"]
+    assert render.get_content(is_fedora.report, json.loads(json.dumps(fedora))) == is_fedora.CONTENT["IS_FEDORA"]
+    assert render.get_content(is_fedora.report, {"type": "rule", "error_key": "OTHER"}) is None
+    assert render.get_content(sshd_secure.report, {"type": "rule"}) == sshd_secure.CONTENT
+
+    rule = dr.get_delegate(bash_bug.check_bash_bug)
+    original = rule.content
+    rule.content = {make_fail: "fail {{a}}", "KEY": {make_pass: "pass {{a}}"}}
+    try:
+        assert render.get_content(bash_bug.check_bash_bug, {"type": "rule", "error_key": "KEY"}) == "fail {{a}}"
+        assert render.get_content(bash_bug.check_bash_bug, {"type": "pass", "pass_key": "KEY"}) == "pass {{a}}"
+        assert render.get_content(bash_bug.check_bash_bug, {"type": "info", "info_key": "KEY"}) is None
+    finally:
+        rule.content = original
+
+
+def test_registry():
+    registry = TemplateRegistry()
+    response = make_fail(sshd_secure.ERROR_KEY, errors={"LogLevel": "normal"}, openssh="openssh-6.6.1p1-31.el7")
+    text = registry.render(SSHD, response)
+    assert "LogLevel: normal" in text
+    assert text.endswith("OPEN_SSH_PACKAGE: openssh-6.6.1p1-31.el7")
+    assert registry.render(SSHD, json.loads(json.dumps(response))) == text
+    assert (registry.cache.hits, registry.cache.misses) == (1, 1)
+    assert len(registry.templates) == 1
+
+    fedora = {"type": "rule", "error_key": "IS_FEDORA", "hostname": "h1", "product": "RHEL"}
+    assert registry.render(FEDORA, fedora) == "This machine (h1) runs RHEL."
+    assert registry.render(FEDORA, dict(fedora, hostname="h2")) == "This machine (h2) runs RHEL."
+    assert len(registry.templates) == 2
+
+    uncached = TemplateRegistry(0)
+    assert uncached.cache is None
+    assert uncached.render(FEDORA, fedora) == "This machine (h1) runs RHEL."
+    assert uncached.render(FEDORA, {"type": "rule", "error_key": "OTHER"}) == str({"type": "rule", "error_key": "OTHER"})
+
+
+def test_render_records(archives, tmpdir):
+    rules, graph = batch.load_rules()
+    records = [batch.evaluate(p, rules, graph) for p in batch.find_archives(archives)]
+    rendered = list(render.render_records(json.loads(json.dumps(records, default=str))))
+    # host2 has a secure sshd_config, sshd_secure returns nothing for it
+    assert [(h, n) for h, n, t in rendered if n == SSHD] == [("host1", SSHD), ("host3", SSHD)]
+    assert ("host1", FEDORA, "This machine (host1.example.com) runs Fedora.") in rendered
+    assert ("host2", BASH, "Bash bug not found: bash-4.4.23-1.el7") in rendered
+
+    path = str(tmpdir.join("results.bin"))
+    with open(path, "wb") as f:
+        with resultfile.ResultWriter(f) as writer:
+            for record in records:
+                writer.write(record)
+    assert list(render.render_records(render.read_records(path))) == rendered
+
+
+def test_benchmark():
+    stats = render.benchmark(20)
+    assert stats["hosts"] == 20
+    assert stats["results"] > 20
+    assert 0 < stats["cached"]["hit_rate"] < 1
+    assert "compiled and cached" in render.format_benchmark(stats)
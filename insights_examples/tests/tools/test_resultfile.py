@@ -0,0 +1,115 @@
+import io
+import json
+
+import pytest
+
+from insights_examples.tools import batch, generators, resultfile
+from insights_examples.tools.resultfile import ResultReader, ResultWriter
+
+
+def as_json(record):
+    return json.loads(json.dumps(record, default=str))
+
+
+def write(records):
+    buf = io.BytesIO()
+    with ResultWriter(buf) as writer:
+        for record in records:
+            writer.write(record)
+    return buf
+
+
+def test_round_trip():
+    records = generators.results(200)
+    records[0]["errors"] = {"archive": "Traceback ...\n" * 20}
+    records[1]["fallbacks"] = {"HostnameUH": (1, 0)}
+    records[2]["values"] = [0, -1, 1, 300, -70000, 2 ** 40, 1.5, True, False, None, "", u"é", {1: "one"}, object]
+    buf = write(records)
+
+    buf.seek(0)
+    read = list(resultfile.iter_records(buf))
+    assert [h for h, r in read] == ["host%d.example.com" % i for i in range(200)]
+    assert [r for h, r in read] == [as_json(r) for r in records]
+
+    reader = ResultReader(buf)
+    assert len(reader) == 200
+    assert "host7.example.com" in reader
+    assert reader.get("host150.example.com") == records[150]
+    assert reader.get("host2.example.com")["values"][-1] == str(object)
+    assert reader.get("missing") is None
+    assert "SSHD_SECURE" in reader.strings
+    assert "host5.example.com" not in reader.strings
+
+
+def test_surrogate_escapes():
+    # Content lines that are not valid UTF-8, decoded with surrogateescape
+    line = b"Banner /etc/issue.\xe9t\xe9".decode("utf-8", "surrogateescape")
+    records = [{"archive": "/data/a%d" % i, "errors": {line: line}} for i in range(3)]
+    buf = write(records)
+
+    buf.seek(0)
+    assert [r for h, r in resultfile.iter_records(buf)] == records
+    assert ResultReader(buf).get("a2")["errors"][line].encode("utf-8", "surrogateescape") == b"Banner /etc/issue.\xe9t\xe9"
+
+
+def test_interning():
+    buf = write([{"archive": "/data/a%d.tar.gz" % i, "openssh": "openssh-7.4p1-16.el7"} for i in range(3)])
+    data = buf.getvalue()
+    assert data.count(b"openssh-7.4p1-16.el7") == 3  # first record, string frame and index
+    assert data.count(b"archive") == 2
+    assert data.count(b"/data/a1.tar.gz") == 1
+
+
+def test_unclosed(tmpdir):
+    path = str(tmpdir.join("results.bin"))
+    with open(path, "wb") as f:
+        writer = ResultWriter(f)
+        for record in generators.results(3):
+            writer.write(record)
+    with open(path, "rb") as f:
+        assert len(list(resultfile.iter_records(f))) == 3
+        with pytest.raises(ValueError):
+            ResultReader(f)
+    with pytest.raises(ValueError):
+        list(resultfile.iter_records(io.BytesIO(b"not a result file")))
+
+
+def test_partly_written():
+    buf = io.BytesIO()
+    writer = ResultWriter(buf)
+    records = generators.results(3)
+    for record in records[:2]:
+        writer.write(record)
+    end = buf.tell()
+    writer.write(records[2])
+    data = buf.getvalue()
+
+    # A reader following the file stops before a frame still being written
+    for size in (end + 1, end + 2, len(data) - 1):
+        partial = io.BytesIO(data[:size])
+        assert len(list(resultfile.iter_records(partial))) == 2
+        assert end <= partial.tell() < size
+    assert len(list(resultfile.iter_records(io.BytesIO(data)))) == 3
+
+
+def test_duplicate_host():
+    writer = ResultWriter(io.BytesIO())
+    writer.write({"archive": "/data/host1.tar.gz"})
+    with pytest.raises(ValueError, match="host1"):
+        writer.write({"archive": "/data/host1.tar.gz", "elapsed": 1.0})
+    assert len(writer.hosts) == 1
+
+
+def test_batch_records(archives):
+    rules, graph = batch.load_rules()
+    records = [batch.evaluate(p, rules, graph) for p in batch.find_archives(archives)]
+    reader = ResultReader(write(records))
+    assert sorted(reader.hosts) == ["host1", "host2", "host3"]
+    assert reader.get("host3") == as_json(records[2])
+
+
+def test_compare():
+    stats = resultfile.compare(generators.results(100), repeat=1)
+    assert stats["records"] == 100
+    assert stats["binary_bytes"] < stats["json_bytes"]
+    assert "100 records" in resultfile.format_comparison(stats)
@@ -0,0 +1,24 @@
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.tools import sshd_memory
+
+
+def test_make_config():
+    lines = sshd_memory.make_config(13)
+    assert len(lines) == 13
+    assert lines[0] == "AllowUsers value0"
+    assert lines[12] == "AllowUsers value12"
+
+
+def test_compact_uses_less_memory():
+    [(lines, default, compact, zero_copy)] = sshd_memory.compare([2000])
+    assert lines == 2000
+    assert zero_copy < compact < default
+    assert SSHDConfig.compact is False
+    assert SSHDConfig.zero_copy is False
+
+
+def test_compare_speed():
+    [(lines, size, default, compact, zero_copy)] = sshd_memory.compare_speed([500], repeat=1)
+    assert (lines, size) == (500, sum(len(l) + 1 for l in sshd_memory.make_config(500)))
+    assert default > 0 and compact > 0 and zero_copy > 0
+    assert SSHDConfig.zero_copy is False
@@ -0,0 +1,109 @@
+import doctest
+
+import pytest
+
+from insights.tests import context_wrap
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.rules import sshd_secure
+from insights_examples.tools import sshd_table
+from insights_examples.tools.sshd_table import MISSING, SSHDConfigTable, check_hosts
+
+HOST1 = """
+PermitRootLogin no
+PermitRootLogin yes
+LogLevel VERBOSE
+Protocol 1
+"""
+
+HOST2 = """
+AuthenticationMethods publickey
+LogLevel VERBOSE
+Match User backup
+    PermitRootLogin yes
+"""
+
+HOST3 = """
+AuthenticationMethods publickey
+LogLevel INFO
+PermitRootLogin YES
+"""
+
+
+def configs():
+    return [SSHDConfig(context_wrap(c)) for c in (HOST1, HOST2, HOST3)]
+
+
+def make_table():
+    host1, host2, host3 = configs()
+    return SSHDConfigTable.from_configs([
+        ('host1', host1, {'openssh': 'openssh-6.6.1p1-31.el7'}),
+        ('host2', host2, {'openssh': 'openssh-7.4p1-16.el7'}),
+        ('host3', host3, {'openssh': 'openssh-7.4p1-16.el7'}),
+    ])
+
+
+def test_columns():
+    table = make_table()
+    assert len(table) == 3
+    assert len(table.host) == len(table.keyword) == len(table.value) == 9
+    assert list(table.host) == [0, 0, 0, 0, 1, 1, 2, 2, 2]
+    assert table.keywords.values[:3] == ['permitrootlogin', 'loglevel', 'protocol']
+    # 'VERBOSE' is stored once for the whole fleet
+    assert table.values.values.count('VERBOSE') == 1
+    assert list(table.last_values('permitrootlogin')) == [
+        table.values.code('yes'), MISSING, table.values.code('YES')
+    ]
+    assert list(table.last_values('Ciphers')) == [MISSING] * 3
+    with pytest.raises(ValueError):
+        table.add('host1', configs()[0])
+
+
+def test_queries():
+    table = make_table()
+    assert table.count('PermitRootLogin', 'yes') == 2
+    assert table.count('PermitRootLogin', 'yes', ignore_case=False) == 1
+    assert table.count('PermitRootLogin', 'yes', by='openssh') == {
+        'openssh-6.6.1p1-31.el7': 1, 'openssh-7.4p1-16.el7': 1
+    }
+    assert table.hosts_where('Protocol', lambda v: v is not None and v != '2') == ['host1']
+    assert table.mask('LogLevel', lambda v: v == 'VERBOSE') == [True, True, False]
+    assert table.value_counts('LogLevel', by='openssh') == {
+        ('openssh-6.6.1p1-31.el7', 'VERBOSE'): 1,
+        ('openssh-7.4p1-16.el7', 'VERBOSE'): 1,
+        ('openssh-7.4p1-16.el7', 'INFO'): 1,
+    }
+
+
+def test_attributes_added_late():
+    host1, host2, host3 = configs()
+    table = SSHDConfigTable()
+    table.add('host1', host1)
+    table.add('host2', host2, release='RHEL 7')
+    table.add('host3', host3)
+    assert list(table.attributes['release'][1]) == [MISSING, 0, MISSING]
+    assert table.value_counts('LogLevel', by='release') == {
+        (None, 'VERBOSE'): 1, ('RHEL 7', 'VERBOSE'): 1, (None, 'INFO'): 1
+    }
+
+
+def test_check_hosts_matches_rule():
+    table = make_table()
+    expected = {}
+    for host_id, config in zip(['host1', 'host2', 'host3'], configs()):
+        errors = sshd_secure.check_all(config)
+        if errors:
+            expected[host_id] = errors
+    assert check_hosts(table) == expected
+    assert check_hosts(table)['host2'] == {'PermitRootLogin': 'default'}
+
+
+def test_sshd_table_documentation():
+    host1, host2, host3 = configs()
+    env = {
+        'SSHDConfigTable': SSHDConfigTable,
+        'host1_config': host1,
+        'host2_config': host2,
+        'host3_config': host3,
+    }
+    failed, total = doctest.testmod(sshd_table, globs=env)
+    assert failed == 0
@@ -0,0 +1,405 @@
+"""
+Fleet batch runner
+==================
+
+Evaluates the example rules against many archives at once, spreading the
+archives over a pool of worker processes.  Each worker loads the insights
+specs and the rules a single time and reuses them for every archive it is
+handed.  One JSON object is written per archive to a JSON-lines file as
+soon as its evaluation completes::
+
+    {"archive": "/data/host1.tar.gz", "elapsed": 0.012,
+     "results": {"insights_examples.rules.sshd_secure.report": {...}, ...},
+     "errors": {}}
+
+``results`` holds the response of every rule (``null`` when a rule did
+not run because its dependencies were missing) and ``errors`` holds the
+formatted exception of any component that failed.
+
+The source is either a directory, in which every archive file
+(``.tar``, ``.tar.gz``, ``.zip``, ...) and every subdirectory (an
+extracted archive) is evaluated, or a manifest file listing one archive
+path per line; relative paths in a manifest are relative to the manifest
+itself.
+
+Run it from the root of the repository::
+
+    $ python -m insights_examples.tools.batch /data/archives -o results.jsonl -j 8
+
+``--scaling`` evaluates the same archives once per process count given
+and prints the throughput and speedup relative to the first count.  The
+timings include starting the pool, so use enough archives that worker
+start-up (loading the specs, about 0.3s per worker) is amortized.  On a
+single CPU machine with 400 small extracted archives::
+
+    $ python -m insights_examples.tools.batch /data/archives --scaling 1 2 4
+    400 archives (0 failed) in 1.13s with 1 processes: 352.4 archives/sec, speedup 1.00x
+    400 archives (0 failed) in 1.46s with 2 processes: 273.1 archives/sec, speedup 0.77x
+    400 archives (0 failed) in 2.43s with 4 processes: 164.5 archives/sec, speedup 0.47x
+
+Throughput only scales while there are idle cores for the extra workers.
+
+``--dedup SIZE`` turns on the content-hash caches of ``SSHDConfig`` and
+``sshd_secure`` in every worker, bounded to ``SIZE`` entries each, so
+hosts built from the same image share one parse and one evaluation of the
+checks.  The hit rate of each cache is printed with the throughput.
+
+The number of archives where a combiner fell back to its second choice
+dependency (see :mod:`insights_examples.fallback`) is printed too, e.g.
+how many hosts had their hostname read from ``uname``.
+
+``--evict`` evaluates each archive rule by rule and frees every parser
+and combiner as soon as the last component reading it has run, see
+:mod:`insights_examples.tools.liveness`, which lowers the peak memory of
+each worker when many rules read many large specs.
+
+``--timings FILE`` records the wall time, CPU time and (with
+``--trace-memory``) memory of every component for each archive, see
+:mod:`insights_examples.tools.instrument`.  One JSON line per archive is
+written to ``FILE`` and the ``--top`` slowest components over the whole
+batch are printed at the end.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+from insights.core import dr
+from insights.core.archives import COMPRESSION_TYPES, extract
+from insights.core.exceptions import SkipComponent
+from insights.core.hydration import initialize_broker
+from insights.core.spec_factory import RegistryPoint
+from insights_examples import fallback, manifest
+from insights_examples.cache import LRUCache
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.rules import sshd_secure
+from insights_examples.tools import liveness
+from insights_examples.tools.instrument import ComponentTimer, TimingAggregator, format_top
+
+DEFAULT_RULES = (
+    "insights_examples.rules.sshd_secure.report",
+    "insights_examples.rules.bash_bug.check_bash_bug",
+    "insights_examples.rules.is_fedora.report",
+)
+
+_worker = {}
+
+
+def load_rules(rule_names=DEFAULT_RULES, default_specs=False):
+    """
+    Loads the named rules and the specs they need and returns a tuple of
+    the rules and the combined dependency graph needed to evaluate them,
+    see :func:`insights_examples.manifest.load_rules`.
+    """
+    return manifest.load_rules(rule_names, default_specs)
+
+
+def find_archives(source):
+    """
+    Returns the list of archive paths in ``source``, a directory of
+    archives or a manifest file listing one path per line.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isdir(path) or name.endswith(COMPRESSION_TYPES):
+                paths.append(path)
+        return paths
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        lines = [l.split('#', 1)[0].strip() for l in f]
+    return [os.path.join(base, l) for l in lines if l]
+
+
+# .tgz is a gzipped tarball, picked up by find_archives as a "gz" name
+_ARCHIVE_EXTENSIONS = COMPRESSION_TYPES + ('tgz',)
+
+
+def archive_name(path):
+    """
+    str: Returns the name of the archive or extracted archive directory at
+    ``path`` without the extensions of the archive types insights reads,
+    e.g. ``host1`` for ``/data/host1.tar.gz`` or ``/data/host1.tgz``.
+    """
+    name = os.path.basename(os.path.normpath(path))
+    stem, dot, ext = name.rpartition('.')
+    while stem and ext in _ARCHIVE_EXTENSIONS:
+        name = stem
+        stem, dot, ext = name.rpartition('.')
+    return name
+
+
+def evaluate_dir(root, rules, graph, broker=None, timer=None, evict=False, fallbacks=None):
+    """
+    Runs ``graph`` over the extracted archive at ``root`` and returns the
+    resulting broker, recording component timings with ``timer`` and the
+    paths taken by combiners with fallbacks with ``fallbacks``, a
+    :class:`insights_examples.fallback.FallbackCounter`, if given.  With
+    ``evict``, every component but the ``rules`` is freed after its last
+    consumer, see :func:`insights_examples.tools.liveness.run`.
+    """
+    ctx, broker = initialize_broker(root, broker=broker)
+    if fallbacks is not None:
+        fallbacks.attach(broker)
+    if timer is None:
+        return _run(graph, rules, broker, evict)
+    timer.attach(broker)
+    timer.start()
+    try:
+        return _run(graph, rules, broker, evict)
+    finally:
+        timer.stop()
+
+
+def _run(graph, rules, broker, evict):
+    if evict:
+        return liveness.run(graph, rules, broker)
+    return dr.run(graph, broker=broker)
+
+
+def format_errors(broker):
+    """
+    dict: Returns the tracebacks of the components that failed in
+    ``broker`` keyed by component name, one per line when a component
+    failed more than once.  ``SkipComponent`` and its ``ContentException``
+    subclass, raised for specs missing from an archive, are not errors.
+    insights also records the exception of a parser under the specs it
+    reads, it is only reported under the parser.
+    """
+    errors = {}
+    seen = set()
+    # Components before the registry points the exceptions are copied to
+    failed = sorted(broker.exceptions.items(), key=lambda item: isinstance(item[0], RegistryPoint))
+    for component, exceptions in failed:
+        tracebacks = []
+        for ex in exceptions:
+            if not isinstance(ex, SkipComponent) and id(ex) not in seen:
+                seen.add(id(ex))
+                tracebacks.append(broker.tracebacks[ex])
+        if tracebacks:
+            errors[dr.get_name(component)] = "\n".join(tracebacks)
+    return errors
+
+
+def format_results(path, broker, rules, elapsed):
+    """
+    Returns the JSON-serializable record written for one archive, with the
+    failed components of :func:`format_errors`.
+    """
+    errors = format_errors(broker)
+    return {
+        "archive": path,
+        "elapsed": round(elapsed, 6),
+        "results": dict((dr.get_name(r), broker.get(r)) for r in rules),
+        "errors": errors,
+    }
+
+
+def evaluate(path, rules, graph, timer=None, evict=False, fallbacks=None):
+    """
+    Evaluates ``rules`` against the archive or extracted archive directory
+    at ``path`` and returns its result record.  Failures to open the
+    archive are reported under the ``"archive"`` key of ``errors``.  When
+    a :class:`ComponentTimer` is given, its timings are added to the
+    record under ``"timings"``.  ``evict`` and ``fallbacks`` are passed on
+    to :func:`evaluate_dir`.
+    """
+    start = time.time()
+    try:
+        if os.path.isdir(path):
+            broker = evaluate_dir(path, rules, graph, timer=timer, evict=evict, fallbacks=fallbacks)
+        else:
+            with extract(path) as ex:
+                broker = evaluate_dir(ex.tmp_dir, rules, graph, timer=timer, evict=evict, fallbacks=fallbacks)
+    except Exception:
+        record = {
+            "archive": path,
+            "elapsed": round(time.time() - start, 6),
+            "results": {},
+            "errors": {"archive": traceback.format_exc()},
+        }
+    else:
+        record = format_results(path, broker, rules, time.time() - start)
+    if timer is not None:
+        record["timings"] = timer.timings
+    return record
+
+
+def enable_dedup(maxsize):
+    """
+    Turns on the content-hash caches of ``SSHDConfig`` and ``sshd_secure``
+    in this process and returns them keyed by name.
+    """
+    SSHDConfig.cache = LRUCache(maxsize)
+    sshd_secure.check_cache = LRUCache(maxsize)
+    return {"sshd_config": SSHDConfig.cache, "sshd_secure": sshd_secure.check_cache}
+
+
+def _init_worker(rule_names, cache_size=None, timings=None, evict=False):
+    _worker["rules"], _worker["graph"] = load_rules(rule_names)
+    _worker["caches"] = enable_dedup(cache_size) if cache_size else {}
+    _worker["timings"] = timings
+    _worker["evict"] = evict
+
+
+def _evaluate_in_worker(path):
+    caches = _worker["caches"]
+    before = dict((n, (c.hits, c.misses)) for n, c in caches.items())
+    fallbacks = fallback.FallbackCounter()
+    timer = ComponentTimer(memory=_worker["timings"] == "memory") if _worker["timings"] else None
+    record = evaluate(path, _worker["rules"], _worker["graph"], timer=timer, evict=_worker["evict"], fallbacks=fallbacks)
+    if caches:
+        record["cache"] = dict((n, (c.hits - before[n][0], c.misses - before[n][1])) for n, c in caches.items())
+    record["fallbacks"] = fallbacks.snapshot()
+    return record
+
+
+def _cache_stats(counts):
+    stats = {}
+    for name, (hits, misses) in counts.items():
+        lookups = hits + misses
+        stats[name] = {"hits": hits, "misses": misses, "hit_rate": float(hits) / lookups if lookups else 0.0}
+    return stats
+
+
+def run_batch(archives, output, processes=None, rule_names=DEFAULT_RULES, chunksize=1, cache_size=None,
+              timings=None, trace_memory=False, top=10, evict=False):
+    """
+    Evaluates every path in ``archives`` over a pool of ``processes``
+    workers (all CPUs when ``None``) and writes one JSON line per archive
+    to the open file ``output`` as results arrive.
+
+    When ``cache_size`` is given, every worker enables the deduplication
+    caches (see :func:`enable_dedup`) bounded to that many entries.
+
+    When ``timings`` (an open file) is given, the component timings of
+    each archive are written to it as JSON lines, tracing memory too if
+    ``trace_memory`` is set.
+
+    With ``evict``, workers free components after their last consumer,
+    see :func:`evaluate_dir`.
+
+    Returns:
+        dict: Throughput statistics with the keys ``archives``, ``failed``,
+        ``processes``, ``seconds`` and ``rate`` (archives per second), plus
+        ``cache`` with the hits, misses and hit rate of each cache summed
+        over the workers when ``cache_size`` is given, ``fallbacks`` with the
+        statistics of :func:`insights_examples.fallback.stats` summed over
+        the workers, and ``slowest`` with
+        the ``top`` slowest components (see :meth:`TimingAggregator.top`)
+        when ``timings`` is given.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    count = failed = 0
+    cache_counts = {}
+    fallback_counts = {}
+    aggregator = TimingAggregator()
+    timing_mode = ("memory" if trace_memory else "time") if timings is not None else None
+    start = time.time()
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(rule_names, cache_size, timing_mode, evict))
+    try:
+        for record in pool.imap_unordered(_evaluate_in_worker, archives, chunksize):
+            count += 1
+            failed += "archive" in record["errors"]
+            for name, (hits, misses) in record.pop("cache", {}).items():
+                total = cache_counts.get(name, (0, 0))
+                cache_counts[name] = (total[0] + hits, total[1] + misses)
+            for name, (preferred, fell_back) in record.pop("fallbacks", {}).items():
+                total = fallback_counts.get(name, (0, 0))
+                fallback_counts[name] = (total[0] + preferred, total[1] + fell_back)
+            if "timings" in record:
+                component_timings = record.pop("timings")
+                aggregator.add(component_timings)
+                timings.write(json.dumps({"archive": record["archive"], "timings": component_timings}, sort_keys=True) + "\n")
+            output.write(json.dumps(record, default=str, sort_keys=True) + "\n")
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    seconds = time.time() - start
+    stats = {
+        "archives": count,
+        "failed": failed,
+        "processes": processes,
+        "seconds": seconds,
+        "rate": count / seconds if seconds else 0.0,
+        "fallbacks": fallback.stats(fallback_counts),
+    }
+    if cache_size:
+        stats["cache"] = _cache_stats(cache_counts)
+    if timings is not None:
+        stats["slowest"] = aggregator.top(top)
+    return stats
+
+
+def measure_scaling(archives, process_counts, rule_names=DEFAULT_RULES, cache_size=None):
+    """
+    Runs the batch once per entry in ``process_counts`` discarding the
+    results, and returns the statistics of each run with an extra
+    ``speedup`` key relative to the first run.
+    """
+    runs = []
+    with open(os.devnull, "w") as devnull:
+        for processes in process_counts:
+            runs.append(run_batch(archives, devnull, processes, rule_names, cache_size=cache_size))
+    for stats in runs:
+        stats["speedup"] = stats["rate"] / runs[0]["rate"] if runs[0]["rate"] else 0.0
+    return runs
+
+
+def format_stats(stats):
+    text = "{archives} archives ({failed} failed) in {seconds:.2f}s with {processes} processes: {rate:.1f} archives/sec".format(**stats)
+    for name, cache in sorted(stats.get("cache", {}).items()):
+        text += ", {0} cache hit rate {1:.1%}".format(name, cache["hit_rate"])
+    for name, counts in sorted(stats.get("fallbacks", {}).items()):
+        text += ", {0} fell back {1} of {2} times".format(
+            name.rsplit(".", 1)[-1], counts["fallback"], counts["preferred"] + counts["fallback"])
+    return text
+
+
+def main():
+    p = argparse.ArgumentParser(description="Evaluate the example rules against many archives.")
+    p.add_argument("source", help="Directory of archives or manifest file listing archive paths.")
+    p.add_argument("-o", "--output", default="results.jsonl", help="JSON-lines file to write results to.")
+    p.add_argument("-j", "--processes", type=int, default=None, help="Number of worker processes, all CPUs by default.")
+    p.add_argument("-r", "--rule", action="append", dest="rules",
+                   help="Fully qualified rule to evaluate, may be repeated.  Defaults to the example rules.")
+    p.add_argument("--scaling", type=int, nargs="+", metavar="PROCESSES",
+                   help="Measure throughput for each process count instead of writing results.")
+    p.add_argument("--dedup", type=int, metavar="SIZE",
+                   help="Share parse and check results between identical sshd_config files, caching up to SIZE of them.")
+    p.add_argument("--timings", metavar="FILE", help="Write per-archive component timings to this JSON-lines file.")
+    p.add_argument("--trace-memory", action="store_true", help="Include memory allocations in the timings.")
+    p.add_argument("--top", type=int, default=10, help="Number of slowest components to report with --timings.")
+    p.add_argument("--evict", action="store_true", help="Free parsers and combiners after the last component reading them.")
+    args = p.parse_args()
+
+    archives = find_archives(args.source)
+    rule_names = tuple(args.rules or DEFAULT_RULES)
+    if args.scaling:
+        for stats in measure_scaling(archives, args.scaling, rule_names, args.dedup):
+            print("{0}, speedup {1:.2f}x".format(format_stats(stats), stats["speedup"]))
+    else:
+        timings = open(args.timings, "w") if args.timings else None
+        try:
+            with open(args.output, "w") as output:
+                stats = run_batch(archives, output, args.processes, rule_names, cache_size=args.dedup,
+                                  timings=timings, trace_memory=args.trace_memory, top=args.top, evict=args.evict)
+        finally:
+            if timings:
+                timings.close()
+        print(format_stats(stats))
+        if "slowest" in stats:
+            print(format_top(stats["slowest"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Benchmark suite
+===============
+
+Measures the speed and peak memory of the example components on synthetic
+input from :mod:`insights_examples.tools.generators`:
+
+* ``parse_sshd_config/<lines>``: ``SSHDConfig`` parsing of an
+  ``sshd_config`` of 10 to 100,000 lines, and
+  ``parse_sshd_config_compact/<lines>`` and
+  ``parse_sshd_config_zero_copy/<lines>`` the same in compact and
+  zero-copy mode.
+* ``parse_installed_rpms/<packages>``: ``InstalledRpms`` parsing of 100 to
+  20,000 packages, and ``parse_installed_rpms_targeted/<packages>``
+  ``TargetedRpms`` reading the same packages from a file for the packages
+  the example rules declare.
+* ``hostname_uh/hostname`` and ``hostname_uh/uname``: ``HostnameUH``
+  construction from each of its dependencies, the latter including the
+  ``Uname`` parse it only does when falling back.
+* ``rule/<rule>/<packages>``: each example rule end to end through
+  ``InputData``, that is spec loading, filtering, parsing, combining and
+  the rule itself.
+
+Each case runs ``--repeat`` times; the best and median wall times are
+recorded, then the case runs once more under :mod:`tracemalloc` for its
+peak memory.  Results are written as JSON::
+
+    $ python -m insights_examples.tools.benchmark run -o bench.json
+    $ python -m insights_examples.tools.benchmark run --quick -o bench.json
+
+``compare`` checks a run against a stored baseline and exits with status 1
+when any case got slower, or used more peak memory, by more than
+``--threshold`` (10% by default)::
+
+    $ python -m insights_examples.tools.benchmark compare bench.json baseline.json
+"""
+from __future__ import print_function
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from insights.core import dr
+from insights.core.spec_factory import TextFileProvider
+from insights.parsers.hostname import Hostname
+from insights.parsers.installed_rpms import InstalledRpms
+from insights.specs import Specs
+from insights.tests import InputData, context_wrap, run_input_data
+from insights_examples.combiners.hostname_uh import HostnameUH
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.parsers.targeted_rpms import TargetedRpms
+from insights_examples.rules import bash_bug, is_fedora, sshd_secure
+from insights_examples.tools import generators
+
+SSHD_CONFIG_LINES = [10, 100, 1000, 10000, 100000]
+INSTALLED_RPMS_PACKAGES = [100, 1000, 5000, 20000]
+QUICK_SSHD_CONFIG_LINES = [10, 1000]
+QUICK_INSTALLED_RPMS_PACKAGES = [100, 1000]
+
+RULES = [sshd_secure.report, bash_bug.check_bash_bug, is_fedora.report]
+
+
+def _rule_input(rpms_lines):
+    input_data = InputData("benchmark")
+    input_data.add(Specs.installed_rpms, "\n".join(rpms_lines))
+    input_data.add(Specs.sshd_config, "\n".join(generators.sshd_config(100)))
+    input_data.add(Specs.redhat_release, generators.REDHAT_RELEASE)
+    input_data.add(Specs.hostname, generators.HOSTNAME)
+    return input_data
+
+
+class _SpecFile(object):
+    # Spec content in a file, as read from an archive
+    def __init__(self, lines):
+        fd, self.path = tempfile.mkstemp(prefix="benchmark-")
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        atexit.register(os.remove, self.path)
+        self.relative_path = self.path
+        self.args = None
+
+    @property
+    def content(self):
+        with open(self.path) as f:
+            return [l.rstrip("\n") for l in f]
+
+    def provider(self, ds):
+        """Returns a new provider of the file for the spec ``ds``, as built for an archive."""
+        return TextFileProvider(os.path.basename(self.path), root=os.path.dirname(self.path), ds=ds)
+
+
+def _parse_compact(context):
+    SSHDConfig.compact = True
+    try:
+        return SSHDConfig(context)
+    finally:
+        SSHDConfig.compact = False
+
+
+def _parse_zero_copy(context):
+    SSHDConfig.zero_copy = True
+    try:
+        return SSHDConfig(context)
+    finally:
+        SSHDConfig.zero_copy = False
+
+
+def cases(quick=False):
+    """
+    Returns a list of ``(name, function)`` benchmark cases, the input of
+    each being generated up front so only the measured work is timed.
+    """
+    sshd_sizes = QUICK_SSHD_CONFIG_LINES if quick else SSHD_CONFIG_LINES
+    rpms_sizes = QUICK_INSTALLED_RPMS_PACKAGES if quick else INSTALLED_RPMS_PACKAGES
+    result = []
+
+    for lines in sshd_sizes:
+        context = context_wrap(generators.sshd_config(lines))
+        result.append(("parse_sshd_config/%d" % lines, lambda c=context: SSHDConfig(c)))
+        result.append(("parse_sshd_config_compact/%d" % lines, lambda c=context: _parse_compact(c)))
+        result.append(("parse_sshd_config_zero_copy/%d" % lines, lambda c=context: _parse_zero_copy(c)))
+
+    for packages in rpms_sizes:
+        context = context_wrap(generators.installed_rpms(packages))
+        result.append(("parse_installed_rpms/%d" % packages, lambda c=context: InstalledRpms(c)))
+        spec_file = _SpecFile(context.content)
+        result.append(("parse_installed_rpms_targeted/%d" % packages,
+                       lambda f=spec_file: TargetedRpms(f.provider(Specs.installed_rpms))))
+
+    hostname = Hostname(context_wrap(generators.HOSTNAME))
+    uname = context_wrap(generators.UNAME)
+    result.append(("hostname_uh/hostname", lambda: HostnameUH(hostname, uname)))
+    result.append(("hostname_uh/uname", lambda: HostnameUH(None, uname)))
+
+    for packages in rpms_sizes:
+        input_data = _rule_input(generators.installed_rpms(packages))
+        for rule in RULES:
+            name = "rule/%s/%d" % (dr.get_name(rule), packages)
+            result.append((name, lambda r=rule, i=input_data: run_input_data(r, i)))
+    return result
+
+
+def measure(func, repeat=5):
+    """
+    dict: Returns the best and median wall time in seconds of ``repeat``
+    calls to ``func`` and the peak memory in bytes of one more call.
+    """
+    times = sorted(timeit.repeat(func, number=1, repeat=repeat))
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "best": times[0],
+        "median": times[len(times) // 2],
+        "peak_bytes": peak,
+    }
+
+
+def run(quick=False, repeat=5, pattern=None):
+    """
+    dict: Runs every case whose name contains ``pattern`` and returns the
+    results with some details of the environment.
+    """
+    results = {}
+    for name, func in cases(quick):
+        if pattern is None or pattern in name:
+            results[name] = measure(func, repeat)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.10):
+    """
+    Compares two benchmark runs case by case.
+
+    Returns:
+        list: ``(case, metric, baseline, current, ratio)`` tuples for every
+        case and metric (``best`` time or ``peak_bytes``) where ``current``
+        exceeds ``baseline`` by more than ``threshold``.  Cases missing
+        from either run are ignored.
+    """
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for metric in ("best", "peak_bytes"):
+            if base[metric] and result[metric] > base[metric] * (1 + threshold):
+                regressions.append((name, metric, base[metric], result[metric], float(result[metric]) / base[metric]))
+    return regressions
+
+
+def format_results(run_data):
+    lines = ["{0:<55} {1:>12} {2:>12} {3:>12}".format("case", "best (ms)", "median (ms)", "peak (KiB)")]
+    for name, result in run_data["results"].items():
+        lines.append("{0:<55} {1:>12.3f} {2:>12.3f} {3:>12.1f}".format(
+            name, result["best"] * 1000, result["median"] * 1000, result["peak_bytes"] / 1024.0))
+    return "\n".join(lines)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark the example parsers, combiners and rules.")
+    sub = p.add_subparsers(dest="command")
+    p_run = sub.add_parser("run", help="Run the benchmarks.")
+    p_run.add_argument("-o", "--output", default="bench.json", help="File to write the results to.")
+    p_run.add_argument("--quick", action="store_true", help="Only run the smaller input sizes.")
+    p_run.add_argument("--repeat", type=int, default=5, help="Timed runs of each case.")
+    p_run.add_argument("-k", dest="pattern", help="Only run cases whose name contains this string.")
+    p_cmp = sub.add_parser("compare", help="Flag regressions against a baseline.")
+    p_cmp.add_argument("current", help="Results of the run to check.")
+    p_cmp.add_argument("baseline", help="Results of the baseline run.")
+    p_cmp.add_argument("--threshold", type=float, default=0.10, help="Allowed relative increase, 0.10 by default.")
+    args = p.parse_args()
+
+    if args.command == "run":
+        data = run(args.quick, args.repeat, args.pattern)
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        print(format_results(data))
+    elif args.command == "compare":
+        with open(args.current) as f:
+            current = json.load(f)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for name, metric, base, cur, ratio in regressions:
+            print("REGRESSION {0} {1}: {2:.6g} -> {3:.6g} ({4:+.1%})".format(name, metric, base, cur, ratio - 1))
+        if regressions:
+            sys.exit(1)
+        print("No regressions above {0:.0%}".format(args.threshold))
+    else:
+        p.print_help()
+
+
+if __name__ == "__main__":
+    main()
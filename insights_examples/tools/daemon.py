@@ -0,0 +1,410 @@
+"""
+Warm evaluation daemon
+======================
+
+Starting a new process for every uploaded archive pays for importing
+insights and the rules and registering their components each time, and
+starts with empty caches.  The daemon does that once: it starts a pool of
+worker processes that load the rules (see
+:func:`insights_examples.tools.batch.load_rules`) and keep them, with the
+deduplication caches of ``--dedup``, for every archive they evaluate::
+
+    $ python -m insights_examples.tools.daemon serve -s /run/insights.sock -j 4 --dedup 1024
+
+Without ``-s`` ``serve``, ``stats`` and ``stop`` use the socket
+``insights_examples.sock`` in the private directory of
+:func:`runtime_dir`.  The socket is only accessible to the user running
+the daemon, who alone may have it read archives.
+
+Clients connect to the Unix domain socket and send one JSON object per
+line, answered by one JSON line each, in order:
+
+* ``{"archive": "/data/host1.tar.gz"}`` evaluates an archive or extracted
+  archive directory and returns its result record, as written by
+  :mod:`insights_examples.tools.batch`,
+* ``{"command": "stats"}`` returns the statistics of :meth:`Daemon.stats`,
+* ``{"command": "ping"}`` and ``{"command": "shutdown"}`` return
+  ``{"ok": true}``, the latter stopping the daemon.
+
+Several clients are served at once, each by a thread waiting on the
+pool.  :class:`Client` wraps the protocol, and the ``evaluate``, ``stats``
+and ``stop`` commands use it from the shell::
+
+    $ python -m insights_examples.tools.daemon evaluate -s /run/insights.sock /data/host1.tar.gz
+
+Without ``-s`` ``evaluate`` loads the rules and evaluates the archives
+itself, which is what a process started per archive does.  ``benchmark``
+compares the latency per archive of both models, one archive at a time.
+For 50 small extracted archives with one worker::
+
+    $ python -m insights_examples.tools.daemon benchmark /data/archives
+    spawn per archive  50 archives: p50 361.8ms, p99 428.9ms, mean 363.9ms
+    daemon             50 archives: p50 2.4ms, p99 15.5ms, mean 3.2ms
+
+The daemon's p99 is the first archive of its worker, slower than the next
+ones.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from collections import deque
+from insights_examples import fallback
+from insights_examples.tools import batch
+
+SOCKET_NAME = "insights_examples.sock"
+"""str: Name of the socket in :func:`runtime_dir` used when no path is given."""
+
+LATENCY_WINDOW = 10000
+"""int: Number of most recent archives the latency percentiles cover."""
+
+
+def runtime_dir():
+    """
+    str: Returns ``$XDG_RUNTIME_DIR`` when set, otherwise a directory only
+    the current user can access in the temporary directory, created if
+    needed.
+
+    Raises:
+        RuntimeError: When that directory exists but is a link, belongs to
+            another user or is accessible to other users.
+    """
+    path = os.environ.get("XDG_RUNTIME_DIR")
+    if path:
+        return path
+    path = os.path.join(tempfile.gettempdir(), "insights_examples-%d" % os.getuid())
+    try:
+        os.mkdir(path, 0o700)
+    except OSError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError("%s is not a private directory" % path)
+    return path
+
+
+def default_socket():
+    """str: Returns the socket path used when none is given."""
+    return os.path.join(runtime_dir(), SOCKET_NAME)
+
+
+def percentiles(values, points=(50, 99)):
+    """
+    dict: Returns the nearest-rank percentiles ``points`` of ``values``
+    keyed ``p50``, ``p99``, ..., with their ``mean`` and ``count``.
+    """
+    values = sorted(values)
+    result = {"count": len(values), "mean": sum(values) / len(values) if values else 0.0}
+    for point in points:
+        rank = max(int(-(-point * len(values) // 100)) - 1, 0)
+        result["p%d" % point] = values[rank] if values else 0.0
+    return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError:
+                request = None
+            if not isinstance(request, dict):
+                response = {"error": "Invalid request: %r" % line}
+            else:
+                response = self.server.owner.handle(request)
+            self.wfile.write((json.dumps(response, default=str, sort_keys=True) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemon(object):
+    """
+    Serves evaluations of ``rule_names`` on the Unix socket
+    ``socket_path`` (:func:`default_socket` when ``None``) with
+    ``processes`` workers (all CPUs when ``None``), each with
+    deduplication caches of ``cache_size`` entries if given.  The socket is
+    created readable and writable by its owner only.
+
+    Raises:
+        RuntimeError: When another daemon already listens on ``socket_path``.
+    """
+
+    def __init__(self, socket_path=None, rule_names=batch.DEFAULT_RULES, processes=None, cache_size=None):
+        socket_path = self.socket_path = socket_path or default_socket()
+        self.processes = processes or multiprocessing.cpu_count()
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._archives = self._failed = 0
+        self._cache_counts = {}
+        self._fallback_counts = {}
+        self._started = time.time()
+        if os.path.exists(socket_path):
+            try:
+                Client(socket_path).close()
+            except socket.error:
+                os.remove(socket_path)
+            else:
+                raise RuntimeError("A daemon is already listening on %s" % socket_path)
+        # The workers are forked before the server starts any thread
+        self.pool = multiprocessing.Pool(self.processes, initializer=batch._init_worker,
+                                         initargs=(tuple(rule_names), cache_size, None))
+        # Bind with mode 0600 rather than chmod after, leaving no window
+        # where other users could connect
+        umask = os.umask(0o177)
+        try:
+            self.server = _Server(socket_path, _Handler)
+        finally:
+            os.umask(umask)
+        self.server.owner = self
+
+    def evaluate(self, path):
+        """dict: Evaluates the archive at ``path`` on the pool and returns its result record."""
+        start = time.time()
+        record = self.pool.apply(batch._evaluate_in_worker, (path,))
+        with self._lock:
+            self._archives += 1
+            self._failed += "archive" in record["errors"]
+            self._latencies.append(time.time() - start)
+            for name, (hits, misses) in record.pop("cache", {}).items():
+                total = self._cache_counts.get(name, (0, 0))
+                self._cache_counts[name] = (total[0] + hits, total[1] + misses)
+            for name, (preferred, fell_back) in record.pop("fallbacks", {}).items():
+                total = self._fallback_counts.get(name, (0, 0))
+                self._fallback_counts[name] = (total[0] + preferred, total[1] + fell_back)
+        return record
+
+    def stats(self):
+        """
+        dict: Returns the number of ``archives`` evaluated and ``failed``,
+        the ``processes``, the ``uptime`` in seconds, the ``latency``
+        percentiles of :func:`percentiles` in seconds over the last
+        :data:`LATENCY_WINDOW` archives, the ``fallbacks``
+        statistics and, with a cache size, the ``cache`` statistics as
+        returned by :func:`insights_examples.tools.batch.run_batch`.
+        """
+        with self._lock:
+            stats = {
+                "archives": self._archives,
+                "failed": self._failed,
+                "processes": self.processes,
+                "uptime": time.time() - self._started,
+                "latency": percentiles(self._latencies),
+                "fallbacks": fallback.stats(self._fallback_counts),
+            }
+            if self.cache_size:
+                stats["cache"] = batch._cache_stats(self._cache_counts)
+        return stats
+
+    def handle(self, request):
+        """dict: Returns the response to one ``request`` of the protocol."""
+        command = request.get("command")
+        if "archive" in request:
+            return self.evaluate(request["archive"])
+        if command == "stats":
+            return self.stats()
+        if command == "ping":
+            return {"ok": True}
+        if command == "shutdown":
+            # shutdown() waits for serve_forever() to return, not from its thread
+            threading.Thread(target=self.server.shutdown).start()
+            return {"ok": True}
+        return {"error": "Unknown request: %r" % (request,)}
+
+    def serve_forever(self):
+        """Serves requests until a ``shutdown`` request, then closes the daemon."""
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def start(self):
+        """Serves requests in a background thread, which is returned."""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def close(self):
+        """Stops the workers and removes the socket."""
+        if self.pool is None:
+            return
+        self.server.server_close()
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class Client(object):
+    """
+    Connection to the daemon listening on ``socket_path``
+    (:func:`default_socket` when ``None``), waiting up to ``timeout``
+    seconds for its socket to appear.
+    """
+
+    def __init__(self, socket_path=None, timeout=0):
+        socket_path = socket_path or default_socket()
+        deadline = time.time() + timeout
+        while True:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(socket_path)
+                break
+            except socket.error:
+                self.sock.close()
+                if time.time() >= deadline:
+                    raise
+                time.sleep(0.05)
+        self._file = self.sock.makefile("rwb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, request):
+        """dict: Sends ``request`` and returns the response."""
+        self._file.write((json.dumps(request) + "\n").encode("utf-8"))
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise socket.error("The daemon closed the connection")
+        return json.loads(line.decode("utf-8"))
+
+    def evaluate(self, path):
+        """dict: Returns the result record of the archive at ``path``."""
+        return self.request({"archive": os.path.abspath(path)})
+
+    def stats(self):
+        return self.request({"command": "stats"})
+
+    def shutdown(self):
+        return self.request({"command": "shutdown"})
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+
+def _spawn(path, rule_names):
+    # Evaluates path in a new process, as done without the daemon
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [root, env.get("PYTHONPATH")] if p)
+    args = [sys.executable, "-m", "insights_examples.tools.daemon", "evaluate"]
+    for name in rule_names:
+        args.extend(["-r", name])
+    return json.loads(subprocess.check_output(args + [path], env=env).decode("utf-8"))
+
+
+def benchmark(archives, rule_names=batch.DEFAULT_RULES, processes=1):
+    """
+    Evaluates every path in ``archives`` one at a time, first starting a
+    process per archive, then with a daemon of ``processes`` workers.
+
+    Returns:
+        dict: The :func:`percentiles` of the latency per archive in
+        seconds for ``spawn`` and ``daemon``.
+    """
+    latencies = {"spawn": [], "daemon": []}
+    for path in archives:
+        start = time.time()
+        _spawn(path, rule_names)
+        latencies["spawn"].append(time.time() - start)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        daemon = Daemon(os.path.join(tmp, "daemon.sock"), rule_names, processes)
+        thread = daemon.start()
+        with Client(daemon.socket_path, timeout=10) as client:
+            for path in archives:
+                start = time.time()
+                client.evaluate(path)
+                latencies["daemon"].append(time.time() - start)
+            client.shutdown()
+        thread.join()
+    finally:
+        shutil.rmtree(tmp)
+    return dict((k, percentiles(v)) for k, v in latencies.items())
+
+
+def format_latency(label, stats):
+    return "{0:<18} {1} archives: p50 {2:.1f}ms, p99 {3:.1f}ms, mean {4:.1f}ms".format(
+        label, stats["count"], stats["p50"] * 1000, stats["p99"] * 1000, stats["mean"] * 1000)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Evaluate the example rules from a long-running daemon.")
+    sub = p.add_subparsers(dest="command")
+    serve = sub.add_parser("serve", help="Run the daemon.")
+    serve.add_argument("-j", "--processes", type=int, default=None, help="Number of worker processes, all CPUs by default.")
+    serve.add_argument("--dedup", type=int, metavar="SIZE", help="Enable the deduplication caches, see the batch runner.")
+    evaluate = sub.add_parser("evaluate", help="Evaluate archives and print their result records.")
+    evaluate.add_argument("archives", nargs="+", help="Archives or extracted archive directories.")
+    sub.add_parser("stats", help="Print the statistics of the daemon.")
+    sub.add_parser("stop", help="Stop the daemon.")
+    bench = sub.add_parser("benchmark", help="Compare the latency of the daemon with a process per archive.")
+    bench.add_argument("source", help="Directory of archives or manifest file listing archive paths.")
+    bench.add_argument("-j", "--processes", type=int, default=1, help="Number of daemon worker processes.")
+    for parser in (serve, evaluate, sub.choices["stats"], sub.choices["stop"]):
+        parser.add_argument("-s", "--socket", default=None,
+                            help="Socket of the daemon." + (" Evaluate in this process if not given." if parser is evaluate
+                                                            else " Defaults to %s in the runtime directory." % SOCKET_NAME))
+    for parser in (serve, evaluate, bench):
+        parser.add_argument("-r", "--rule", action="append", dest="rules",
+                            help="Fully qualified rule to evaluate, may be repeated.  Defaults to the example rules.")
+    args = p.parse_args()
+    rule_names = tuple(getattr(args, "rules", None) or batch.DEFAULT_RULES)
+
+    if args.command == "serve":
+        daemon = Daemon(args.socket, rule_names, args.processes, args.dedup)
+        signal.signal(signal.SIGTERM, lambda *a: threading.Thread(target=daemon.server.shutdown).start())
+        print("Listening on {0} with {1} workers".format(daemon.socket_path, daemon.processes))
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "evaluate":
+        if args.socket:
+            with Client(args.socket) as client:
+                for path in args.archives:
+                    print(json.dumps(client.evaluate(path), sort_keys=True))
+        else:
+            rules, graph = batch.load_rules(rule_names)
+            for path in args.archives:
+                print(json.dumps(batch.evaluate(path, rules, graph), default=str, sort_keys=True))
+    elif args.command == "stats":
+        with Client(args.socket) as client:
+            print(json.dumps(client.stats(), indent=4, sort_keys=True))
+    elif args.command == "stop":
+        with Client(args.socket) as client:
+            client.shutdown()
+    elif args.command == "benchmark":
+        stats = benchmark(batch.find_archives(args.source), rule_names, args.processes)
+        print(format_latency("spawn per archive", stats["spawn"]))
+        print(format_latency("daemon", stats["daemon"]))
+    else:
+        p.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""
+Fleet summaries of rule results
+===============================
+
+:class:`FleetSummary` reduces the result records of
+:mod:`insights_examples.tools.batch` to fleet-wide counts one record at a
+time: per rule and response type the number of hosts, and for the fields
+of interest of each rule the most frequent values, e.g. which
+``sshd_secure`` directives fail and with which values, which ``openssh``
+packages those hosts run, the products and duplicated hostnames reported
+by ``is_fedora`` and the ``bash`` versions seen by ``bash_bug``.  A dict
+field such as the ``errors`` of ``sshd_secure`` counts its keys under the
+field name and the values of each key under ``field.key``.
+
+Values are counted by :class:`TopValues`, a Space-Saving summary of at
+most ``capacity`` values, so a summary takes the same memory for ten
+hosts or ten million.  Counts are exact as long as a field has no more
+distinct values than that; past it the least frequent values are evicted
+and the counts of the values kept become upper bounds, with their
+maximum overestimation reported as ``error``.  Values making up more than
+``1 / capacity`` of the values of a field are always kept.
+
+Summaries are mergeable: each worker process summarizes its own share of
+the results and the partial summaries are merged, in any order, into the
+one of the fleet.  :meth:`FleetSummary.to_dict` gives a partial summary
+as JSON to merge later::
+
+    $ python -m insights_examples.tools.fleet summarize results-*.jsonl -j 4
+    $ python -m insights_examples.tools.fleet summarize results.bin -o partial1.json
+    $ python -m insights_examples.tools.fleet merge partial1.json partial2.json
+
+Result files are JSON lines or binary result files of
+:mod:`insights_examples.tools.resultfile`.  ``benchmark`` compares the
+summary with collecting the responses of every host in a list and
+counting afterwards, for synthetic hosts (see
+:func:`insights_examples.tools.generators.iter_results`)::
+
+    $ python -m insights_examples.tools.fleet benchmark --hosts 100000
+    collect and count    1.89s  peak  70.53MiB
+    streaming summary    1.23s  peak   0.07MiB
+
+The peak of the summary, under 100KiB, is the same for 10,000 hosts while
+collecting the responses needs 7MiB there, ten times less.
+"""
+from __future__ import print_function
+
+import argparse
+import heapq
+import itertools
+import json
+import multiprocessing
+import time
+import tracemalloc
+
+from collections import Counter
+
+from insights_examples.tools import generators
+from insights_examples.tools.render import read_records
+
+DEFAULT_FIELDS = {
+    "insights_examples.rules.sshd_secure.report": ("errors", "openssh"),
+    "insights_examples.rules.bash_bug.check_bash_bug": ("bash",),
+    "insights_examples.rules.is_fedora.report": ("product", "hostname"),
+}
+"""dict: Response fields summarized for each rule."""
+
+DEFAULT_CAPACITY = 100
+"""int: Distinct values counted per field."""
+
+MISSING = "missing"
+"""str: Response type counted for rules without a response."""
+
+_LABELS = {"rule": "fail", MISSING: "no response"}
+
+
+def _value(value):
+    # Values must be hashable and survive a JSON round trip
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class TopValues(object):
+    """
+    Space-Saving count of the most frequent values of a stream, keeping
+    at most ``capacity`` values.
+
+    Attributes:
+        capacity (int): Number of values kept.
+        total (int): Number of values added.
+        counts (dict): ``[count, error]`` of each value kept, ``count``
+            overestimating the real count by at most ``error``.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        # (count, sequence, value) of each value kept, counts may lag
+        # behind and are brought up to date when they reach the top
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def add(self, value, count=1):
+        """Counts ``value`` ``count`` times."""
+        self.total += count
+        entry = self.counts.get(value)
+        if entry is not None:
+            entry[0] += count
+            return
+        error = 0
+        if len(self.counts) >= self.capacity:
+            # The new value takes the place, and the count, of the least
+            # frequent one
+            error = self._pop_min()
+        self.counts[value] = [error + count, error]
+        heapq.heappush(self._heap, (error + count, next(self._sequence), value))
+
+    def _pop_min(self):
+        while True:
+            count, _, value = heapq.heappop(self._heap)
+            current = self.counts[value][0]
+            if current == count:
+                del self.counts[value]
+                return count
+            heapq.heappush(self._heap, (current, next(self._sequence), value))
+
+    def _floor(self):
+        # Largest count a value not kept may have had
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(count for count, error in self.counts.values())
+
+    def _set_counts(self, counts):
+        ranked = sorted(counts.items(), key=lambda item: (-item[1][0], str(item[0])))
+        self.counts = dict(ranked[:self.capacity])
+        self._heap = [(c[0], next(self._sequence), v) for v, c in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def merge(self, other):
+        """
+        Adds the counts of ``other``, a :class:`TopValues` of the same or
+        another stream.  Values kept by only one of the two are counted in
+        the other with its lowest count, as they may have been evicted.
+        """
+        floor, other_floor = self._floor(), other._floor()
+        counts = {}
+        for value in set(self.counts) | set(other.counts):
+            count, error = self.counts.get(value, (floor, floor))
+            other_count, other_error = other.counts.get(value, (other_floor, other_floor))
+            counts[value] = [count + other_count, error + other_error]
+        self.total += other.total
+        self._set_counts(counts)
+
+    def top(self, n=None):
+        """
+        list: Returns the ``n`` most frequent values, all by default, as
+        ``(value, count, error)`` tuples by decreasing count.
+        """
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1][0], str(item[0])))
+        return [(value, count, error) for value, (count, error) in ranked[:n]]
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "total": self.total, "counts": [list(t) for t in self.top()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        top_values = cls(data["capacity"])
+        top_values.total = data["total"]
+        top_values._set_counts(dict((value, [count, error]) for value, count, error in data["counts"]))
+        return top_values
+
+
+class FleetSummary(object):
+    """
+    Streaming, mergeable summary of the result records of many hosts.
+
+    Attributes:
+        fields (dict): Fields summarized per rule name, see
+            :data:`DEFAULT_FIELDS`.
+        capacity (int): Distinct values kept per field.
+        hosts (int): Records added.
+        failed (int): Records of archives that could not be evaluated.
+        rules (dict): Per rule name, per response type (``"rule"`` for
+            ``make_fail``, ``"pass"``, ... and :data:`MISSING`), the
+            ``count`` of hosts and the :class:`TopValues` of each field
+            keyed by field name.
+    """
+
+    def __init__(self, fields=None, capacity=DEFAULT_CAPACITY):
+        self.fields = dict(DEFAULT_FIELDS if fields is None else fields)
+        self.capacity = capacity
+        self.hosts = 0
+        self.failed = 0
+        self.rules = {}
+
+    def _group(self, name, response_type):
+        types = self.rules.setdefault(name, {})
+        group = types.get(response_type)
+        if group is None:
+            group = types[response_type] = {"count": 0, "fields": {}}
+        return group
+
+    def _values(self, group, field):
+        values = group["fields"].get(field)
+        if values is None:
+            values = group["fields"][field] = TopValues(self.capacity)
+        return values
+
+    def add(self, record):
+        """Adds the results of one record."""
+        self.hosts += 1
+        if "archive" in record.get("errors", {}):
+            self.failed += 1
+            return
+        for name, response in record["results"].items():
+            group = self._group(name, response.get("type") if response else MISSING)
+            group["count"] += 1
+            if not response:
+                continue
+            for field in self.fields.get(name, ()):
+                if field not in response:
+                    continue
+                value = response[field]
+                if isinstance(value, dict):
+                    for key, item in value.items():
+                        self._values(group, field).add(_value(key))
+                        self._values(group, "%s.%s" % (field, key)).add(_value(item))
+                else:
+                    self._values(group, field).add(_value(value))
+
+    def merge(self, other):
+        """Adds the counts of ``other``, the summary of other hosts."""
+        self.hosts += other.hosts
+        self.failed += other.failed
+        for name, fields in other.fields.items():
+            self.fields.setdefault(name, fields)
+        for name, types in other.rules.items():
+            for response_type, other_group in types.items():
+                group = self._group(name, response_type)
+                group["count"] += other_group["count"]
+                for field, values in other_group["fields"].items():
+                    self._values(group, field).merge(values)
+
+    def to_dict(self):
+        """dict: Returns the summary as JSON-serializable data, see :meth:`from_dict`."""
+        rules = {}
+        for name, types in self.rules.items():
+            rules[name] = dict((response_type, {
+                "count": group["count"],
+                "fields": dict((field, values.to_dict()) for field, values in group["fields"].items()),
+            }) for response_type, group in types.items())
+        return {
+            "fields": dict((name, list(fields)) for name, fields in self.fields.items()),
+            "capacity": self.capacity,
+            "hosts": self.hosts,
+            "failed": self.failed,
+            "rules": rules,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """FleetSummary: Returns the summary of :meth:`to_dict` ``data``."""
+        summary = cls(data["fields"], data["capacity"])
+        summary.hosts = data["hosts"]
+        summary.failed = data["failed"]
+        for name, types in data["rules"].items():
+            for response_type, group in types.items():
+                summary.rules.setdefault(name, {})[response_type] = {
+                    "count": group["count"],
+                    "fields": dict((f, TopValues.from_dict(v)) for f, v in group["fields"].items()),
+                }
+        return summary
+
+
+def summarize(paths, fields=None, capacity=DEFAULT_CAPACITY):
+    """Returns the :class:`FleetSummary` of the records of the result files ``paths``."""
+    summary = FleetSummary(fields, capacity)
+    for path in paths:
+        for record in read_records(path):
+            summary.add(record)
+    return summary
+
+
+def _summarize_file(args):
+    path, fields, capacity = args
+    return summarize([path], fields, capacity).to_dict()
+
+
+def summarize_parallel(paths, processes=None, fields=None, capacity=DEFAULT_CAPACITY):
+    """
+    Returns the :class:`FleetSummary` of the result files ``paths``, each
+    summarized by one of a pool of ``processes`` workers (all CPUs when
+    ``None``) and merged as the partial summaries arrive.
+    """
+    summary = FleetSummary(fields, capacity)
+    pool = multiprocessing.Pool(processes)
+    try:
+        tasks = [(path, fields, capacity) for path in paths]
+        for partial in pool.imap_unordered(_summarize_file, tasks):
+            summary.merge(FleetSummary.from_dict(partial))
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return summary
+
+
+def collect_and_count(records, fields=None):
+    """
+    Keeps the response of every host and counts the values of their
+    fields afterwards, as :class:`FleetSummary` but exactly and with
+    memory growing with the number of hosts.  Returns
+    ``{(rule name, response type, field): Counter}``.
+    """
+    fields = DEFAULT_FIELDS if fields is None else fields
+    responses = []
+    for record in records:
+        for name, response in record["results"].items():
+            if response:
+                responses.append((name, response))
+    counts = {}
+    for name, response in responses:
+        for field in fields.get(name, ()):
+            value = response.get(field)
+            if isinstance(value, dict):
+                counts.setdefault((name, response["type"], field), Counter()).update(value.keys())
+                for key, item in value.items():
+                    counts.setdefault((name, response["type"], "%s.%s" % (field, key)), Counter())[item] += 1
+            elif field in response:
+                counts.setdefault((name, response["type"], field), Counter())[_value(value)] += 1
+    return counts
+
+
+def benchmark(hosts):
+    """
+    Summarizes ``hosts`` synthetic hosts with :func:`collect_and_count`
+    and with :class:`FleetSummary`, the records being generated one at a
+    time, once timed and once tracing memory.
+
+    Returns:
+        dict: The ``seconds``, generation of the records included, and
+        ``peak`` traced memory in bytes of each, keyed by ``"collect"``
+        and ``"streaming"``.
+    """
+    def streaming(records):
+        summary = FleetSummary()
+        for record in records:
+            summary.add(record)
+        return summary
+
+    stats = {}
+    for key, func in [("collect", collect_and_count), ("streaming", streaming)]:
+        start = time.time()
+        func(generators.iter_results(hosts))
+        seconds = time.time() - start
+        tracemalloc.start()
+        func(generators.iter_results(hosts))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stats[key] = {"seconds": seconds, "peak": peak}
+    return stats
+
+
+def format_benchmark(stats):
+    lines = []
+    for key, label in [("collect", "collect and count"), ("streaming", "streaming summary")]:
+        lines.append("{0:<18} {1:>6.2f}s  peak {2:>6.2f}MiB".format(
+            label, stats[key]["seconds"], stats[key]["peak"] / 2.0 ** 20))
+    return "\n".join(lines)
+
+
+def format_summary(summary, n=5):
+    lines = ["{0} hosts ({1} failed)".format(summary.hosts, summary.failed)]
+    for name, types in sorted(summary.rules.items()):
+        counts = ", ".join("{0} {1}".format(_LABELS.get(t, t), group["count"]) for t, group in sorted(types.items()))
+        lines.append("{0}: {1}".format(name, counts))
+        for response_type, group in sorted(types.items()):
+            for field, values in sorted(group["fields"].items()):
+                top = []
+                for value, count, error in values.top(n):
+                    top.append("{0} {1}{2}".format(value, count, " (+/-{0})".format(error) if error else ""))
+                lines.append("  {0} {1}: {2}".format(_LABELS.get(response_type, response_type), field, ", ".join(top)))
+    return "\n".join(lines)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Summarize rule results over a fleet.")
+    sub = p.add_subparsers(dest="command")
+    summ = sub.add_parser("summarize", help="Summarize result files.")
+    summ.add_argument("results", nargs="+", help="JSON-lines or binary result files.")
+    summ.add_argument("-j", "--processes", type=int, default=1, help="Worker processes, one file each at a time.")
+    summ.add_argument("-o", "--output", help="Write the summary as JSON to this file, to merge it later.")
+    summ.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="Distinct values counted per field.")
+    summ.add_argument("-n", "--top", type=int, default=5, help="Values shown per field.")
+    merge = sub.add_parser("merge", help="Merge summaries written with summarize -o.")
+    merge.add_argument("summaries", nargs="+", help="JSON summary files.")
+    merge.add_argument("-o", "--output", help="Write the merged summary as JSON to this file.")
+    merge.add_argument("-n", "--top", type=int, default=5, help="Values shown per field.")
+    bench = sub.add_parser("benchmark", help="Compare with collecting every response in memory.")
+    bench.add_argument("--hosts", type=int, default=100000, help="Number of synthetic hosts.")
+    args = p.parse_args()
+
+    if args.command == "summarize":
+        if args.processes > 1:
+            summary = summarize_parallel(args.results, args.processes, capacity=args.capacity)
+        else:
+            summary = summarize(args.results, capacity=args.capacity)
+    elif args.command == "merge":
+        summary = None
+        for path in args.summaries:
+            with open(path) as f:
+                partial = FleetSummary.from_dict(json.load(f))
+            if summary is None:
+                summary = partial
+            else:
+                summary.merge(partial)
+    elif args.command == "benchmark":
+        print(format_benchmark(benchmark(args.hosts)))
+        return
+    else:
+        p.print_help()
+        return
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary.to_dict(), f, sort_keys=True)
+    print(format_summary(summary, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Synthetic spec content
+======================
+
+Generators of realistic looking spec content of any size, used by the
+benchmarks and tools to exercise the example components without real
+archives.  Output is deterministic for a given size and seed.
+"""
+import random
+
+SSHD_KEYWORDS = [
+    "AllowUsers", "AuthenticationMethods", "Ciphers", "ClientAliveInterval",
+    "HostKey", "ListenAddress", "LogLevel", "MACs", "PermitRootLogin",
+    "Port", "Protocol", "Subsystem",
+]
+
+HOSTNAME = "host1.example.com"
+UNAME = "Linux host1.example.com 3.10.0-693.21.1.el7.x86_64 #1 SMP Fri Feb 23 18:54:16 UTC 2018 x86_64 x86_64 x86_64 GNU/Linux"
+REDHAT_RELEASE = "Red Hat Enterprise Linux Server release 7.4 (Maipo)"
+
+_PACKAGE_WORDS = [
+    "lib", "python", "perl", "glib", "xorg", "devel", "utils", "common",
+    "tools", "core", "data", "x11", "gnome", "kde", "plugin", "server",
+]
+_ARCHES = ["x86_64", "noarch", "i686"]
+
+
+def sshd_config(lines, seed=0):
+    """
+    Returns a list of ``lines`` ``sshd_config`` lines: directives cycling
+    through common keywords with roughly one comment or blank line in ten.
+    The last lines set the directives checked by ``sshd_secure``.
+    """
+    rng = random.Random(seed)
+    content = []
+    for i in range(lines):
+        roll = rng.random()
+        if roll < 0.05:
+            content.append("# comment line %d" % i)
+        elif roll < 0.1:
+            content.append("")
+        else:
+            content.append("%s value%d" % (SSHD_KEYWORDS[i % len(SSHD_KEYWORDS)], i))
+    tail = ["AuthenticationMethods publickey", "LogLevel VERBOSE", "PermitRootLogin no"]
+    return content[:max(lines - len(tail), 0)] + tail[:lines]
+
+
+def installed_rpms(packages, seed=0):
+    """
+    Returns a list of ``packages`` installed package lines in
+    ``name-version-release.arch`` form.  ``bash`` and ``openssh`` are
+    always among them.
+    """
+    rng = random.Random(seed)
+    content = ["bash-4.4.23-1.el7.x86_64", "openssh-7.4p1-16.el7.x86_64"][:packages]
+    while len(content) < packages:
+        name = "-".join(rng.choice(_PACKAGE_WORDS) for _ in range(rng.randint(1, 3))) + str(len(content))
+        version = ".".join(str(rng.randint(0, 20)) for _ in range(rng.randint(1, 3)))
+        release = "%d.el7" % rng.randint(1, 50)
+        content.append("%s-%s-%s.%s" % (name, version, release, rng.choice(_ARCHES)))
+    return content
+
+
+def results(hosts, seed=0):
+    """
+    Returns a list of ``hosts`` result records, as written by
+    :mod:`insights_examples.tools.batch`, for the example rules.  About one
+    host in three has an insecure ``sshd_config``, one in ten a vulnerable
+    ``bash`` and one in five runs Fedora.
+    """
+    return list(iter_results(hosts, seed))
+
+
+def iter_results(hosts, seed=0):
+    """Yields the records of :func:`results` one at a time."""
+    rng = random.Random(seed)
+    for i in range(hosts):
+        hostname = "host%d.example.com" % i
+        responses = {}
+        errors = {}
+        if rng.random() < 0.3:
+            for keyword, value in [("AuthenticationMethods", "password"), ("LogLevel", "INFO"),
+                                   ("PermitRootLogin", "yes"), ("Protocol", "1")]:
+                if rng.random() < 0.5:
+                    errors[keyword] = value
+        openssh = "openssh-%s" % rng.choice(["6.6.1p1-31.el7", "7.4p1-16.el7", "7.4p1-21.el7"])
+        responses["insights_examples.rules.sshd_secure.report"] = (
+            {"type": "rule", "error_key": "SSHD_SECURE", "errors": errors, "openssh": openssh} if errors else None)
+        if rng.random() < 0.1:
+            responses["insights_examples.rules.bash_bug.check_bash_bug"] = {
+                "type": "rule", "error_key": "BASH_BUG", "bash": "bash-4.4.14-1.el7", "found": "Bash bug found! Version: "}
+        else:
+            responses["insights_examples.rules.bash_bug.check_bash_bug"] = {
+                "type": "pass", "pass_key": "BASH_BUG", "bash": "bash-4.4.23-1.el7", "found": "Bash bug not found: "}
+        fedora = rng.random() < 0.2
+        responses["insights_examples.rules.is_fedora.report"] = {
+            "type": "pass" if fedora else "rule", "pass_key" if fedora else "error_key": "IS_FEDORA",
+            "hostname": hostname, "product": "Fedora" if fedora else "Red Hat Enterprise Linux Server"}
+        yield {
+            "archive": "/data/archives/%s.tar.gz" % hostname,
+            "elapsed": round(rng.uniform(0.005, 0.05), 6),
+            "results": responses,
+            "errors": {},
+        }
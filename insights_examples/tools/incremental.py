@@ -0,0 +1,222 @@
+"""
+Incremental re-evaluation
+=========================
+
+Hosts scanned every day rarely change much: usually a few specs differ
+from the previous run, say ``installed_rpms``, while ``sshd_config`` and
+``redhat_release`` stay the same.  :class:`IncrementalEvaluator` keeps, per
+host, a fingerprint of the (filtered) content of every spec the rules read
+and the result of every rule.  On the next run the specs are fingerprinted
+again and only the rules with at least one changed spec in their
+dependency graph are evaluated, so only their parsers and combiners run::
+
+    is_fedora.report     <- RedhatRelease <- redhat_release
+                         <- HostnameUH    <- Hostname <- hostname, uname
+    sshd_secure.report   <- TargetedRpms  <- installed_rpms
+                         <- SSHDConfig    <- sshd_config
+    bash_bug.check_bash_bug <- TargetedRpms <- installed_rpms
+
+With only ``installed_rpms`` changed, ``sshd_secure`` and ``bash_bug`` are
+re-run and ``is_fedora`` reuses its stored result without parsing
+anything.  A rule is also re-run when the components of its dependency
+graph are not the ones it was last evaluated with, or when their code or
+data changed: the signature of a graph covers the source of the module of
+every component and the data files these modules list in ``DATA_FILES``,
+such as the advisories read by ``bash_bug``, see :func:`code_version`.
+
+The state is a JSON-serializable dict, stored between runs with
+:func:`save_state`::
+
+    $ python -m insights_examples.tools.incremental /data/archives -s state.json -o results.jsonl
+    3 archives, 9 rule evaluations: 2 re-run, 7 reused
+
+Hosts are identified by the name of their archive without its extension,
+so the archive of each host must keep its name from one run to the next.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from insights.core import dr
+from insights.core.archives import extract
+from insights.core.hydration import initialize_broker
+from insights.core.spec_factory import RegistryPoint
+from insights_examples.cache import content_hash
+from insights_examples.tools import batch
+
+
+def host_id(path):
+    """str: Returns the host id of the archive at ``path``, its name without extension."""
+    return batch.archive_name(path)
+
+
+def _file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return content_hash([f.read().decode("utf-8", "surrogateescape")])
+    except (IOError, OSError):
+        return None
+
+
+def code_version(components):
+    """
+    str: Returns a hash of the source of the modules defining
+    ``components`` and of the data files they list in a module level
+    ``DATA_FILES``, so results computed by other code or data are not
+    reused.
+    """
+    parts = []
+    for name in sorted(set(dr.get_module_name(c) for c in components)):
+        module = sys.modules.get(name)
+        source = getattr(module, "__file__", None)
+        parts.append("%s %s" % (name, _file_hash(source) if source else None))
+        for path in sorted(getattr(module, "DATA_FILES", ())):
+            parts.append("%s %s" % (path, _file_hash(path)))
+    return content_hash(parts)
+
+
+def fingerprint(value):
+    """
+    Returns a hash of the content of a spec, one provider or a list of
+    them, or ``None`` when the content cannot be read.
+    """
+    try:
+        if isinstance(value, list):
+            return content_hash([content_hash(p.content) for p in value])
+        return content_hash(value.content)
+    except Exception:
+        return None
+
+
+def load_state(path):
+    """dict: Returns the state stored at ``path``, empty when the file does not exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path):
+    """Writes ``state`` to ``path``, replacing it atomically."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, default=str, sort_keys=True)
+    os.rename(tmp, path)
+
+
+class IncrementalEvaluator(object):
+    """
+    Evaluates the named rules against archives, reusing the stored results
+    of the rules whose specs did not change since the host was last seen.
+
+    Attributes:
+        state (dict): Per host id, the ``specs`` fingerprints keyed by spec
+            name and the ``rules`` entries keyed by rule name, each with
+            the ``graph`` signature and ``result`` of its last evaluation.
+        rerun (int): Rule evaluations done since creation.
+        reused (int): Rule results reused since creation.
+    """
+
+    def __init__(self, rule_names=batch.DEFAULT_RULES, state=None):
+        self.rules, self.graph = batch.load_rules(rule_names)
+        self.state = {} if state is None else state
+        self.rerun = self.reused = 0
+        self.specs = sorted((c for c in self.graph if isinstance(c, RegistryPoint)), key=dr.get_name)
+        self._spec_graph = {}
+        for spec in self.specs:
+            self._spec_graph.update(dr.get_dependency_graph(spec))
+        # rule -> (names of the specs it reads, signature of its graph and
+        # of the code and data of its components)
+        self._inputs = {}
+        for rule in self.rules:
+            graph = dr.get_dependency_graph(rule)
+            specs = [dr.get_name(s) for s in self.specs if s in graph]
+            signature = content_hash(sorted(dr.get_name(c) for c in graph) + [code_version(graph)])
+            self._inputs[rule] = (specs, signature)
+
+    def _dirty(self, rule, host, fingerprints):
+        specs, signature = self._inputs[rule]
+        stored = host["rules"].get(dr.get_name(rule))
+        if stored is None or stored["graph"] != signature:
+            return True
+        return any(host["specs"].get(name) != fingerprints[name] for name in specs)
+
+    def evaluate_dir(self, root, host_id):
+        """
+        Evaluates the rules against the extracted archive at ``root`` for
+        the host ``host_id`` and updates its state.
+
+        Returns:
+            tuple: The result of every rule keyed by name, the names of the
+            rules re-run and the formatted errors of the components run.
+        """
+        ctx, broker = initialize_broker(root)
+        broker = dr.run(self._spec_graph, broker=broker)
+        fingerprints = dict((dr.get_name(s), fingerprint(broker[s]) if s in broker else None) for s in self.specs)
+
+        host = self.state.setdefault(host_id, {"specs": {}, "rules": {}})
+        dirty = [r for r in self.rules if self._dirty(r, host, fingerprints)]
+        graph = {}
+        for rule in dirty:
+            graph.update(dr.get_dependency_graph(rule))
+        if graph:
+            broker = dr.run(graph, broker=broker)
+
+        for rule in dirty:
+            host["rules"][dr.get_name(rule)] = {"graph": self._inputs[rule][1], "result": broker.get(rule)}
+        host["specs"] = fingerprints
+        self.rerun += len(dirty)
+        self.reused += len(self.rules) - len(dirty)
+
+        errors = batch.format_errors(broker)
+        results = dict((dr.get_name(r), host["rules"][dr.get_name(r)]["result"]) for r in self.rules)
+        return results, [dr.get_name(r) for r in dirty], errors
+
+    def evaluate(self, path, host=None):
+        """
+        Evaluates the archive or extracted archive directory at ``path``
+        and returns a result record as written by
+        :mod:`insights_examples.tools.batch`, with the names of the rules
+        re-run under ``"rerun"``.  ``host`` defaults to :func:`host_id`.
+        """
+        host = host or host_id(path)
+        start = time.time()
+        if os.path.isdir(path):
+            results, rerun, errors = self.evaluate_dir(path, host)
+        else:
+            with extract(path) as ex:
+                results, rerun, errors = self.evaluate_dir(ex.tmp_dir, host)
+        return {
+            "archive": path,
+            "elapsed": round(time.time() - start, 6),
+            "results": results,
+            "errors": errors,
+            "rerun": rerun,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Evaluate the example rules, re-running only those whose specs changed.")
+    p.add_argument("source", help="Directory of archives or manifest file listing archive paths.")
+    p.add_argument("-s", "--state", default="incremental.json", help="File storing fingerprints and results between runs.")
+    p.add_argument("-o", "--output", default="results.jsonl", help="JSON-lines file to write results to.")
+    p.add_argument("-r", "--rule", action="append", dest="rules",
+                   help="Fully qualified rule to evaluate, may be repeated.  Defaults to the example rules.")
+    args = p.parse_args()
+
+    evaluator = IncrementalEvaluator(tuple(args.rules or batch.DEFAULT_RULES), load_state(args.state))
+    archives = batch.find_archives(args.source)
+    with open(args.output, "w") as output:
+        for path in archives:
+            output.write(json.dumps(evaluator.evaluate(path), default=str, sort_keys=True) + "\n")
+    save_state(evaluator.state, args.state)
+    print("{0} archives, {1} rule evaluations: {2} re-run, {3} reused".format(
+        len(archives), evaluator.rerun + evaluator.reused, evaluator.rerun, evaluator.reused))
+
+
+if __name__ == "__main__":
+    main()
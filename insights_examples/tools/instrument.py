@@ -0,0 +1,207 @@
+"""
+Per-component timing instrumentation
+====================================
+
+:class:`ComponentTimer` is an opt-in broker observer that records, for
+every component evaluated by ``dr.run``, the wall time, the CPU time and
+the memory it allocated.  Components run one after the other and the
+observer fires as each one finishes, so the cost of a component is the
+difference between two consecutive observations.
+
+Spec content is read lazily by insights, normally while the first parser
+using it runs.  With ``preload_specs`` (the default) the timer reads the
+content of each datasource as soon as the datasource finishes so that
+reading the spec is charged to the spec and not to its parser.  Specs a
+combiner or rule depends on directly are left alone: those read the
+content on demand, like the ``uname`` fallback of
+:class:`insights_examples.combiners.hostname_uh.HostnameUH`, and
+preloading it would do the work they avoid.
+
+Memory is tracked with :mod:`tracemalloc` when ``memory`` is set.  This
+slows evaluation down noticeably, leave it off when only times matter.
+
+Examples:
+    >>> timer = ComponentTimer()
+    >>> broker = timer.run(sshd_secure.report, broker)
+    >>> sorted(timer.timings)[:2]
+    ['insights.specs.Specs.installed_rpms', 'insights.specs.Specs.sshd_config']
+    >>> sorted(timer.timings['insights_examples.parsers.secure_shell.SSHDConfig'])
+    ['allocated', 'cpu', 'peak', 'type', 'wall']
+
+The timer can also be run stand-alone against an archive::
+
+    $ python -m insights_examples.tools.instrument /data/host1.tar.gz
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from insights.core import dr
+from insights.core.plugins import datasource, parser
+
+
+def _read_on_demand(component):
+    # Specs consumed by components other than parsers and datasources
+    for point in dr.get_registry_points(component):
+        for dependent in dr.get_dependents(point):
+            if dr.get_component_type(dependent) not in (parser, datasource):
+                return True
+    return False
+
+
+def _preload(value):
+    for provider in value if isinstance(value, list) else [value]:
+        try:
+            provider.content
+        except Exception:
+            pass
+
+
+class ComponentTimer(object):
+    """
+    Records ``{"type", "wall", "cpu", "allocated", "peak"}`` for each
+    evaluated component in ``timings``, keyed by component name.  Times
+    are in seconds; ``allocated`` is the memory still allocated when the
+    component finished and ``peak`` the highest memory reached while it
+    ran, both in bytes relative to when it started and ``None`` unless
+    ``memory`` is set.
+    """
+
+    def __init__(self, memory=False, preload_specs=True):
+        self.memory = memory
+        self.preload_specs = preload_specs
+        self.timings = {}
+        self._mark = None
+        self._started_tracemalloc = False
+
+    def attach(self, broker):
+        """Registers the timer as an observer of ``broker``."""
+        broker.add_observer(self._observe)
+        return broker
+
+    def start(self):
+        """Starts the clocks, call right before evaluation begins."""
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._mark = self._now()
+
+    def stop(self):
+        """Stops memory tracing if the timer started it."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def run(self, graph, broker=None):
+        """Evaluates ``graph`` with ``dr.run`` while recording timings."""
+        broker = self.attach(broker or dr.Broker())
+        self.start()
+        try:
+            return dr.run(graph, broker=broker)
+        finally:
+            self.stop()
+
+    def _now(self):
+        if self.memory and tracemalloc.is_tracing():
+            current = tracemalloc.get_traced_memory()[0]
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        else:
+            current = None
+        return time.time(), time.process_time(), current
+
+    def _observe(self, component, broker):
+        if self._mark is None:
+            return
+        _type = dr.get_component_type(component)
+        if self.preload_specs and _type is datasource and component in broker and not _read_on_demand(component):
+            _preload(broker[component])
+        wall, cpu, current = self._mark
+        peak = None
+        if current is not None and tracemalloc.is_tracing():
+            now_current, now_peak = tracemalloc.get_traced_memory()
+            allocated, peak = now_current - current, now_peak - current
+        else:
+            allocated = None
+        self.timings[dr.get_name(component)] = {
+            "type": _type.__name__ if _type else None,
+            "wall": time.time() - wall,
+            "cpu": time.process_time() - cpu,
+            "allocated": allocated,
+            "peak": peak,
+        }
+        self._mark = self._now()
+
+
+class TimingAggregator(object):
+    """
+    Accumulates the timings of many runs to find the slowest components of
+    a batch.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.components = {}
+
+    def add(self, timings):
+        """Adds the ``timings`` of one run."""
+        self.runs += 1
+        for name, timing in timings.items():
+            total = self.components.setdefault(name, {
+                "type": timing["type"], "count": 0, "wall": 0.0, "cpu": 0.0, "max_wall": 0.0, "peak": None,
+            })
+            total["count"] += 1
+            total["wall"] += timing["wall"]
+            total["cpu"] += timing["cpu"]
+            total["max_wall"] = max(total["max_wall"], timing["wall"])
+            if timing.get("peak") is not None:
+                total["peak"] = max(total["peak"] or 0, timing["peak"])
+
+    def top(self, n=10, key="wall"):
+        """
+        list: Returns the ``n`` components with the highest total ``key``
+        (``wall``, ``cpu`` or ``max_wall``) as ``(name, totals)`` tuples,
+        ``totals`` including the ``mean_wall`` time per run.
+        """
+        ranked = sorted(self.components.items(), key=lambda item: item[1][key], reverse=True)[:n]
+        result = []
+        for name, totals in ranked:
+            totals = dict(totals, mean_wall=totals["wall"] / totals["count"])
+            result.append((name, totals))
+        return result
+
+
+def format_top(top):
+    lines = ["{0:<70} {1:>10} {2:>10} {3:>10} {4:>7}".format("component", "wall (s)", "cpu (s)", "mean (ms)", "runs")]
+    for name, totals in top:
+        lines.append("{0:<70} {1:>10.4f} {2:>10.4f} {3:>10.3f} {4:>7}".format(
+            name, totals["wall"], totals["cpu"], totals["mean_wall"] * 1000, totals["count"]))
+    return "\n".join(lines)
+
+
+def main():
+    from insights_examples.tools import batch
+
+    p = argparse.ArgumentParser(description="Time every component the example rules depend on for one archive.")
+    p.add_argument("archive", help="Archive or extracted archive directory.")
+    p.add_argument("-n", "--top", type=int, default=20, help="Number of components to show.")
+    p.add_argument("-m", "--memory", action="store_true", help="Also trace memory allocations.")
+    p.add_argument("-o", "--output", help="Write the timings as JSON to this file.")
+    args = p.parse_args()
+
+    rules, graph = batch.load_rules()
+    timer = ComponentTimer(memory=args.memory)
+    record = batch.evaluate(args.archive, rules, graph, timer=timer)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"archive": args.archive, "timings": record["timings"]}, f, indent=2, sort_keys=True)
+    aggregator = TimingAggregator()
+    aggregator.add(record["timings"])
+    print(format_top(aggregator.top(args.top)))
+
+
+if __name__ == "__main__":
+    main()
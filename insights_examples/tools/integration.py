@@ -0,0 +1,190 @@
+"""
+Parallel integration tests
+==========================
+
+``insights_examples/tests/integration.py`` hands every ``archive_provider``
+case to pytest, which runs them one after the other.  This runner spreads
+the same cases over a pool of worker processes instead.  Every worker is
+a fresh interpreter that imports :mod:`insights.tests` before it loads the
+components, so the filters the rules add are recorded as under pytest
+whatever the parent process imported before.  It generates the cases a
+single time, then runs the cases it is handed by index with the
+``test_integration`` function pytest uses, so a case passes or fails
+exactly as it does under pytest.
+
+Results come back in case order whatever the number of workers, one line
+per case with its time::
+
+    $ python -m insights_examples.tools.integration -j 2
+    PASS      0.001s insights_examples.tests.rules.test_bash_bug.integration_test#no_bash_bug-00000
+    ...
+    PASS      0.000s insights_examples.tests.rules.test_sshd_secure.integration_tests#DEFAULT_CONFIG-00000
+    10 cases, 0 failed in 1.53s with 2 processes (0.01s spent in cases)
+
+``-o FILE`` also writes one JSON object per case::
+
+    {"elapsed": 0.001, "error": null, "index": 0, "passed": true,
+     "id": "insights_examples.tests.rules.test_bash_bug.integration_test#no_bash_bug-00000"}
+
+``--runslow`` runs every case instead of every ``stride``-th one and
+``--smokey`` only the first case of each provider, as with pytest.  ``-k``
+selects the cases whose id contains a string.  The exit status is 1 when
+any case failed.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+import traceback
+
+from contextlib import contextmanager
+from itertools import islice
+
+from insights import tests
+from insights.core.dr import get_name, load_components
+from insights.tests.integration import test_integration
+
+PACKAGES = ("insights_examples/tests",)
+"""tuple: Packages loaded for their ``archive_provider`` functions by default."""
+
+_worker = {}
+
+
+@contextmanager
+def _input_data_names():
+    # InputData numbers its names in the module level dict of insights.tests,
+    # number the generated cases in a dict of their own and leave the one of
+    # a running pytest session as it was
+    session = tests.input_data_cache
+    tests.input_data_cache = {}
+    try:
+        yield
+    finally:
+        tests.input_data_cache = session
+
+
+def generate_cases(packages=PACKAGES, slow=False, smokey=False):
+    """
+    Loads ``packages`` and returns every ``archive_provider`` case in the
+    order pytest generates them, as ``(id, (component, compare_func,
+    input_data, expected))`` tuples.  The ``InputData`` names, and so the
+    ids, are numbered as in a fresh pytest session every time, and the
+    numbering of the running session, if any, is left as it was.
+    """
+    for package in packages:
+        load_components(package, include=".*", exclude=None)
+    cases = []
+    with _input_data_names():
+        for f in tests.ARCHIVE_GENERATORS:
+            generated = f(stride=1 if slow else f.stride)
+            if smokey:
+                generated = islice(generated, 0, 1)
+            for case in generated:
+                name = case[2].name if not isinstance(case[2], list) else "multi-node"
+                cases.append(("#".join([get_name(f), name]), case))
+    return cases
+
+
+def run_case(index, cases):
+    """
+    dict: Runs case ``index`` of ``cases`` and returns its ``index``,
+    ``id``, whether it ``passed``, its ``elapsed`` time and the formatted
+    ``error`` when it failed.
+    """
+    case_id, args = cases[index]
+    start = time.time()
+    try:
+        test_integration(*args)
+    except Exception:
+        error = traceback.format_exc()
+    else:
+        error = None
+    return {
+        "index": index,
+        "id": case_id,
+        "passed": error is None,
+        "elapsed": round(time.time() - start, 6),
+        "error": error,
+    }
+
+
+def _init_worker(packages, slow, smokey):
+    _worker["cases"] = generate_cases(packages, slow, smokey)
+
+
+def _run_in_worker(index):
+    return run_case(index, _worker["cases"])
+
+
+def run(packages=PACKAGES, processes=None, pattern=None, slow=False, smokey=False, chunksize=1):
+    """
+    Runs the cases of ``packages`` whose id contains ``pattern`` over
+    ``processes`` workers (all CPUs when ``None``).
+
+    Returns:
+        tuple: The list of case results of :func:`run_case` in case order
+        and a dict of statistics with the keys ``cases``, ``failed``,
+        ``processes``, ``seconds`` and ``case_seconds``, the time spent in
+        the cases themselves.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    cases = generate_cases(packages, slow, smokey)
+    indexes = [i for i, (case_id, args) in enumerate(cases) if pattern is None or pattern in case_id]
+    start = time.time()
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(processes, initializer=_init_worker, initargs=(packages, slow, smokey))
+    try:
+        results = list(pool.imap(_run_in_worker, indexes, chunksize))
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    stats = {
+        "cases": len(results),
+        "failed": sum(not r["passed"] for r in results),
+        "processes": processes,
+        "seconds": time.time() - start,
+        "case_seconds": sum(r["elapsed"] for r in results),
+    }
+    return results, stats
+
+
+def format_result(result):
+    return "{0:<6} {1:>8.3f}s {2}".format("PASS" if result["passed"] else "FAIL", result["elapsed"], result["id"])
+
+
+def format_stats(stats):
+    return "{cases} cases, {failed} failed in {seconds:.2f}s with {processes} processes ({case_seconds:.2f}s spent in cases)".format(**stats)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Run the archive_provider integration tests over worker processes.")
+    p.add_argument("packages", nargs="*", default=list(PACKAGES), help="Packages holding the tests.")
+    p.add_argument("-j", "--processes", type=int, default=None, help="Number of worker processes, all CPUs by default.")
+    p.add_argument("-k", dest="pattern", help="Only run cases whose id contains this string.")
+    p.add_argument("-o", "--output", help="Write one JSON line per case to this file.")
+    p.add_argument("--runslow", action="store_true", help="Run every case of each provider.")
+    p.add_argument("--smokey", action="store_true", help="Run the first case of each provider only.")
+    args = p.parse_args()
+
+    results, stats = run(args.packages, args.processes, args.pattern, args.runslow, args.smokey)
+    for result in results:
+        print(format_result(result))
+        if result["error"]:
+            print(result["error"])
+    if args.output:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result, sort_keys=True) + "\n")
+    print(format_stats(stats))
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
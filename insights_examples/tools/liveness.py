@@ -0,0 +1,244 @@
+"""
+Liveness-based eviction of components
+=====================================
+
+``dr.run`` keeps the instance of every component in the broker until the
+whole graph has been evaluated, so every parsed spec of an archive is
+alive at the end of its evaluation, long after the rules reading it have
+run.  :func:`run` evaluates the graph rule by rule instead, each rule
+right after the components it needs that have not run yet (see
+:func:`evaluation_order`), and an :class:`Evictor` removes each component
+from the broker as soon as the last component depending on it has run.
+Only the rules, and what was in the broker before evaluation, are left
+at the end, so results and errors are read from the broker as usual.
+
+The batch runner evaluates archives this way with ``--evict``::
+
+    $ python -m insights_examples.tools.batch /data/archives --evict
+
+``python -m insights_examples.tools.liveness`` measures the peak memory
+of evaluating a large rule set both ways: ``--rules`` synthetic rules,
+each reading the ``SSHDConfig`` of its own ``--lines`` line spec and of
+the spec of the next rule, all parsed from files::
+
+    $ python -m insights_examples.tools.liveness --rules 50 --lines 10000
+    50 rules, 50 specs of 10000 lines
+    all kept        130.09MiB peak
+    evicted           8.66MiB peak (6.7% of all kept)
+
+The peak drops from every parsed spec to the few a rule and its
+neighbour need at once.  ``--archive`` measures the example rules on an
+extracted archive instead.  With only three rules, and ``sshd_config``
+and the package list filtered by insights before parsing, the gain is
+small even for 20000 packages and a 20000 line ``sshd_config``::
+
+    $ python -m insights_examples.tools.liveness --archive /data/host1
+    all kept          2.54MiB peak
+    evicted           2.33MiB peak (91.6% of all kept)
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import tracemalloc
+
+from insights.core import dr
+from insights.core.hydration import initialize_broker
+from insights.core.plugins import make_pass, parser, rule
+from insights.core.spec_factory import RegistryPoint, SpecSet
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.tools import generators
+
+# Synthetic rules and their specs, registered once per rule count
+_synthetic = {}
+
+
+def consumers(graph):
+    """dict: Returns the set of components of ``graph`` depending on each component."""
+    result = dict((component, set()) for component in graph)
+    for component, dependencies in graph.items():
+        for dependency in dependencies:
+            result.setdefault(dependency, set()).add(component)
+    return result
+
+
+def evaluation_order(graph, rules):
+    """
+    list: Returns the components of ``graph`` in dependency order,
+    evaluating the ``rules`` one after the other, each right after the
+    components it needs that have not run yet, so that few components are
+    waiting for a consumer at any time.
+    """
+    order = []
+    seen = set()
+
+    def visit(component):
+        if component in seen:
+            return
+        seen.add(component)
+        for dependency in sorted(graph.get(component, ()), key=dr.get_name):
+            visit(dependency)
+        order.append(component)
+
+    for component in list(rules) + dr.run_order(graph):
+        visit(component)
+    return order
+
+
+class Evictor(object):
+    """
+    Broker observer deleting each component of ``graph`` from the broker
+    once every component of ``graph`` depending on it has run.
+
+    Attributes:
+        keep (set): Components never deleted: ``keep`` and every component
+            already in the broker when attached.
+        evicted (list): The components deleted, in order.
+    """
+
+    def __init__(self, graph, keep=()):
+        self.graph = graph
+        self.keep = set(keep)
+        self.evicted = []
+        self._pending = dict((c, len(users)) for c, users in consumers(graph).items())
+
+    def attach(self, broker):
+        """Registers the evictor as an observer of ``broker``."""
+        self.keep.update(broker.instances)
+        broker.add_observer(self._observe)
+        return broker
+
+    def _observe(self, component, broker):
+        # Called after every component, whether it ran, failed or was
+        # skipped, so dependencies are released exactly once per consumer
+        for dependency in self.graph.get(component, ()):
+            self._pending[dependency] -= 1
+            if not self._pending[dependency] and dependency not in self.keep and dependency in broker:
+                del broker[dependency]
+                self.evicted.append(dependency)
+
+
+def run(graph, rules, broker=None, evictor=None):
+    """
+    Evaluates ``graph`` like ``dr.run``, in :func:`evaluation_order`,
+    deleting every component but the ``rules`` from the broker after its
+    last consumer, and returns the broker.  ``evictor`` is a new
+    :class:`Evictor` by default.
+    """
+    broker = broker or dr.Broker()
+    (evictor or Evictor(graph, keep=rules)).attach(broker)
+    return dr.run_components(evaluation_order(graph, rules), graph, broker)
+
+
+def synthetic_rules(count):
+    """
+    Returns ``(specs, rules)``, ``count`` specs and ``count`` rules, rule
+    ``i`` reading the ``SSHDConfig`` parsers of specs ``i`` and ``i + 1``.
+    The components are registered the first time a count is asked for.
+    """
+    if count not in _synthetic:
+        attrs = dict(("config%d" % i, RegistryPoint()) for i in range(count))
+        attrs["__module__"] = __name__
+        spec_set = type("SyntheticSpecs%d" % count, (SpecSet,), attrs)
+        specs = [getattr(spec_set, "config%d" % i) for i in range(count)]
+        parsers = []
+        for i, spec in enumerate(specs):
+            cls = type("SyntheticConfig%d_%d" % (count, i), (SSHDConfig,), {"__module__": __name__})
+            parsers.append(parser(spec)(cls))
+        rules = []
+        for i in range(count):
+            def check(*configs):
+                return make_pass("SYNTHETIC", logging=[c.last("LogLevel") for c in configs])
+            check.__name__ = check.__qualname__ = "synthetic_rule%d_%d" % (count, i)
+            rules.append(rule(*set([parsers[i], parsers[(i + 1) % count]]))(check))
+        _synthetic[count] = (specs, rules)
+    return _synthetic[count]
+
+
+def peak_memory(graph, rules, make_broker, evict):
+    """
+    Returns the peak traced memory in bytes of evaluating ``graph`` on
+    the broker returned by ``make_broker``, with :func:`run` when
+    ``evict`` is set and ``dr.run`` otherwise.
+    """
+    broker = make_broker()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        if evict:
+            run(graph, rules, broker)
+        else:
+            dr.run(graph, broker=broker)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(graph, rules, make_broker):
+    """
+    dict: Returns the peak memory in bytes keyed by ``"kept"`` for
+    ``dr.run`` and ``"evicted"`` for :func:`run`.
+    """
+    return {
+        "kept": peak_memory(graph, rules, make_broker, False),
+        "evicted": peak_memory(graph, rules, make_broker, True),
+    }
+
+
+def compare_synthetic(count, lines):
+    """
+    dict: Returns the :func:`compare` peaks of :func:`synthetic_rules`
+    ``count`` with a ``lines`` line file per spec.
+    """
+    from insights_examples.tools.benchmark import _SpecFile
+
+    specs, rules = synthetic_rules(count)
+    files = dict((spec, _SpecFile(generators.sshd_config(lines, seed=i))) for i, spec in enumerate(specs))
+    graph = {}
+    for r in rules:
+        graph.update(dr.get_dependency_graph(r))
+
+    def make_broker():
+        broker = dr.Broker()
+        for spec, spec_file in files.items():
+            broker[spec] = spec_file
+        return broker
+
+    return compare(graph, rules, make_broker)
+
+
+def compare_archive(path):
+    """
+    dict: Returns the :func:`compare` peaks of the example rules on the
+    extracted archive at ``path``.
+    """
+    from insights_examples.tools import batch
+
+    rules, graph = batch.load_rules()
+    return compare(graph, rules, lambda: initialize_broker(path)[1])
+
+
+def format_comparison(peaks):
+    return "\n".join([
+        "all kept      {0:>8.2f}MiB peak".format(peaks["kept"] / 2.0 ** 20),
+        "evicted       {0:>8.2f}MiB peak ({1:.1%} of all kept)".format(
+            peaks["evicted"] / 2.0 ** 20, float(peaks["evicted"]) / peaks["kept"] if peaks["kept"] else 0.0),
+    ])
+
+
+def main():
+    p = argparse.ArgumentParser(description="Measure the peak memory saved by evicting components after their last consumer.")
+    p.add_argument("--rules", type=int, default=50, help="Number of synthetic rules.")
+    p.add_argument("--lines", type=int, default=10000, help="Lines of each synthetic spec.")
+    p.add_argument("--archive", help="Measure the example rules on this extracted archive instead.")
+    args = p.parse_args()
+
+    if args.archive:
+        print(format_comparison(compare_archive(args.archive)))
+    else:
+        print("{0} rules, {0} specs of {1} lines".format(args.rules, args.lines))
+        print(format_comparison(compare_synthetic(args.rules, args.lines)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Asyncio ingestion pipeline
+==========================
+
+:mod:`insights_examples.tools.batch` hands whole archives to its workers,
+each of which extracts an archive, reads its spec files and only then
+starts parsing, so the CPUs sit idle while archives are decompressed and
+read.  This pipeline splits the two kinds of work and overlaps them::
+
+    archives --> [paths queue] --> readers (threads) --> [ready queue] --> evaluators (processes)
+
+* Readers extract an archive and read the content of every spec the rules
+  need, already filtered as insights would filter it, in a thread pool.
+  This includes the multi-output specs, such as the ``sshd_config_d``
+  drop-in files named by ``Include`` directives, so the evaluators see
+  the same inputs as :mod:`insights_examples.tools.batch`.  Decompression
+  and file reads release the GIL so several run at once.
+* Evaluators are a process pool.  Each worker loads the rules once and
+  builds a broker straight from the spec contents it is sent, one context
+  per file of the multi-output specs, then runs the parsers
+  (``SSHDConfig``, ``TargetedRpms``, ...), combiners and rules.
+
+Both queues are bounded, which gives the backpressure: ``readers`` archives
+are extracted at most at once, at most ``read_ahead`` read archives wait
+in memory for an evaluator, and at most ``processes`` are being evaluated.
+When the evaluators fall behind the readers block on the full ready
+queue instead of filling memory.
+
+A local directory of archives stands in for the upload store::
+
+    $ python -m insights_examples.tools.pipeline /data/archives -o results.jsonl -j 4 --readers 8 --read-ahead 16
+
+The records written are the ones of :mod:`insights_examples.tools.batch`.
+The statistics printed at the end tell which stage limits the throughput:
+time the readers spent blocked on a full ready queue means evaluation is
+the bottleneck, time the evaluators spent waiting on an empty one means
+reading is.
+"""
+from __future__ import print_function
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+from insights.core import dr
+from insights.core.archives import extract
+from insights.core.context import Context
+from insights.core.hydration import initialize_broker
+from insights.core.spec_factory import RegistryPoint
+from insights_examples.tools import batch
+
+_worker = {}
+
+
+def spec_graph(graph):
+    """
+    Returns the registry points of ``graph`` and the dependency graph that
+    collects them from an archive.
+    """
+    specs = sorted((c for c in graph if isinstance(c, RegistryPoint)), key=dr.get_name)
+    collect = {}
+    for spec in specs:
+        collect.update(dr.get_dependency_graph(spec))
+    return specs, collect
+
+
+def _read_dir(root, specs, collect):
+    ctx, broker = initialize_broker(root)
+    broker = dr.run(collect, broker=broker)
+    contents = {}
+    for spec in specs:
+        if spec not in broker:
+            continue
+        value = broker[spec]
+        try:
+            if isinstance(value, list):
+                contents[dr.get_name(spec)] = [(p.relative_path, p.content) for p in value]
+            else:
+                contents[dr.get_name(spec)] = (value.relative_path, value.content)
+        except Exception:
+            pass
+    return contents
+
+
+def read_archive(path, specs, collect):
+    """
+    Extracts the archive at ``path``, or reads the extracted archive
+    directory, and returns a payload dict with the ``archive`` path, the
+    filtered ``contents`` of each spec keyed by spec name as ``(path,
+    lines)`` (a list of them for multi-output specs), the ``read`` time and
+    the ``error`` raised while reading, if any.
+    """
+    start = time.time()
+    payload = {"archive": path, "contents": {}, "error": None}
+    try:
+        if os.path.isdir(path):
+            payload["contents"] = _read_dir(path, specs, collect)
+        else:
+            with extract(path) as ex:
+                payload["contents"] = _read_dir(ex.tmp_dir, specs, collect)
+    except Exception:
+        payload["error"] = traceback.format_exc()
+    payload["read"] = time.time() - start
+    return payload
+
+
+def evaluate_payload(payload, rule_names=batch.DEFAULT_RULES):
+    """
+    Evaluates the rules against the spec contents of a payload of
+    :func:`read_archive` and returns the result record of
+    :func:`insights_examples.tools.batch.format_results`.  The rules are
+    loaded the first time a process evaluates a payload.
+    """
+    if _worker.get("rule_names") != rule_names:
+        _worker["rules"], _worker["graph"] = batch.load_rules(rule_names)
+        _worker["rule_names"] = rule_names
+    start = time.time()
+    if payload["error"]:
+        return {"archive": payload["archive"], "elapsed": 0.0, "results": {}, "errors": {"archive": payload["error"]}}
+    broker = dr.Broker()
+    for name, content in payload["contents"].items():
+        if isinstance(content, list):
+            broker[dr.get_component(name)] = [Context(content=lines, path=p) for p, lines in content]
+        else:
+            broker[dr.get_component(name)] = Context(content=content[1], path=content[0])
+    broker = dr.run(_worker["graph"], broker=broker)
+    return batch.format_results(payload["archive"], broker, _worker["rules"], time.time() - start)
+
+
+def _apply(loop, pool, func, *args):
+    # Future of func(*args) run in a multiprocessing pool
+    future = loop.create_future()
+
+    def done(value):
+        loop.call_soon_threadsafe(future.set_result, value)
+
+    def failed(exc):
+        loop.call_soon_threadsafe(future.set_exception, exc)
+
+    pool.apply_async(func, args, callback=done, error_callback=failed)
+    return future
+
+
+class Pipeline(object):
+    """
+    Reads and evaluates archives with ``readers`` reader threads and
+    ``processes`` evaluator processes (all CPUs when ``None``), holding at
+    most ``read_ahead`` read archives in memory.
+    """
+
+    def __init__(self, rule_names=batch.DEFAULT_RULES, processes=None, readers=4, read_ahead=8):
+        self.rule_names = tuple(rule_names)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.readers = readers
+        self.read_ahead = read_ahead
+        rules, graph = batch.load_rules(self.rule_names)
+        self.specs, self.collect = spec_graph(graph)
+
+    def run(self, archives, output):
+        """
+        Evaluates every path in ``archives`` and writes one JSON line per
+        archive to the open file ``output`` as results arrive.
+
+        Returns:
+            dict: Throughput statistics with the keys ``archives``,
+            ``failed``, ``processes``, ``readers``, ``read_ahead``,
+            ``seconds``, ``rate`` (archives per second), ``bytes`` (size of
+            the archive files), ``read_seconds`` and ``eval_seconds`` (time
+            spent reading and evaluating summed over the archives),
+            ``max_ready`` (highest number of read archives waiting),
+            ``reader_blocked`` (time readers waited on a full ready queue)
+            and ``evaluator_idle`` (time evaluators waited on an empty
+            one).
+        """
+        loop = asyncio.new_event_loop()
+        # Fork every evaluator before the reader threads start, a process
+        # forked while another thread holds a lock would deadlock on it
+        cpu_pool = multiprocessing.Pool(self.processes)
+        io_pool = concurrent.futures.ThreadPoolExecutor(self.readers)
+        try:
+            stats = loop.run_until_complete(self._run(loop, io_pool, cpu_pool, archives, output))
+            cpu_pool.close()
+            return stats
+        except BaseException:
+            cpu_pool.terminate()
+            raise
+        finally:
+            io_pool.shutdown()
+            cpu_pool.join()
+            loop.close()
+
+    async def _run(self, loop, io_pool, cpu_pool, archives, output):
+        stats = {
+            "archives": 0, "failed": 0, "processes": self.processes, "readers": self.readers,
+            "read_ahead": self.read_ahead, "bytes": 0, "read_seconds": 0.0, "eval_seconds": 0.0,
+            "max_ready": 0, "reader_blocked": 0.0, "evaluator_idle": 0.0,
+        }
+        paths = asyncio.Queue(self.readers)
+        ready = asyncio.Queue(self.read_ahead)
+        start = time.time()
+
+        async def produce():
+            for path in archives:
+                await paths.put(path)
+            for _ in range(self.readers):
+                await paths.put(None)
+
+        async def read():
+            while True:
+                path = await paths.get()
+                if path is None:
+                    return
+                payload = await loop.run_in_executor(io_pool, read_archive, path, self.specs, self.collect)
+                stats["read_seconds"] += payload["read"]
+                if os.path.isfile(path):
+                    stats["bytes"] += os.path.getsize(path)
+                waited = time.time()
+                await ready.put(payload)
+                stats["reader_blocked"] += time.time() - waited
+                stats["max_ready"] = max(stats["max_ready"], ready.qsize())
+
+        async def evaluate():
+            while True:
+                waited = time.time()
+                payload = await ready.get()
+                stats["evaluator_idle"] += time.time() - waited
+                if payload is None:
+                    return
+                record = await _apply(loop, cpu_pool, evaluate_payload, payload, self.rule_names)
+                stats["archives"] += 1
+                stats["failed"] += "archive" in record["errors"]
+                stats["eval_seconds"] += record["elapsed"]
+                output.write(json.dumps(record, default=str, sort_keys=True) + "\n")
+
+        evaluators = [asyncio.ensure_future(evaluate()) for _ in range(self.processes)]
+        await asyncio.gather(produce(), *[read() for _ in range(self.readers)])
+        for _ in evaluators:
+            await ready.put(None)
+        await asyncio.gather(*evaluators)
+
+        stats["seconds"] = time.time() - start
+        stats["rate"] = stats["archives"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+
+def format_stats(stats):
+    return "\n".join([
+        "{archives} archives ({failed} failed) in {seconds:.2f}s: {rate:.1f} archives/sec".format(**stats),
+        "{processes} evaluators, {readers} readers, read-ahead {read_ahead}, {bytes} archive bytes".format(**stats),
+        "reading {read_seconds:.2f}s, evaluating {eval_seconds:.2f}s, peak ready {max_ready}".format(**stats),
+        "readers blocked {reader_blocked:.2f}s, evaluators idle {evaluator_idle:.2f}s".format(**stats),
+    ])
+
+
+def main():
+    p = argparse.ArgumentParser(description="Evaluate the example rules overlapping archive reads and evaluation.")
+    p.add_argument("source", help="Directory of archives or manifest file listing archive paths.")
+    p.add_argument("-o", "--output", default="results.jsonl", help="JSON-lines file to write results to.")
+    p.add_argument("-j", "--processes", type=int, default=None, help="Number of evaluator processes, all CPUs by default.")
+    p.add_argument("--readers", type=int, default=4, help="Number of archives extracted and read at once.")
+    p.add_argument("--read-ahead", type=int, default=8, help="Number of read archives held waiting for an evaluator.")
+    p.add_argument("-r", "--rule", action="append", dest="rules",
+                   help="Fully qualified rule to evaluate, may be repeated.  Defaults to the example rules.")
+    args = p.parse_args()
+
+    pipeline = Pipeline(tuple(args.rules or batch.DEFAULT_RULES), args.processes, args.readers, args.read_ahead)
+    with open(args.output, "w") as output:
+        stats = pipeline.run(batch.find_archives(args.source), output)
+    print(format_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
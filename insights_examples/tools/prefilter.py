@@ -0,0 +1,229 @@
+"""
+Filter effectiveness and archive compaction
+===========================================
+
+Rules register ``add_filter`` patterns so that only the lines of a spec
+containing one of them are handed to its parsers.  This tool loads every
+rule of a package (``insights_examples.rules`` by default), gathers the
+union of the filters of each spec the rules depend on and measures, over a
+corpus of archives, how many lines and bytes the filters keep and drop::
+
+    $ python -m insights_examples.tools.prefilter report /data/archives
+    spec                                            files     lines      kept      bytes kept bytes  dropped
+    insights.specs.Specs.hostname                      20        20        20        370        370     0.0%
+    insights.specs.Specs.installed_rpms                20        40        40        960        960     0.0%
+    insights.specs.Specs.redhat_release                20        20        20       1040       1040     0.0%
+    insights.specs.Specs.sshd_config                   20      3000       944      56449      21246    62.4%
+    23616 of 58819 bytes kept (59.8% dropped)
+
+That is 20 archives with generated 150 line ``sshd_config`` files.
+Specs without filters are listed too, their content is always kept whole.
+
+``compact`` rewrites archives so that the files of filtered specs only
+hold the lines the filters keep, every other file being copied as is::
+
+    $ python -m insights_examples.tools.prefilter compact /data/archives -o /data/compact
+
+Archive files are written back as ``.tar.gz`` and extracted archives as
+directories, under the same names.  The compacted archives evaluate to the
+same results as the originals for the rules they were compacted with, but
+a rule added later that filters a spec differently would not see the
+lines that were dropped.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tarfile
+import tempfile
+
+from insights import load_default_plugins
+from insights.core import dr, filters
+from insights.core.archives import extract
+from insights.core.hydration import initialize_broker
+from insights.core.plugins import rule
+from insights.core.spec_factory import RegistryPoint
+from insights_examples.tools.batch import archive_name, find_archives
+
+RULES_PACKAGE = "insights_examples.rules"
+"""str: Package whose rules are loaded by default."""
+
+
+def load_specs(package=RULES_PACKAGE):
+    """
+    Loads the default specs and every rule of ``package``.
+
+    Returns:
+        dict: The union of the filters of each spec (registry point) the
+        rules depend on, keyed by spec, an empty set for unfiltered specs.
+    """
+    load_default_plugins()
+    dr.load_components(package, continue_on_error=False)
+    prefix = package + "."
+    specs = {}
+    for component in dr.COMPONENTS_BY_TYPE[rule]:
+        if not dr.get_name(component).startswith(prefix):
+            continue
+        for dep in dr.get_dependency_graph(component):
+            if isinstance(dep, RegistryPoint) and dep not in specs:
+                specs[dep] = filters.get_filters(dep)
+    return specs
+
+
+def _providers(value):
+    for provider in value if isinstance(value, list) else [value]:
+        if getattr(provider, "relative_path", None) and os.path.isfile(provider.path):
+            yield provider
+
+
+def _size(lines):
+    return sum(len(l.encode("utf-8", "surrogateescape")) + 1 for l in lines)
+
+
+def collect(root, specs):
+    """
+    Runs ``specs`` over the extracted archive at ``root``.
+
+    Returns:
+        list: ``(spec, provider)`` tuples for every file read, a provider's
+        ``content`` being the lines kept by the filters of its spec.
+    """
+    graph = {}
+    for spec in specs:
+        graph.update(dr.get_dependency_graph(spec))
+    ctx, broker = initialize_broker(root)
+    broker = dr.run(graph, broker=broker)
+    found = []
+    for spec in specs:
+        if spec in broker:
+            found.extend((spec, p) for p in _providers(broker[spec]))
+    return found
+
+
+def measure_dir(root, specs, totals=None):
+    """
+    Adds the ``files``, ``lines``, ``kept_lines``, ``bytes`` and
+    ``kept_bytes`` of each spec read from the extracted archive at ``root``
+    to ``totals``, keyed by spec name, and returns it.
+    """
+    totals = {} if totals is None else totals
+    for spec, provider in collect(root, specs):
+        with open(provider.path, "r", encoding="utf-8", errors="surrogateescape") as f:
+            lines = [l.rstrip("\n") for l in f]
+        kept = provider.content if specs[spec] else lines
+        total = totals.setdefault(dr.get_name(spec), {
+            "filters": sorted(specs[spec]), "files": 0, "lines": 0, "kept_lines": 0, "bytes": 0, "kept_bytes": 0,
+        })
+        total["files"] += 1
+        total["lines"] += len(lines)
+        total["kept_lines"] += len(kept)
+        total["bytes"] += os.path.getsize(provider.path)
+        total["kept_bytes"] += _size(kept)
+    return totals
+
+
+def measure(paths, specs):
+    """
+    dict: Returns the totals of :func:`measure_dir` over the archives or
+    extracted archive directories in ``paths``.
+    """
+    totals = {}
+    for path in paths:
+        if os.path.isdir(path):
+            measure_dir(path, specs, totals)
+        else:
+            with extract(path) as ex:
+                measure_dir(ex.tmp_dir, specs, totals)
+    return totals
+
+
+def compact_dir(root, output, specs):
+    """
+    Copies the extracted archive at ``root`` to the directory ``output``,
+    keeping only the filtered lines of the files of filtered specs.
+
+    Returns:
+        int: The number of files rewritten.
+    """
+    shutil.copytree(root, output, symlinks=True)
+    rewritten = 0
+    for spec, provider in collect(root, specs):
+        if not specs[spec]:
+            continue
+        target = os.path.join(output, os.path.relpath(provider.path, root))
+        content = provider.content
+        with open(target, "w", encoding="utf-8", errors="surrogateescape") as f:
+            f.write("".join(l + "\n" for l in content))
+        rewritten += 1
+    return rewritten
+
+
+def compact(path, output_dir, specs):
+    """
+    Writes the compacted form of the archive or extracted archive directory
+    at ``path`` to ``output_dir`` under the same name, a directory for a
+    directory and a ``.tar.gz`` otherwise, and returns its path.
+    """
+    name = os.path.basename(os.path.normpath(path))
+    if os.path.isdir(path):
+        target = os.path.join(output_dir, name)
+        compact_dir(path, target, specs)
+        return target
+
+    target = os.path.join(output_dir, archive_name(path) + ".tar.gz")
+    tmp = tempfile.mkdtemp()
+    try:
+        with extract(path) as ex:
+            compacted = os.path.join(tmp, "compact")
+            compact_dir(ex.tmp_dir, compacted, specs)
+        with tarfile.open(target, "w:gz") as tar:
+            for entry in sorted(os.listdir(compacted)):
+                tar.add(os.path.join(compacted, entry), arcname=entry)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+def format_report(totals):
+    lines = ["{0:<45} {1:>7} {2:>9} {3:>9} {4:>10} {5:>10} {6:>8}".format(
+        "spec", "files", "lines", "kept", "bytes", "kept bytes", "dropped")]
+    all_bytes = all_kept = 0
+    for name, total in sorted(totals.items()):
+        dropped = 1 - float(total["kept_bytes"]) / total["bytes"] if total["bytes"] else 0.0
+        lines.append("{0:<45} {1:>7} {2:>9} {3:>9} {4:>10} {5:>10} {6:>8.1%}".format(
+            name, total["files"], total["lines"], total["kept_lines"], total["bytes"], total["kept_bytes"], dropped))
+        all_bytes += total["bytes"]
+        all_kept += total["kept_bytes"]
+    if all_bytes:
+        lines.append("{0} of {1} bytes kept ({2:.1%} dropped)".format(all_kept, all_bytes, 1 - float(all_kept) / all_bytes))
+    return "\n".join(lines)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Measure and apply the filters of the example rules to archives.")
+    p.add_argument("-p", "--package", default=RULES_PACKAGE, help="Package of the rules whose filters are used.")
+    sub = p.add_subparsers(dest="command")
+    p_report = sub.add_parser("report", help="Report the lines and bytes kept by the filters.")
+    p_report.add_argument("source", help="Directory of archives or manifest file.")
+    p_compact = sub.add_parser("compact", help="Rewrite archives keeping only the filtered lines.")
+    p_compact.add_argument("source", help="Directory of archives or manifest file.")
+    p_compact.add_argument("-o", "--output", required=True, help="Directory to write the compacted archives to.")
+    args = p.parse_args()
+
+    if args.command not in ("report", "compact"):
+        p.print_help()
+        return
+    specs = load_specs(args.package)
+    paths = find_archives(args.source)
+    if args.command == "report":
+        print(format_report(measure(paths, specs)))
+    else:
+        if not os.path.isdir(args.output):
+            os.makedirs(args.output)
+        for path in paths:
+            print(compact(path, args.output, specs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Bulk rendering of rule results
+==============================
+
+Every example rule ships a Jinja2 ``CONTENT`` template for its responses.
+Rendering a response the way ``insights.formats`` does, with
+``Template(content).render(response)``, compiles the template again for
+every response, which dominates the time spent writing human readable
+reports for a fleet.  :class:`TemplateRegistry` compiles the template of
+each rule and response key once per process and keeps the text rendered
+for the last responses seen, keyed by rule and response, as many hosts
+share identical responses (the same ``sshd_secure`` errors and
+``openssh`` package, the same vulnerable ``bash``).
+
+Results are read from the JSON lines of :mod:`insights_examples.tools.batch`
+or from a binary file of :mod:`insights_examples.tools.resultfile`, and one
+line per rendered response is written::
+
+    $ python -m insights_examples.tools.render results.jsonl -o report.txt
+    host1   insights_examples.rules.is_fedora.report    This machine (host1.example.com) runs Fedora.
+
+``--benchmark N`` renders the results of N synthetic hosts (see
+:func:`insights_examples.tools.generators.results`) three ways: compiling
+every time, with compiled templates only, and with compiled templates and
+the rendered text cache.  For about 100,000 results::
+
+    $ python -m insights_examples.tools.render --benchmark 43700
+    99814 results from 43700 hosts
+    compile every time         63.04s   1583 results/sec
+    compiled templates          1.20s  83035 results/sec
+    compiled and cached         1.10s  90890 results/sec, cache hit rate 56.2%
+
+Compiling once makes rendering about 50 times faster.  The cache saves
+less, building its key costs nearly as much as rendering these short
+templates, and it pays off with longer templates or higher hit rates.
+
+Templates are compiled on first use in each process and rules are looked
+up by name, so the same registry renders results written by other
+processes.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+
+from insights.core import dr
+from insights.core.plugins import make_fail, make_fingerprint, make_info, make_pass, make_response
+from insights_examples.cache import LRUCache
+from insights_examples.tools import generators, resultfile
+from insights_examples.tools.incremental import host_id
+
+try:
+    from jinja2 import Template
+    from jinja2.exceptions import UndefinedError
+except ImportError:  # pragma: no cover
+    Template = None
+
+# Response classes a CONTENT dict may be keyed by, per response type
+_RESPONSE_CLASSES = {}
+for _cls in (make_response, make_fail, make_pass, make_info, make_fingerprint):
+    _RESPONSE_CLASSES.setdefault(_cls.response_type, []).append(_cls)
+_KEY_NAMES = dict((t, classes[0].key_name) for t, classes in _RESPONSE_CLASSES.items())
+
+
+def get_content(rule, response):
+    """
+    Returns the ``CONTENT`` template of ``rule`` for ``response``, a
+    response or a plain dict read back from results, looked up as
+    ``insights.formats.get_content`` does.  Returns ``None`` when the rule
+    has no template for it.
+    """
+    content = dr.get_delegate(rule).content
+    if content is None:
+        content = getattr(sys.modules[rule.__module__], "CONTENT", None)
+    if not isinstance(content, dict):
+        return content
+    response_type = response.get("type")
+    for cls in _RESPONSE_CLASSES.get(response_type, []):
+        if cls in content:
+            return content[cls]
+    value = content.get(response.get(_KEY_NAMES.get(response_type)))
+    if isinstance(value, dict):
+        for cls in _RESPONSE_CLASSES.get(response_type, []):
+            if cls in value:
+                return value[cls]
+        return None
+    return value
+
+
+class TemplateRegistry(object):
+    """
+    Compiled ``CONTENT`` templates of the rules and a cache of the text
+    rendered for the last ``maxsize`` distinct responses, ``0`` to render
+    every response.
+
+    Attributes:
+        templates (dict): Compiled templates keyed by their source.
+        cache (LRUCache): Rendered text keyed by rule name and response.
+    """
+
+    def __init__(self, maxsize=4096):
+        if Template is None:
+            raise ImportError("jinja2 is required to render CONTENT templates")
+        self.templates = {}
+        self.cache = LRUCache(maxsize) if maxsize else None
+        self._rules = {}
+        self._content = {}
+
+    def rule(self, name):
+        """Returns the rule named ``name``, importing its module if needed."""
+        rule = self._rules.get(name)
+        if rule is None:
+            rule = self._rules[name] = dr.get_component(name)
+        return rule
+
+    def template(self, rule, response):
+        """Returns the compiled template of ``rule`` for ``response``, or ``None``."""
+        response_type = response.get("type")
+        key = (rule, response_type, response.get(_KEY_NAMES.get(response_type)))
+        if key not in self._content:
+            self._content[key] = get_content(rule, response)
+        content = self._content[key]
+        if not content:
+            return None
+        template = self.templates.get(content)
+        if template is None:
+            template = self.templates[content] = Template(content)
+        return template
+
+    def render(self, name, response):
+        """
+        Returns the text of ``response`` of the rule ``name``.  Responses
+        without a template are rendered as their ``str``, as are the
+        responses the template fails on, followed by the error.
+        """
+        key = None
+        if self.cache is not None:
+            key = (name, json.dumps(response, sort_keys=True, default=str))
+            text = self.cache.get(key)
+            if text is not None:
+                return text
+        template = self.template(self.rule(name), response)
+        if template is None:
+            text = str(response)
+        else:
+            try:
+                text = template.render(response)
+            except UndefinedError as err:
+                text = "\n".join([str(response), "Failed to render the content: " + str(err)])
+        if key is not None:
+            self.cache.put(key, text)
+        return text
+
+
+def iter_responses(records):
+    """
+    Yields ``(host, rule name, response)`` for every response of the
+    result ``records`` that can be reported, skipping rules that did not
+    run or returned ``make_none`` or ``skip``.
+    """
+    for record in records:
+        host = host_id(record["archive"])
+        for name, response in sorted(record["results"].items()):
+            if response and response.get("type") not in ("none", "skip"):
+                yield host, name, response
+
+
+def render_records(records, registry=None):
+    """
+    Yields ``(host, rule name, text)`` for the responses of the result
+    ``records``, rendered with ``registry``, a new :class:`TemplateRegistry`
+    by default.
+    """
+    registry = registry or TemplateRegistry()
+    for host, name, response in iter_responses(records):
+        yield host, name, registry.render(name, response)
+
+
+def read_records(path):
+    """Yields the records of a JSON-lines or binary result file."""
+    with open(path, "rb") as f:
+        binary = f.read(len(resultfile.MAGIC)) == resultfile.MAGIC
+    if binary:
+        with open(path, "rb") as f:
+            for host, record in resultfile.iter_records(f):
+                yield record
+    else:
+        with open(path) as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def benchmark(hosts):
+    """
+    Renders the results of ``hosts`` synthetic hosts compiling every
+    template, with compiled templates and with compiled templates and the
+    text cache.
+
+    Returns:
+        dict: The number of ``hosts`` and ``results``, and per way of
+        rendering (``compile``, ``compiled`` and ``cached``) its
+        ``seconds`` and ``rate`` in results per second, with the
+        ``hit_rate`` of the cache for ``cached``.
+    """
+    responses = list(iter_responses(generators.results(hosts)))
+    registry = TemplateRegistry(0)
+
+    def compile_every_time(name, response):
+        template = get_content(registry.rule(name), response)
+        return Template(template).render(response) if template else str(response)
+
+    stats = {"hosts": hosts, "results": len(responses)}
+    cached = TemplateRegistry()
+    for way, render in [("compile", compile_every_time), ("compiled", registry.render), ("cached", cached.render)]:
+        start = time.time()
+        for host, name, response in responses:
+            render(name, response)
+        seconds = time.time() - start
+        stats[way] = {"seconds": seconds, "rate": len(responses) / seconds if seconds else 0.0}
+    stats["cached"]["hit_rate"] = cached.cache.hit_rate
+    return stats
+
+
+def format_benchmark(stats):
+    lines = ["{results} results from {hosts} hosts".format(**stats)]
+    for way, label in [("compile", "compile every time"), ("compiled", "compiled templates"), ("cached", "compiled and cached")]:
+        line = "{0:<24} {1:>7.2f}s {2:>6.0f} results/sec".format(label, stats[way]["seconds"], stats[way]["rate"])
+        if "hit_rate" in stats[way]:
+            line += ", cache hit rate {0:.1%}".format(stats[way]["hit_rate"])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Render the CONTENT of rule results in bulk.")
+    p.add_argument("results", nargs="?", help="JSON-lines or binary result file.")
+    p.add_argument("-o", "--output", help="File to write the rendered results to, standard output by default.")
+    p.add_argument("--cache-size", type=int, default=4096, help="Number of rendered responses cached, 0 to disable.")
+    p.add_argument("--benchmark", type=int, metavar="HOSTS", help="Measure rendering the results of HOSTS synthetic hosts.")
+    args = p.parse_args()
+
+    if args.benchmark:
+        print(format_benchmark(benchmark(args.benchmark)))
+        return
+    if not args.results:
+        p.error("a result file is required")
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for host, name, text in render_records(read_records(args.results), TemplateRegistry(args.cache_size)):
+            output.write("{0}\t{1}\t{2}\n".format(host, name, text.replace("\n", "\n\t\t")))
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""
+Binary result files
+===================
+
+The JSON lines written by :mod:`insights_examples.tools.batch` repeat the
+same rule names, field names (``error_key``, ``openssh``, ``product``,
+...) and values (``SSHD_SECURE``, ``openssh-7.4p1-16.el7``, ...) in the
+record of every host.  :class:`ResultWriter` writes the same records in a
+compact binary form instead, one at a time as they arrive:
+
+* dict keys are stored once in a string table and referred to by number,
+* string values of up to 64 characters are written out the first time
+  they are seen and added to the table the second time, so repeated values
+  are interned while unique ones, like host names, are not,
+* numbers are variable length integers or 8 byte floats,
+* strings are UTF-8 encoded with ``surrogateescape``, so content lines
+  that were not valid UTF-8 are written back as their original bytes.
+
+The file is a sequence of frames, each a kind byte, the length of its
+payload and the payload::
+
+    magic "IXR\\x01"
+    S  new strings of the table, before the first record using them
+    R  host id, record
+    S  ...
+    R  ...
+    I  string table and offset of the R frame of every host
+    offset of the I frame (8 bytes), magic
+
+:func:`iter_records` reads the records in order, following the S frames,
+and so also reads a file still being written or whose writer died before
+writing the index, a partly written last frame ending the records as the
+end of the file does.  :class:`ResultReader` reads the index of a complete
+file and then any host's record with one seek.  Hosts are identified by
+the name of their archive without its extension, see
+:func:`insights_examples.tools.incremental.host_id`.
+
+Converting existing results, reading a single host and comparing with
+JSON::
+
+    $ python -m insights_examples.tools.resultfile convert results.jsonl -o results.bin
+    $ python -m insights_examples.tools.resultfile get results.bin host1
+    $ python -m insights_examples.tools.resultfile compare --hosts 10000
+    10000 records: json 4.95MiB (0.14MiB compressed), binary 1.61MiB (0.24MiB compressed), 32.4% of json
+    write: json 81.4ms, binary 137.1ms; read: json 77.7ms, binary 165.1ms
+
+``compare`` without a file uses :func:`insights_examples.tools.generators.results`.
+Binary files are about a third of the size of JSON lines.  Writing and
+reading them is about twice as slow, the encoder being pure Python while ``json``
+is C.  The synthetic records are so alike that zlib compresses the JSON
+further than the binary file, compressing the output is the better choice
+where it is read as a whole and random access is not needed.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import struct
+import sys
+import time
+import zlib
+
+from insights_examples.tools import generators
+from insights_examples.tools.incremental import host_id
+
+MAGIC = b"IXR\x01"
+MAX_INTERNED = 64
+"""int: Longest string value interned."""
+
+_STRINGS, _RECORD, _INDEX = b"S", b"R", b"I"
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _REF, _LIST, _DICT = range(9)
+# Strings seen once remembered for interning, forgotten past this many
+_MAX_SEEN = 100000
+_DOUBLE = struct.Struct(">d")
+_OFFSET = struct.Struct(">Q")
+_TRAILER = _OFFSET.size + len(MAGIC)
+
+
+def _varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _bytes(out, s):
+    b = s.encode("utf-8", "surrogateescape")
+    _varint(out, len(b))
+    out += b
+
+
+def _read_str(data, pos):
+    size, pos = _read_varint(data, pos)
+    end = pos + size
+    return data[pos:end].decode("utf-8", "surrogateescape"), end
+
+
+def _read_strings(data, pos, table):
+    count, pos = _read_varint(data, pos)
+    for _ in range(count):
+        s, pos = _read_str(data, pos)
+        table.append(s)
+    return pos
+
+
+def _decode(data, pos, table):
+    tag = data[pos]
+    pos += 1
+    if tag == _REF:
+        n, pos = _read_varint(data, pos)
+        return table[n], pos
+    if tag == _DICT:
+        count, pos = _read_varint(data, pos)
+        value = {}
+        for _ in range(count):
+            key, pos = _read_varint(data, pos)
+            value[table[key]], pos = _decode(data, pos, table)
+        return value, pos
+    if tag == _STR:
+        return _read_str(data, pos)
+    if tag == _INT:
+        n, pos = _read_varint(data, pos)
+        return (n >> 1) ^ -(n & 1), pos
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(data, pos)[0], pos + _DOUBLE.size
+    if tag == _LIST:
+        count, pos = _read_varint(data, pos)
+        value = []
+        for _ in range(count):
+            item, pos = _decode(data, pos, table)
+            value.append(item)
+        return value, pos
+    if tag == _NONE:
+        return None, pos
+    if tag == _FALSE or tag == _TRUE:
+        return tag == _TRUE, pos
+    raise ValueError("Unknown value tag %d at %d" % (tag, pos - 1))
+
+
+def _read_frame(f):
+    # (kind, payload) of the next frame, None at the end of the file or
+    # when the last frame is only partly written, leaving f at its start
+    start = f.tell()
+    kind = f.read(1)
+    if not kind:
+        return None
+    size = shift = 0
+    while True:
+        b = f.read(1)
+        if not b:
+            f.seek(start)
+            return None
+        size |= (ord(b) & 0x7f) << shift
+        if ord(b) < 0x80:
+            break
+        shift += 7
+    payload = f.read(size)
+    if len(payload) != size:
+        f.seek(start)
+        return None
+    return kind, payload
+
+
+def _read_complete_frame(f):
+    frame = _read_frame(f)
+    if frame is None:
+        raise ValueError("Truncated frame")
+    return frame
+
+
+def _check_magic(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a result file")
+
+
+class ResultWriter(object):
+    """
+    Writes result records to the binary file object ``f``, which must be
+    at its start.  :meth:`close` writes the index, without it the file can
+    only be read by :func:`iter_records`.
+
+    Attributes:
+        hosts (dict): Offset of the record of each host written.
+        strings (list): The string table.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.hosts = {}
+        self.strings = []
+        self._ids = {}
+        self._seen = set()
+        self._new = []
+        f.write(MAGIC)
+        self._offset = len(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ref(self, s):
+        n = self._ids.get(s)
+        if n is None:
+            n = self._ids[s] = len(self.strings)
+            self.strings.append(s)
+            self._new.append(s)
+        return n
+
+    def _encode(self, out, value):
+        if value is None:
+            out.append(_NONE)
+        elif value is True or value is False:
+            out.append(_TRUE if value else _FALSE)
+        elif isinstance(value, int):
+            out.append(_INT)
+            _varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+        elif isinstance(value, float):
+            out.append(_FLOAT)
+            out += _DOUBLE.pack(value)
+        elif isinstance(value, dict):
+            out.append(_DICT)
+            _varint(out, len(value))
+            for k, v in value.items():
+                _varint(out, self._ref(k if isinstance(k, str) else str(k)))
+                self._encode(out, v)
+        elif isinstance(value, (list, tuple)):
+            out.append(_LIST)
+            _varint(out, len(value))
+            for v in value:
+                self._encode(out, v)
+        else:
+            s = value if isinstance(value, str) else str(value)
+            if s in self._ids:
+                out.append(_REF)
+                _varint(out, self._ids[s])
+            elif len(s) <= MAX_INTERNED and s in self._seen:
+                self._seen.discard(s)
+                out.append(_REF)
+                _varint(out, self._ref(s))
+            else:
+                if len(s) <= MAX_INTERNED:
+                    if len(self._seen) >= _MAX_SEEN:
+                        self._seen.clear()
+                    self._seen.add(s)
+                out.append(_STR)
+                _bytes(out, s)
+
+    def _frame(self, kind, payload):
+        header = bytearray(kind)
+        _varint(header, len(payload))
+        self.f.write(bytes(header))
+        self.f.write(bytes(payload))
+        self._offset += len(header) + len(payload)
+
+    def _string_payload(self, strings):
+        out = bytearray()
+        _varint(out, len(strings))
+        for s in strings:
+            _bytes(out, s)
+        return out
+
+    def write(self, record, host=None):
+        """
+        Writes ``record``, a dict of JSON like values, for ``host``, by
+        default the :func:`host_id` of its ``"archive"``.  Values of other
+        types are written as their ``str``, as ``json.dumps(default=str)``
+        would.
+
+        Raises:
+            ValueError: When a record of ``host`` was already written.
+        """
+        host = host or host_id(record["archive"])
+        if host in self.hosts:
+            raise ValueError("Host %s is already in the file" % host)
+        out = bytearray()
+        _bytes(out, host)
+        self._encode(out, record)
+        if self._new:
+            self._frame(_STRINGS, self._string_payload(self._new))
+            self._new = []
+        self.hosts[host] = self._offset
+        self._frame(_RECORD, out)
+
+    def close(self):
+        """Writes the index.  The file object is left open."""
+        if self.f is None:
+            return
+        index = self._offset
+        out = self._string_payload(self.strings)
+        _varint(out, len(self.hosts))
+        for host, offset in self.hosts.items():
+            _bytes(out, host)
+            _varint(out, offset)
+        self._frame(_INDEX, out)
+        self.f.write(_OFFSET.pack(index) + MAGIC)
+        self.f = None
+
+
+def iter_records(f):
+    """
+    Yields the ``(host, record)`` pairs of the binary file object ``f`` in
+    the order they were written.  A partly written last frame is left
+    unread, ``f`` is then at its start.
+    """
+    _check_magic(f)
+    table = []
+    while True:
+        frame = _read_frame(f)
+        if frame is None or frame[0] == _INDEX:
+            return
+        kind, payload = frame
+        if kind == _STRINGS:
+            _read_strings(payload, 0, table)
+        elif kind == _RECORD:
+            host, pos = _read_str(payload, 0)
+            yield host, _decode(payload, pos, table)[0]
+        else:
+            raise ValueError("Unknown frame %r" % kind)
+
+
+class ResultReader(object):
+    """
+    Random access to the records of a complete result file, by host id.
+
+    Attributes:
+        hosts (dict): Offset of the record of each host.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        f.seek(0)
+        _check_magic(f)
+        f.seek(-_TRAILER, 2)
+        trailer = f.read(_TRAILER)
+        if trailer[_OFFSET.size:] != MAGIC:
+            raise ValueError("Result file without index")
+        f.seek(_OFFSET.unpack(trailer[:_OFFSET.size])[0])
+        kind, payload = _read_complete_frame(f)
+        self.strings = []
+        pos = _read_strings(payload, 0, self.strings)
+        count, pos = _read_varint(payload, pos)
+        self.hosts = {}
+        for _ in range(count):
+            host, pos = _read_str(payload, pos)
+            self.hosts[host], pos = _read_varint(payload, pos)
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __contains__(self, host):
+        return host in self.hosts
+
+    def get(self, host):
+        """dict: Returns the record of ``host``, ``None`` when it is not in the file."""
+        if host not in self.hosts:
+            return None
+        self.f.seek(self.hosts[host])
+        kind, payload = _read_complete_frame(self.f)
+        name, pos = _read_str(payload, 0)
+        return _decode(payload, pos, self.strings)[0]
+
+
+def compare(records, repeat=3):
+    """
+    Writes and reads ``records`` as JSON lines and as a binary result file
+    in memory, best of ``repeat`` times each.
+
+    Returns:
+        dict: The keys ``records``, ``json_bytes``, ``binary_bytes``,
+        ``json_compressed`` and ``binary_compressed`` (sizes compressed
+        with zlib), and the ``json_write``, ``json_read``,
+        ``binary_write`` and ``binary_read`` times in seconds.
+    """
+    def best(func):
+        times = []
+        for _ in range(repeat):
+            start = time.time()
+            value = func()
+            times.append(time.time() - start)
+        return min(times), value
+
+    def write_json():
+        return "".join(json.dumps(r, default=str, sort_keys=True) + "\n" for r in records).encode("utf-8")
+
+    def write_binary():
+        buf = io.BytesIO()
+        with ResultWriter(buf) as writer:
+            for r in records:
+                writer.write(r)
+        return buf.getvalue()
+
+    json_write, json_data = best(write_json)
+    binary_write, binary_data = best(write_binary)
+    json_read = best(lambda: [json.loads(l) for l in json_data.decode("utf-8").splitlines()])[0]
+    binary_read = best(lambda: list(iter_records(io.BytesIO(binary_data))))[0]
+    return {
+        "records": len(records),
+        "json_bytes": len(json_data),
+        "binary_bytes": len(binary_data),
+        "json_compressed": len(zlib.compress(json_data)),
+        "binary_compressed": len(zlib.compress(binary_data)),
+        "json_write": json_write,
+        "json_read": json_read,
+        "binary_write": binary_write,
+        "binary_read": binary_read,
+    }
+
+
+def format_comparison(stats):
+    mib = 1024.0 * 1024
+    return "\n".join([
+        "{0} records: json {1:.2f}MiB ({2:.2f}MiB compressed), binary {3:.2f}MiB ({4:.2f}MiB compressed), {5:.1%} of json".format(
+            stats["records"], stats["json_bytes"] / mib, stats["json_compressed"] / mib, stats["binary_bytes"] / mib,
+            stats["binary_compressed"] / mib, float(stats["binary_bytes"]) / stats["json_bytes"]),
+        "write: json {0:.1f}ms, binary {1:.1f}ms; read: json {2:.1f}ms, binary {3:.1f}ms".format(
+            stats["json_write"] * 1000, stats["binary_write"] * 1000, stats["json_read"] * 1000, stats["binary_read"] * 1000),
+    ])
+
+
+def main():
+    p = argparse.ArgumentParser(description="Convert, read and measure binary result files.")
+    sub = p.add_subparsers(dest="command")
+    convert = sub.add_parser("convert", help="Convert a JSON-lines result file.")
+    convert.add_argument("results", help="JSON-lines file written by the batch runner.")
+    convert.add_argument("-o", "--output", required=True, help="Binary result file to write.")
+    get = sub.add_parser("get", help="Print the record of a host as JSON.")
+    get.add_argument("results", help="Binary result file.")
+    get.add_argument("host", help="Host id, the archive name without extension.")
+    dump = sub.add_parser("dump", help="Print every record as a JSON line.")
+    dump.add_argument("results", help="Binary result file.")
+    comp = sub.add_parser("compare", help="Compare the size and speed of the binary format with JSON.")
+    comp.add_argument("results", nargs="?", help="JSON-lines result file, synthetic records by default.")
+    comp.add_argument("--hosts", type=int, default=10000, help="Number of synthetic records.")
+    args = p.parse_args()
+
+    if args.command == "convert":
+        with open(args.results) as f, open(args.output, "wb") as out:
+            with ResultWriter(out) as writer:
+                for line in f:
+                    writer.write(json.loads(line))
+        print("{0} records written to {1}".format(len(writer.hosts), args.output))
+    elif args.command == "get":
+        with open(args.results, "rb") as f:
+            record = ResultReader(f).get(args.host)
+        if record is None:
+            sys.exit("No record for {0}".format(args.host))
+        print(json.dumps(record, indent=4, sort_keys=True))
+    elif args.command == "dump":
+        with open(args.results, "rb") as f:
+            for host, record in iter_records(f):
+                print(json.dumps(record, sort_keys=True))
+    elif args.command == "compare":
+        if args.results:
+            with open(args.results) as f:
+                records = [json.loads(l) for l in f]
+        else:
+            records = generators.results(args.hosts)
+        print(format_comparison(compare(records)))
+    else:
+        p.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+SSHDConfig memory benchmark
+===========================
+
+Compares the memory retained by :class:`insights_examples.parsers.secure_shell.SSHDConfig`
+in its default mode (one ``KeyValue`` namedtuple per line) against compact
+mode (``SSHDConfig.compact = True``, one slot-backed
+:class:`insights_examples.parsers.secure_shell.CompactKeyValue` per line
+with interned keywords) and zero-copy mode (``SSHDConfig.zero_copy = True``,
+the content as one ``bytes`` buffer and four offsets per line, see
+:class:`insights_examples.parsers.secure_shell.BufferLines`).  Memory is
+measured with :mod:`tracemalloc` as the bytes still allocated once the
+parsed object has been built and the input content released.  The parse
+throughput of each mode follows, the best of ``--repeat`` parses.
+
+Run it from the root of the repository::
+
+    $ python -m insights_examples.tools.sshd_memory --lines 1000 10000 100000 500000
+
+Sample output on Python 3.11::
+
+      lines     default     compact   zero-copy   saved
+       1000      298716      156447       49319   83.5%
+      10000     3013968     1586199      423869   85.9%
+     100000    30181664    15898887     4286569   85.8%
+     500000   151893474    80477391    22166350   85.4%
+
+      lines       MiB     default     compact   zero-copy
+       1000      0.02    7.8MiB/s    8.4MiB/s   11.7MiB/s
+      10000      0.20   10.4MiB/s   11.2MiB/s   16.3MiB/s
+     100000      2.13    8.2MiB/s    7.0MiB/s   14.8MiB/s
+     500000     11.06    8.2MiB/s   12.3MiB/s   18.7MiB/s
+
+The saving of compact mode comes from sharing one interned keyword across
+lines and dropping the per-line lowercase keyword string and tuple header;
+its keyword index is the same as in default mode.  Zero-copy mode keeps
+no string per line at all, about 40 bytes per line of which half is the
+content itself, and parses 1.5 to 2 times faster as it builds no objects
+per line.  Its lookups decode the values they return every time.  The
+saved column compares zero-copy with default mode.
+"""
+import argparse
+import gc
+import timeit
+import tracemalloc
+
+from contextlib import contextmanager
+
+from insights.tests import context_wrap
+from insights_examples.parsers.secure_shell import SSHDConfig
+from insights_examples.tools.generators import SSHD_KEYWORDS as KEYWORDS
+
+
+def make_config(lines):
+    """
+    Returns a list of ``lines`` synthetic ``sshd_config`` lines cycling
+    through a fixed set of keywords.
+    """
+    return ["{0} value{1}".format(KEYWORDS[i % len(KEYWORDS)], i) for i in range(lines)]
+
+
+@contextmanager
+def _mode(compact, zero_copy):
+    # Switches SSHDConfig to a storage mode for the duration of the block
+    original = SSHDConfig.compact, SSHDConfig.zero_copy
+    SSHDConfig.compact, SSHDConfig.zero_copy = compact, zero_copy
+    try:
+        yield
+    finally:
+        SSHDConfig.compact, SSHDConfig.zero_copy = original
+
+
+def measure(lines, compact, zero_copy=False):
+    """
+    Returns the number of bytes retained by an ``SSHDConfig`` parsed from
+    ``lines`` lines of content with compact mode set to ``compact`` and
+    zero-copy mode to ``zero_copy``.
+    """
+    context = context_wrap(make_config(lines))
+    with _mode(compact, zero_copy):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        config = SSHDConfig(context)
+        del context
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+    del config
+    return retained
+
+
+def parse_time(lines, compact=False, zero_copy=False, repeat=3):
+    """
+    Returns the best time in seconds, over ``repeat`` runs, to parse
+    ``lines`` lines of content in the given mode.
+    """
+    context = context_wrap(make_config(lines))
+    with _mode(compact, zero_copy):
+        return min(timeit.repeat(lambda: SSHDConfig(context), number=1, repeat=repeat))
+
+
+def compare(line_counts):
+    """
+    Returns a list of ``(lines, default_bytes, compact_bytes,
+    zero_copy_bytes)`` tuples.
+    """
+    return [(n, measure(n, False), measure(n, True), measure(n, False, True)) for n in line_counts]
+
+
+def compare_speed(line_counts, repeat=3):
+    """
+    Returns a list of ``(lines, content_bytes, default_seconds,
+    compact_seconds, zero_copy_seconds)`` tuples.
+    """
+    result = []
+    for n in line_counts:
+        size = sum(len(line) + 1 for line in make_config(n))
+        result.append((n, size, parse_time(n, repeat=repeat), parse_time(n, True, repeat=repeat),
+                       parse_time(n, zero_copy=True, repeat=repeat)))
+    return result
+
+
+def main():
+    p = argparse.ArgumentParser(description="Compare SSHDConfig memory use and parse speed in each storage mode.")
+    p.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000],
+                   help="Configuration sizes in lines to measure.")
+    p.add_argument("--repeat", type=int, default=3, help="Parses timed per size and mode, the best is kept.")
+    args = p.parse_args()
+
+    print("{0:>7} {1:>11} {2:>11} {3:>11} {4:>7}".format("lines", "default", "compact", "zero-copy", "saved"))
+    for n, default, compact, zero_copy in compare(args.lines):
+        saved = 100.0 * (default - zero_copy) / default if default else 0.0
+        print("{0:>7} {1:>11} {2:>11} {3:>11} {4:>6.1f}%".format(n, default, compact, zero_copy, saved))
+    print()
+    print("{0:>7} {1:>9} {2:>11} {3:>11} {4:>11}".format("lines", "MiB", "default", "compact", "zero-copy"))
+    for n, size, default, compact, zero_copy in compare_speed(args.lines, args.repeat):
+        rates = [size / 2.0 ** 20 / t if t else 0.0 for t in (default, compact, zero_copy)]
+        print("{0:>7} {1:>9.2f} {2:>6.1f}MiB/s {3:>6.1f}MiB/s {4:>6.1f}MiB/s".format(n, size / 2.0 ** 20, *rates))
+
+
+if __name__ == "__main__":
+    main()
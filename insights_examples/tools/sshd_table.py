@@ -0,0 +1,233 @@
+"""
+Fleet-wide SSHDConfig table
+===========================
+
+:class:`SSHDConfigTable` gathers the global settings of many parsed
+:class:`insights_examples.parsers.secure_shell.SSHDConfig` objects into a
+columnar structure so fleet questions are answered with one pass over a few
+integer arrays instead of a Python loop over per-host objects.
+
+Every configuration line becomes a row of three parallel ``array`` columns:
+the host, the keyword and the value.  Keywords, values, host ids and host
+attributes (such as the installed ``openssh`` package) are dictionary
+encoded, so the columns only hold small integer codes and each distinct
+string is stored once for the whole fleet.
+
+Examples:
+    >>> table = SSHDConfigTable()
+    >>> table.add('host1', host1_config, openssh='openssh-6.6.1p1-31.el7')
+    >>> table.add('host2', host2_config, openssh='openssh-7.4p1-16.el7')
+    >>> table.add('host3', host3_config, openssh='openssh-7.4p1-16.el7')
+    >>> table.count('PermitRootLogin', 'yes')
+    2
+    >>> table.count('PermitRootLogin', 'yes', by='openssh')
+    {'openssh-6.6.1p1-31.el7': 1, 'openssh-7.4p1-16.el7': 1}
+    >>> table.hosts_where('PermitRootLogin', lambda v: v is None)
+    ['host2']
+    >>> table.value_counts('LogLevel')
+    {'VERBOSE': 2, 'INFO': 1}
+"""
+from array import array
+
+from insights_examples.rules import sshd_secure
+
+MISSING = -1
+"""int: Code used in per-host columns for a keyword or attribute that is not set."""
+
+
+class Dictionary(object):
+    """
+    Bidirectional mapping between strings and the integer codes stored in
+    the columns of :class:`SSHDConfigTable`.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+        self._lower = None
+
+    def encode(self, value):
+        """int: Returns the code of ``value``, assigning one if it is new."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._lower = None
+        return code
+
+    def code(self, value):
+        """int: Returns the code of ``value`` or ``MISSING`` if it was never encoded."""
+        return self.codes.get(value, MISSING)
+
+    def decode(self, code):
+        """str: Returns the value of ``code``, ``None`` for ``MISSING``."""
+        return self.values[code] if code != MISSING else None
+
+    def lower_codes(self):
+        """
+        dict: Returns the codes of every value that is equal, ignoring case,
+        to each lowercase value.
+        """
+        if self._lower is None:
+            self._lower = {}
+            for code, value in enumerate(self.values):
+                self._lower.setdefault(value.lower(), []).append(code)
+        return self._lower
+
+    def __len__(self):
+        return len(self.values)
+
+
+class SSHDConfigTable(object):
+    """
+    Columnar table of the global settings of many ``SSHDConfig`` objects.
+
+    Attributes:
+        hosts (Dictionary): Host ids, the code of a host is its position.
+        keywords (Dictionary): Lowercase keywords.
+        values (Dictionary): Values, with their original case.
+        host (array): Host code of each row.
+        keyword (array): Keyword code of each row.
+        value (array): Value code of each row.
+        attributes (dict): Per-host attribute columns keyed by attribute
+            name, each a tuple of its ``Dictionary`` and an ``array`` of
+            value codes indexed by host code.
+    """
+
+    def __init__(self):
+        self.hosts = Dictionary()
+        self.keywords = Dictionary()
+        self.values = Dictionary()
+        self.host = array('l')
+        self.keyword = array('l')
+        self.value = array('l')
+        self.attributes = {}
+
+    @classmethod
+    def from_configs(cls, configs):
+        """
+        Builds a table from an iterable of ``(host_id, sshd_config,
+        attributes)`` tuples, ``attributes`` being a dict.
+        """
+        table = cls()
+        for host_id, sshd_config, attributes in configs:
+            table.add(host_id, sshd_config, **attributes)
+        return table
+
+    def add(self, host_id, sshd_config, **attributes):
+        """
+        Appends the global settings of ``sshd_config`` for host ``host_id``
+        along with host attributes given as keyword arguments.
+        """
+        if host_id in self.hosts.codes:
+            raise ValueError("Host %s is already in the table" % host_id)
+        host = self.hosts.encode(host_id)
+        for line in sshd_config:
+            self.host.append(host)
+            self.keyword.append(self.keywords.encode(line.kw_lower))
+            self.value.append(self.values.encode(line.value))
+        for column in self.attributes.values():
+            column[1].append(MISSING)
+        for name, value in attributes.items():
+            if name not in self.attributes:
+                self.attributes[name] = (Dictionary(), array('l', [MISSING] * (host + 1)))
+            dictionary, codes = self.attributes[name]
+            codes[host] = dictionary.encode(value) if value is not None else MISSING
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def last_values(self, keyword):
+        """
+        array: Returns, indexed by host code, the code of the last value of
+        ``keyword`` for each host or ``MISSING``.  This is one pass over the
+        keyword column.
+        """
+        result = array('l', [MISSING] * len(self.hosts))
+        kw = self.keywords.code(keyword.lower())
+        if kw == MISSING:
+            return result
+        host, value = self.host, self.value
+        for row, code in enumerate(self.keyword):
+            if code == kw:
+                result[host[row]] = value[row]
+        return result
+
+    def mask(self, keyword, predicate):
+        """
+        list: Returns, indexed by host code, whether ``predicate`` holds for
+        the last value of ``keyword`` on each host.  ``predicate`` receives
+        the value, or ``None`` when the keyword is not set, and is evaluated
+        once per distinct value rather than once per host.
+        """
+        verdicts = [predicate(v) for v in self.values.values]
+        missing = predicate(None)
+        return [verdicts[c] if c != MISSING else missing for c in self.last_values(keyword)]
+
+    def hosts_where(self, keyword, predicate):
+        """list: Returns the ids of the hosts selected by :meth:`mask`."""
+        return [self.hosts.values[h] for h, selected in enumerate(self.mask(keyword, predicate)) if selected]
+
+    def count(self, keyword, value, by=None, ignore_case=True):
+        """
+        Counts the hosts whose last value of ``keyword`` equals ``value``,
+        ignoring case unless ``ignore_case`` is false.
+
+        Returns:
+            int: The number of hosts, or a dict of counts keyed by the host
+            attribute named by ``by`` when given.
+        """
+        if ignore_case:
+            wanted = set(self.values.lower_codes().get(value.lower(), []))
+        else:
+            wanted = set([self.values.code(value)])
+        selected = [c in wanted for c in self.last_values(keyword)]
+        if by is None:
+            return sum(selected)
+        dictionary, codes = self.attributes[by]
+        counts = {}
+        for h, hit in enumerate(selected):
+            if hit:
+                group = dictionary.decode(codes[h])
+                counts[group] = counts.get(group, 0) + 1
+        return counts
+
+    def value_counts(self, keyword, by=None):
+        """
+        Counts the hosts per last value of ``keyword``, ``None`` counting
+        the hosts where it is not set.
+
+        Returns:
+            dict: Counts keyed by value, or keyed by ``(group, value)`` when
+            the host attribute ``by`` is given.
+        """
+        counts = {}
+        groups = self.attributes[by] if by else None
+        for h, code in enumerate(self.last_values(keyword)):
+            key = self.values.decode(code)
+            if groups:
+                key = (groups[0].decode(groups[1][h]), key)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+def check_hosts(table, policy=sshd_secure.POLICY):
+    """
+    Runs the rules of the :class:`insights_examples.policy.DirectivePolicy`
+    ``policy`` over every host of ``table`` as column predicates: each rule
+    is one pass over the keyword column and is evaluated once per distinct
+    value.
+
+    Returns:
+        dict: The ``errors`` dict ``sshd_secure.report`` would produce,
+        keyed by host id, for the hosts with at least one error.
+    """
+    errors = {}
+    values = table.values.values
+    for index, rule in enumerate(policy.rules):
+        results = [policy.check_value(index, v) for v in values]
+        for h, code in enumerate(table.last_values(rule.keyword)):
+            error = policy.check_value(index, None) if code == MISSING else results[code]
+            if error is not None:
+                errors.setdefault(table.hosts.values[h], {})[rule.keyword] = error
+    return errors
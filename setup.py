@@ -48,5 +48,6 @@ if __name__ == "__main__":
             'linting': list(linting),
             'testing': list(testing)
         },
-        include_package_data=True
+        include_package_data=True,
+        package_data={'insights_examples': ['*.json']}
     )